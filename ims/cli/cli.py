@@ -2,6 +2,7 @@
 
 import json
 import sys
+import time
 
 import click
 import os
@@ -13,6 +14,7 @@ import ims.common.constants as constants
 
 config.load()
 
+from ims.database import migrations
 from ims.einstein.operations import BMI
 from ims.exception.exception import BMIException
 
@@ -91,6 +93,38 @@ def create_disk(project, img, disk_name):
     click.echo(res.content)
 
 
+@disk.command(name='bcreate', short_help="Create Several Disks")
+@click.argument(constants.PROJECT_PARAMETER)
+@click.argument(constants.IMAGE_NAME_PARAMETER)
+@click.argument(constants.DISK_NAMES_PARAMETER, nargs=-1, required=True)
+def create_disks(project, img, disk_names):
+    """
+    Create several disks from the same image in one call
+
+    \b
+    Arguments:
+    PROJECT 	= The HIL Project attached to your credentials
+    IMG     	= The Name of the Image to use
+    DISK_NAMES  = The Names of the Disks to create
+    """
+    data = {constants.PROJECT_PARAMETER: project,
+            constants.IMAGE_NAME_PARAMETER: img,
+            constants.DISK_NAMES_PARAMETER: json.dumps(disk_names)}
+    res = requests.put(_url + "create_disks/", data=data,
+                       auth=(_username, _password))
+    if res.status_code == 200:
+        results = json.loads(res.content)
+        table = PrettyTable(field_names=["Disk", "Status", "Target/Message"])
+        for disk_name in sorted(results):
+            result = results[disk_name]
+            table.add_row([disk_name, result[constants.STATUS_CODE_KEY],
+                           result.get(constants.RETURN_VALUE_KEY,
+                                      result.get(constants.MESSAGE_KEY))])
+        click.echo(table.get_string())
+    else:
+        click.echo(res.content)
+
+
 @disk.command(name='delete', short_help="Delete a Disk")
 @click.argument(constants.PROJECT_PARAMETER)
 @click.argument(constants.DISK_NAME_PARAMETER)
@@ -156,6 +190,76 @@ def deprovision(project, node, nic):
     click.echo(res.content)
 
 
+def _read_batch_file(batch_file, fields):
+    """
+    Reads a batch file that has one whitespace separated entry per line.
+    Empty lines and lines starting with # are skipped.
+    """
+    entries = []
+    for line in batch_file:
+        parts = line.split()
+        if not parts or parts[0].startswith('#'):
+            continue
+        if len(parts) != fields:
+            raise click.BadParameter(
+                "Each line must have {0} fields: {1}".format(fields, line))
+        entries.append(parts)
+    return entries
+
+
+def _echo_batch_results(res):
+    if res.status_code == 200:
+        results = json.loads(res.content)
+        table = PrettyTable(field_names=["Node", "Status", "Message"])
+        for node_name in sorted(results):
+            result = results[node_name]
+            table.add_row([node_name, result[constants.STATUS_CODE_KEY],
+                           result.get(constants.MESSAGE_KEY, '')])
+        click.echo(table.get_string())
+    else:
+        click.echo(res.content)
+
+
+@cli.command(name='bpro', short_help="Provision Several Nodes")
+@click.argument(constants.PROJECT_PARAMETER)
+@click.argument('batch_file', type=click.File('r'))
+def provision_many(project, batch_file):
+    """
+    Provision all the Nodes listed in a file in one call
+
+    \b
+    Arguments:
+    PROJECT    = The HIL Project attached to your credentials
+    BATCH_FILE = File with one "NODE DISK_NAME NIC" per line (- for stdin)
+    """
+    nodes = _read_batch_file(batch_file, 3)
+    data = {constants.PROJECT_PARAMETER: project,
+            constants.NODES_PARAMETER: json.dumps(nodes)}
+    res = requests.put(_url + "provision_batch/", data=data,
+                       auth=(_username, _password))
+    _echo_batch_results(res)
+
+
+@cli.command(name='bdpro', short_help="Deprovision Several Nodes")
+@click.argument(constants.PROJECT_PARAMETER)
+@click.argument('batch_file', type=click.File('r'))
+def deprovision_many(project, batch_file):
+    """
+    Deprovision all the Nodes listed in a file in one call
+
+    \b
+    Arguments:
+    PROJECT    = The HIL Project attached to your credentials
+    BATCH_FILE = File with one "NODE NIC" per line (- for stdin)
+    """
+    nodes = _read_batch_file(batch_file, 2)
+    data = {constants.PROJECT_PARAMETER: project,
+            constants.NODES_PARAMETER: json.dumps(nodes)}
+    res = requests.delete(_url + "deprovision_batch/", data=data,
+                          auth=(_username, _password))
+    _echo_batch_results(res)
+
+
 @cli.command(name='showdisks',
              short_help='Show disks that belong to project')
 @click.argument(constants.PROJECT_PARAMETER)
@@ -200,7 +304,10 @@ def remove_image(project, img):
 
 @cli.command(name='ls', short_help='List Images Stored')
 @click.argument(constants.PROJECT_PARAMETER)
-def list_images(project):
+@click.option('--limit', default=None, type=int,
+              help='Maximum Number of Images')
+@click.option('--after', default=None, help='List Images After This Name')
+def list_images(project, limit, after):
     """
     Lists Images Under A Project
 
@@ -208,7 +315,9 @@ def list_images(project):
     Arguments:
     PROJECT = The HIL Project attached to your credentials
     """
-    data = {constants.PROJECT_PARAMETER: project}
+    data = {constants.PROJECT_PARAMETER: project,
+            constants.LIMIT_PARAMETER: limit,
+            constants.AFTER_PARAMETER: after}
     res = requests.post(_url + "list_images/", data=data,
                         auth=(_username, _password))
     if res.status_code == 200:
@@ -256,7 +365,11 @@ def create_snapshot(project, disk_name, snap_name):
 
 @snap.command(name='ls', short_help='List All Snapshots Stored')
 @click.argument(constants.PROJECT_PARAMETER)
-def list_snapshots(project):
+@click.option('--limit', default=None, type=int,
+              help='Maximum Number of Snapshots')
+@click.option('--after', default=None,
+              help='List Snapshots After This Name')
+def list_snapshots(project, limit, after):
     """
     Lists All The Snapshots Under a Project
 
@@ -264,7 +377,9 @@ def list_snapshots(project):
     Arguments:
     PROJECT = The HIL Project attached to your credentials
     """
-    data = {constants.PROJECT_PARAMETER: project}
+    data = {constants.PROJECT_PARAMETER: project,
+            constants.LIMIT_PARAMETER: limit,
+            constants.AFTER_PARAMETER: after}
     res = requests.post(_url + "list_snapshots/", data=data,
                         auth=(_username, _password))
     if res.status_code == 200:
@@ -379,6 +494,16 @@ def db():
     pass
 
 
+@db.command(name='upgrade', help='Creates or Upgrades the DB Tables')
+@bmi_exception_wrapper
+def upgrade_db():
+    """
+    Creates the tables of the DB or upgrades them to the latest version.
+    Einstein does this when it starts.
+    """
+    click.echo("DB is at version {0}".format(migrations.upgrade()))
+
+
 @db.command(name='rm', help='Deletes Image From DB')
 @click.argument(constants.PROJECT_PARAMETER)
 @click.argument(constants.IMAGE_NAME_PARAMETER)
@@ -438,56 +563,27 @@ def add_image(project, img, id, snap, parent, public):
 @click.option('--project', default=None, help='Filter By Project')
 @click.option('--name', default=None, help='Filter By Name')
 @click.option('--ceph', default=None, help="Filter By Ceph Name")
+@click.option('--limit', default=None, type=int,
+              help='Maximum Number of Images')
+@click.option('--after', default=None, type=int,
+              help='List Images After This Id')
 @bmi_exception_wrapper
-def list_all_images(s, c, p, project, name, ceph):
+def list_all_images(s, c, p, project, name, ceph, limit, after):
     """
     List All Image Present in DB
 
     \b
     WARNING = User Must be An Admin
     """
-
-    def second_filter():
-        if project is None:
-            f1 = True
-        else:
-            f1 = image[2] == project
-
-        if ceph is None:
-            f2 = True
-        else:
-            f2 = image[3] == ceph
-
-        if name is None:
-            f3 = True
-        else:
-            f3 = image[1] == name
-
-        f4 = project is None and ceph is None and name is None
-
-        return (f1 and f2 and f3) or f4
-
     with BMI(_username, _password, constants.BMI_ADMIN_PROJECT) as bmi:
-        ret = bmi.list_all_images()
+        ret = bmi.list_all_images(project, name, ceph, s, c, p, limit, after)
         if ret[constants.STATUS_CODE_KEY] == 200:
             table = PrettyTable(
                 field_names=["Id", "Name", "Project", "Ceph", "Public",
                              "Snapshot",
                              "Parent"])
-            images = ret[constants.RETURN_VALUE_KEY]
-            for image in images:
-                flag = False
-                if s and image[5]:
-                    flag = second_filter()
-                elif c and image[6] != '' and not image[5]:
-                    flag = second_filter()
-                elif p and image[4]:
-                    flag = second_filter()
-                elif not s and not c and not p:
-                    flag = second_filter()
-
-                if flag:
-                    table.add_row(image)
+            for image in ret[constants.RETURN_VALUE_KEY]:
+                table.add_row(image)
             click.echo(table.get_string())
         else:
             click.echo(ret[constants.MESSAGE_KEY])
@@ -522,6 +618,38 @@ def import_ceph_image(project, img, snap, protect):
             click.echo(ret[constants.MESSAGE_KEY])
 
 
+@cli.command(name='import-many',
+             short_help='Import Several Images or Snapshots into BMI')
+@click.argument(constants.PROJECT_PARAMETER)
+@click.argument('imgs', nargs=-1, required=True)
+@click.option('--protect', is_flag=True,
+              help="Set if snapshots should be protected before cloning")
+@bmi_exception_wrapper
+def import_ceph_images(project, imgs, protect):
+    """
+    Import several CEPH images at once. Running it again after a failure
+    resumes the import, images that were already imported are skipped.
+
+    \b
+    Arguments:
+    PROJECT = The HIL Project attached to your credentials
+    IMGS = The Names of the CEPH Images to import (<image>@<snapshot> for
+           snapshots)
+    """
+    with BMI(_username, _password, project) as bmi:
+        ret = bmi.import_ceph_images(list(imgs), protect)
+        if ret[constants.STATUS_CODE_KEY] == 200:
+            table = PrettyTable(field_names=["Image", "Result"])
+            for img, result in sorted(
+                    ret[constants.RETURN_VALUE_KEY].iteritems()):
+                table.add_row([img, result.get(constants.RETURN_VALUE_KEY,
+                                               result.get(
+                                                   constants.MESSAGE_KEY))])
+            click.echo(table.get_string())
+        else:
+            click.echo(ret[constants.MESSAGE_KEY])
+
+
 @cli.command(name='export', short_help='Export a BMI image to ceph')
 @click.argument(constants.PROJECT_PARAMETER)
 @click.argument(constants.IMAGE_NAME_PARAMETER)
@@ -622,7 +750,6 @@ def iscsi():
 @iscsi.command(name='create', help='Create ISCSI Mapping')
 @click.argument(constants.PROJECT_PARAMETER)
 @click.argument(constants.IMAGE_NAME_PARAMETER)
-@bmi_exception_wrapper
 def create_mapping(project, img):
     """
     Mount image on iscsi server
@@ -635,18 +762,16 @@ def create_mapping(project, img):
     PROJECT  = The HIL Project attached to your credentials
     IMG      = The image that must be mounted
     """
-    with BMI(_username, _password, project) as bmi:
-        ret = bmi.mount_image(img)
-        if ret[constants.STATUS_CODE_KEY] == 200:
-            click.echo('Success')
-        else:
-            click.echo(ret[constants.MESSAGE_KEY])
+    data = {constants.PROJECT_PARAMETER: project,
+            constants.IMAGE_NAME_PARAMETER: img}
+    res = requests.put(_url + "mount_image/", data=data,
+                       auth=(_username, _password))
+    click.echo(res.content)
 
 
 @iscsi.command(name='rm', help='Remove ISCSI Mapping')
 @click.argument(constants.PROJECT_PARAMETER)
 @click.argument(constants.IMAGE_NAME_PARAMETER)
-@bmi_exception_wrapper
 def delete_mapping(project, img):
     """
     Unmount image from iscsi server
@@ -659,12 +784,11 @@ def delete_mapping(project, img):
     PROJECT  = The HIL Project attached to your credentials
     IMG      = The image that must be unmounted
     """
-    with BMI(_username, _password, project) as bmi:
-        ret = bmi.umount_image(img)
-        if ret[constants.STATUS_CODE_KEY] == 200:
-            click.echo('Success')
-        else:
-            click.echo(ret[constants.MESSAGE_KEY])
+    data = {constants.PROJECT_PARAMETER: project,
+            constants.IMAGE_NAME_PARAMETER: img}
+    res = requests.delete(_url + "umount_image/", data=data,
+                          auth=(_username, _password))
+    click.echo(res.content)
 
 
 @iscsi.command(name='ls', help='Show ISCSI Mappings')
@@ -681,17 +805,284 @@ def show_mappings(project):
     Arguments:
     PROJECT  = The HIL Project attached to your credentials
     """
-    # with BMI(_username, _password, project) as bmi:
-    #     ret = bmi.show_mounted()
-    #     if ret[constants.STATUS_CODE_KEY] == 200:
-    #         table = PrettyTable(field_names=['Target', 'Block Device'])
-    #         mappings = ret[constants.RETURN_VALUE_KEY]
-    #         for k, v in mappings.iteritems():
-    #             table.add_row([k, v])
-    #         click.echo(table.get_string())
-    #     else:
-    #         click.echo(ret[constants.MESSAGE_KEY])
-    click.echo("Need to Re-Implement")
+    with BMI(_username, _password, project) as bmi:
+        ret = bmi.show_mounted()
+        if ret[constants.STATUS_CODE_KEY] == 200:
+            table = PrettyTable(field_names=['Target', 'Block Device'])
+            mappings = ret[constants.RETURN_VALUE_KEY]
+            for k, v in mappings.iteritems():
+                table.add_row([k, v])
+            click.echo(table.get_string())
+        else:
+            click.echo(ret[constants.MESSAGE_KEY])
+
+
+@cli.group(name='pool', help='Warm Disk Pool Related Commands')
+def pool():
+    """
+    Use the subcommands under this command to keep pre-cloned disks of an
+    image so that disks are created instantly
+    """
+    pass
+
+
+@pool.command(name='set', short_help='Set the Standby Disks of an Image')
+@click.argument(constants.PROJECT_PARAMETER)
+@click.argument(constants.IMAGE_NAME_PARAMETER)
+@click.argument(constants.LOW_PARAMETER, type=int)
+@click.argument(constants.HIGH_PARAMETER, type=int)
+def set_warm_pool(project, img, low, high):
+    """
+    Keep between LOW and HIGH standby disks of an image
+
+    \b
+    Arguments:
+    PROJECT = The HIL Project attached to your credentials
+    IMG     = The Name of the Image
+    LOW     = Refill when there are less standby disks than this
+    HIGH    = Number of standby disks after a refill (0 to remove them)
+    """
+    data = {constants.PROJECT_PARAMETER: project,
+            constants.IMAGE_NAME_PARAMETER: img,
+            constants.LOW_PARAMETER: low,
+            constants.HIGH_PARAMETER: high}
+    res = requests.put(_url + "warm_pool/", data=data,
+                       auth=(_username, _password))
+    click.echo(res.content)
+
+
+@pool.command(name='ls', short_help='Show the Standby Disks')
+@click.argument(constants.PROJECT_PARAMETER)
+def show_warm_pool(project):
+    """
+    Show the images of the project that have standby disks
+
+    \b
+    Arguments:
+    PROJECT = The HIL Project attached to your credentials
+    """
+    data = {constants.PROJECT_PARAMETER: project}
+    res = requests.post(_url + "warm_pool/", data=data,
+                        auth=(_username, _password))
+    if res.status_code == 200:
+        table = PrettyTable(field_names=["Image", "Low", "High", "Standby"])
+        for row in json.loads(res.content):
+            table.add_row(row)
+        click.echo(table.get_string())
+    else:
+        click.echo(res.content)
+
+
+@cli.group(name='job', help='Background Job Related Commands')
+def job():
+    """
+    Use the subcommands under this command to run long operations like
+    imports in the background and follow them
+    """
+    pass
+
+
+def _parse_job_arg(arg):
+    # Flags like the protect argument of import_ceph_snapshot are booleans
+    if arg.lower() in ['true', 'false']:
+        return arg.lower() == 'true'
+    return arg
+
+
+def _job_row(job):
+    return [job[constants.JOB_ID_KEY], job[constants.JOB_COMMAND_KEY],
+            " ".join(str(arg) for arg in job[constants.JOB_ARGS_KEY]),
+            job[constants.JOB_STATE_KEY],
+            "{0}%".format(job[constants.JOB_PROGRESS_KEY])]
+
+
+def _echo_job(job):
+    table = PrettyTable(field_names=["Id", "Command", "Args", "State",
+                                     "Progress"])
+    table.add_row(_job_row(job))
+    click.echo(table.get_string())
+    result = job[constants.JOB_RESULT_KEY]
+    if result is not None and constants.MESSAGE_KEY in result:
+        click.echo(result[constants.MESSAGE_KEY])
+
+
+def _fetch_job(project, job_id):
+    data = {constants.PROJECT_PARAMETER: project}
+    return requests.post(_url + "jobs/" + job_id, data=data,
+                         auth=(_username, _password))
+
+
+@job.command(name='submit', short_help='Run an Operation in the Background')
+@click.argument(constants.PROJECT_PARAMETER)
+@click.argument(constants.COMMAND_PARAMETER,
+                type=click.Choice(sorted(constants.JOB_COMMANDS)))
+@click.argument(constants.ARGS_PARAMETER, nargs=-1)
+def submit_job(project, command, args):
+    """
+    Submit an operation to be run in the background and print the job id
+
+    
+    Arguments:
+    PROJECT = The HIL Project attached to your credentials
+    COMMAND = The Operation to run
+    ARGS    = The Arguments of the operation (true/false for flags)
+    """
+    data = {constants.PROJECT_PARAMETER: project,
+            constants.COMMAND_PARAMETER: command,
+            constants.ARGS_PARAMETER: json.dumps(
+                [_parse_job_arg(arg) for arg in args])}
+    res = requests.put(_url + "jobs/", data=data,
+                       auth=(_username, _password))
+    if res.status_code == 200:
+        click.echo(json.loads(res.content))
+    else:
+        click.echo(res.content)
+
+
+@job.command(name='ls', short_help='List Jobs')
+@click.argument(constants.PROJECT_PARAMETER)
+def list_jobs(project):
+    """
+    List the jobs submitted by the project
+
+    
+    Arguments:
+    PROJECT = The HIL Project attached to your credentials
+    """
+    data = {constants.PROJECT_PARAMETER: project}
+    res = requests.post(_url + "jobs/", data=data,
+                        auth=(_username, _password))
+    if res.status_code == 200:
+        table = PrettyTable(field_names=["Id", "Command", "Args", "State",
+                                         "Progress"])
+        for job in json.loads(res.content):
+            table.add_row(_job_row(job))
+        click.echo(table.get_string())
+    else:
+        click.echo(res.content)
+
+
+@job.command(name='show', short_help='Show a Job')
+@click.argument(constants.PROJECT_PARAMETER)
+@click.argument(constants.JOB_ID_PARAMETER)
+def show_job(project, job_id):
+    """
+    Show the state, progress and result of a job
+
+    
+    Arguments:
+    PROJECT = The HIL Project attached to your credentials
+    JOB_ID  = The Id printed by submit
+    """
+    res = _fetch_job(project, job_id)
+    if res.status_code == 200:
+        _echo_job(json.loads(res.content))
+    else:
+        click.echo(res.content)
+
+
+@job.command(name='wait', short_help='Wait for a Job to Finish')
+@click.argument(constants.PROJECT_PARAMETER)
+@click.argument(constants.JOB_ID_PARAMETER)
+@click.option('--timeout', default=None, type=int,
+              help='Seconds to wait before giving up (default forever)')
+@click.option('--interval', default=2, type=int,
+              help='Seconds between polls')
+def wait_job(project, job_id, timeout, interval):
+    """
+    Wait till a job finishes and show it
+
+    
+    Arguments:
+    PROJECT = The HIL Project attached to your credentials
+    JOB_ID  = The Id printed by submit
+    """
+    deadline = None if timeout is None else time.time() + timeout
+    while True:
+        res = _fetch_job(project, job_id)
+        if res.status_code != 200:
+            click.echo(res.content)
+            sys.exit(1)
+        job = json.loads(res.content)
+        if job[constants.JOB_STATE_KEY] not in [constants.JOB_QUEUED,
+                                                constants.JOB_RUNNING]:
+            _echo_job(job)
+            if job[constants.JOB_STATE_KEY] != constants.JOB_SUCCEEDED:
+                sys.exit(1)
+            return
+        if deadline is not None and time.time() >= deadline:
+            _echo_job(job)
+            click.echo("Timed out waiting for job")
+            sys.exit(1)
+        time.sleep(interval)
+
+
+@job.command(name='cancel', short_help='Cancel a Queued Job')
+@click.argument(constants.PROJECT_PARAMETER)
+@click.argument(constants.JOB_ID_PARAMETER)
+def cancel_job(project, job_id):
+    """
+    Cancel a job that has not started running yet
+
+    
+    Arguments:
+    PROJECT = The HIL Project attached to your credentials
+    JOB_ID  = The Id printed by submit
+    """
+    data = {constants.PROJECT_PARAMETER: project}
+    res = requests.delete(_url + "jobs/" + job_id, data=data,
+                          auth=(_username, _password))
+    if res.status_code == 200:
+        _echo_job(json.loads(res.content))
+    else:
+        click.echo(res.content)
+
+
+@cli.command(name='flattens', short_help='Show the Progress of Flattens')
+@click.argument(constants.PROJECT_PARAMETER)
+def show_flattens(project):
+    """
+    Show the flattens of the images of the project, like those run by
+    import and copy jobs, with their progress
+
+    \b
+    Arguments:
+    PROJECT = The HIL Project attached to your credentials
+    """
+    data = {constants.PROJECT_PARAMETER: project}
+    res = requests.post(_url + "flattens/", data=data,
+                        auth=(_username, _password))
+    if res.status_code == 200:
+        table = PrettyTable(field_names=["Image", "State", "Progress"])
+        for flatten in json.loads(res.content):
+            table.add_row([flatten[constants.FLATTEN_IMAGE_KEY],
+                           flatten[constants.JOB_STATE_KEY],
+                           "{0}%".format(
+                               flatten[constants.JOB_PROGRESS_KEY])])
+        click.echo(table.get_string())
+    else:
+        click.echo(res.content)
+
+
+@cli.command(name='metrics', short_help='Show Einstein Metrics')
+def show_metrics():
+    """
+    Show the counters collected by einstein like connection reuse
+
+    \b
+    WARNING = User Must be An Admin
+    """
+    data = {constants.PROJECT_PARAMETER: constants.BMI_ADMIN_PROJECT}
+    res = requests.post(_url + "metrics/", data=data,
+                        auth=(_username, _password))
+    if res.status_code == 200:
+        counters = json.loads(res.content)
+        table = PrettyTable(field_names=["Metric", "Value"])
+        for name in sorted(counters):
+            table.add_row([name, counters[name]])
+        click.echo(table.get_string())
+    else:
+        click.echo(res.content)
 
 
 @cli.command(name='upload', help='Upload Image to BMI')
@@ -1,4 +1,5 @@
 import ims.common.constants as constants
+import ims.exception.config_exceptions as config_exceptions
 
 
 def parse_config(cfg):
@@ -8,8 +9,13 @@ def parse_config(cfg):
     cfg.option(constants.BMI_SECTION, constants.SERVICE_OPT, type=bool)
     cfg.option(constants.BMI_SECTION, constants.SNAPSHOT_OPT)
 
-    # DB Section
-    cfg.option(constants.DB_SECTION, constants.DB_PATH_OPT)
+    # DB Section (path is only needed when no url is given)
+    if cfg.config.has_option(constants.DB_SECTION, constants.DB_URL_OPT):
+        cfg.option(constants.DB_SECTION, constants.DB_URL_OPT)
+    else:
+        cfg.option(constants.DB_SECTION, constants.DB_PATH_OPT)
+        cfg.option(constants.DB_SECTION, constants.DB_URL_OPT, required=False,
+                   default=constants.SQLITE_URL_PREFIX + cfg.db.path)
 
     # RPC Section
     cfg.option(constants.RPC_SECTION, constants.RPC_SERVER_IP_OPT)
@@ -41,5 +47,93 @@ def parse_config(cfg):
     cfg.section(constants.NET_ISOLATOR_SECTION)
     cfg.section(constants.FS_SECTION)
 
+    # Optional Options (Parsed after sections so that they are typed)
+    cfg.option(constants.ISCSI_SECTION, constants.ISCSI_TGT_MODE_OPT,
+               required=False, default=constants.TGT_ADMIN_MODE)
+    if cfg.iscsi.tgt_mode not in [constants.TGT_ADMIN_MODE,
+                                  constants.TGT_DIRECT_MODE]:
+        raise config_exceptions.InvalidValueConfigException(
+            constants.ISCSI_TGT_MODE_OPT, constants.ISCSI_SECTION)
+    cfg.option(constants.ISCSI_SECTION, constants.ISCSI_TGTADM_OPT,
+               required=False, default='tgtadm')
+    cfg.option(constants.ISCSI_SECTION, constants.ISCSI_SUDO_OPT, type=bool,
+               required=False, default=True)
+    cfg.option(constants.ISCSI_SECTION, constants.ISCSI_CONFIG_DIR_OPT,
+               required=False, default=constants.TGT_DEFAULT_CONFIG_DIR)
+    cfg.option(constants.ISCSI_SECTION, constants.ISCSI_RECONCILE_INTERVAL_OPT,
+               type=float, required=False,
+               default=constants.DEFAULT_ISCSI_RECONCILE_INTERVAL)
+    cfg.option(constants.LOGS_SECTION, constants.LOGS_DECORATORS_OPT,
+               type=bool, required=False, default=True)
+    cfg.option(constants.BMI_SECTION, constants.JOB_WORKERS_OPT, type=int,
+               required=False, default=constants.DEFAULT_JOB_WORKERS)
+    cfg.option(constants.FS_SECTION, constants.CEPH_IOCTX_POOL_SIZE_OPT,
+               type=int, required=False,
+               default=constants.DEFAULT_IOCTX_POOL_SIZE)
+    cfg.option(constants.FS_SECTION, constants.CEPH_PARALLEL_CALLS_OPT,
+               type=int, required=False,
+               default=constants.DEFAULT_CEPH_PARALLEL_CALLS)
+    cfg.option(constants.FS_SECTION, constants.CEPH_IMAGE_CACHE_SIZE_OPT,
+               type=int, required=False,
+               default=constants.DEFAULT_CEPH_IMAGE_CACHE_SIZE)
+    cfg.option(constants.FS_SECTION, constants.CEPH_FLATTEN_WORKERS_OPT,
+               type=int, required=False,
+               default=constants.DEFAULT_FLATTEN_WORKERS)
+    cfg.option(constants.FS_SECTION, constants.CEPH_FLATTEN_POOL_LIMIT_OPT,
+               type=int, required=False,
+               default=constants.DEFAULT_FLATTEN_POOL_LIMIT)
+    cfg.option(constants.FS_SECTION, constants.CEPH_SYSFS_ROOT_OPT,
+               required=False, default=constants.DEFAULT_SYSFS_ROOT)
+    cfg.option(constants.FS_SECTION, constants.CEPH_MAP_HELPER_OPT,
+               required=False, default=constants.DEFAULT_MAP_HELPER)
+    cfg.option(constants.FS_SECTION, constants.CEPH_MAP_SUDO_OPT, type=bool,
+               required=False, default=True)
+    cfg.option(constants.NET_ISOLATOR_SECTION,
+               constants.NET_ISOLATOR_PARALLEL_CALLS_OPT, type=int,
+               required=False, default=constants.DEFAULT_HIL_PARALLEL_CALLS)
+    cfg.option(constants.NET_ISOLATOR_SECTION,
+               constants.NET_ISOLATOR_POOL_SIZE_OPT, type=int,
+               required=False, default=constants.DEFAULT_HIL_POOL_SIZE)
+    cfg.option(constants.NET_ISOLATOR_SECTION,
+               constants.NET_ISOLATOR_CONNECT_TIMEOUT_OPT, type=float,
+               required=False, default=constants.DEFAULT_HIL_CONNECT_TIMEOUT)
+    cfg.option(constants.NET_ISOLATOR_SECTION,
+               constants.NET_ISOLATOR_READ_TIMEOUT_OPT, type=float,
+               required=False, default=constants.DEFAULT_HIL_READ_TIMEOUT)
+    cfg.option(constants.NET_ISOLATOR_SECTION,
+               constants.NET_ISOLATOR_CACHE_TTL_OPT, type=float,
+               required=False, default=constants.DEFAULT_HIL_CACHE_TTL)
+    cfg.option(constants.NET_ISOLATOR_SECTION,
+               constants.NET_ISOLATOR_CACHE_SIZE_OPT, type=int,
+               required=False, default=constants.DEFAULT_HIL_CACHE_SIZE)
+    cfg.option(constants.DB_SECTION, constants.DB_POOL_SIZE_OPT, type=int,
+               required=False, default=constants.DEFAULT_DB_POOL_SIZE)
+    cfg.option(constants.DB_SECTION, constants.DB_MAX_OVERFLOW_OPT, type=int,
+               required=False, default=constants.DEFAULT_DB_MAX_OVERFLOW)
+    cfg.option(constants.DB_SECTION, constants.DB_POOL_RECYCLE_OPT, type=int,
+               required=False, default=constants.DEFAULT_DB_POOL_RECYCLE)
+    cfg.option(constants.DB_SECTION, constants.DB_POOL_PRE_PING_OPT,
+               type=bool, required=False,
+               default=constants.DEFAULT_DB_POOL_PRE_PING)
+    cfg.option(constants.DB_SECTION, constants.DB_NAME_CACHE_SIZE_OPT,
+               type=int, required=False,
+               default=constants.DEFAULT_DB_NAME_CACHE_SIZE)
+    cfg.option(constants.DB_SECTION, constants.DB_NAME_CACHE_TTL_OPT,
+               type=float, required=False,
+               default=constants.DEFAULT_DB_NAME_CACHE_TTL)
+    cfg.option(constants.DB_SECTION, constants.DB_GROUP_COMMIT_WINDOW_OPT,
+               type=float, required=False,
+               default=constants.DEFAULT_DB_GROUP_COMMIT_WINDOW)
+    cfg.option(constants.DB_SECTION, constants.DB_GROUP_COMMIT_SIZE_OPT,
+               type=int, required=False,
+               default=constants.DEFAULT_DB_GROUP_COMMIT_SIZE)
+    cfg.option(constants.DB_SECTION, constants.DB_JOURNAL_MODE_OPT,
+               required=False, default=constants.DEFAULT_DB_JOURNAL_MODE)
+    cfg.option(constants.DB_SECTION, constants.DB_SYNCHRONOUS_OPT,
+               required=False, default=constants.DEFAULT_DB_SYNCHRONOUS)
+    cfg.option(constants.DB_SECTION, constants.DB_BUSY_TIMEOUT_OPT,
+               type=float, required=False,
+               default=constants.DEFAULT_DB_BUSY_TIMEOUT)
+
     # Optional Sections
     cfg.section(constants.TESTS_SECTION, required=False)
@@ -0,0 +1,80 @@
+# A size bounded LRU cache whose entries expire after a time to live
+# It is thread safe as einstein serves requests from a thread pool
+import collections
+import threading
+import time
+
+import ims.common.metrics as metrics
+
+_missing = object()
+
+
+class TTLCache:
+    def __init__(self, name, size, ttl):
+        """
+        :param name: prefix of the hit and miss counters like hil.cache
+        :param size: maximum number of entries, the least recently used
+        entry is evicted when full
+        :param ttl: seconds after which an entry expires, 0 disables the
+        cache
+        """
+        self.name = name
+        self.size = size
+        self.ttl = ttl
+        self.__entries = collections.OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Returns the value cached for key
+
+        :param key: a hashable key
+        :param default: returned if key is missing or expired
+        :return: the cached value or default
+        """
+        with self.__lock:
+            value, expires = self.__entries.pop(key, (_missing, None))
+            if value is _missing or expires <= time.time():
+                metrics.increment(self.name + '.miss')
+                return default
+            # Re-inserting moves the entry to the most recently used end
+            self.__entries[key] = (value, expires)
+            metrics.increment(self.name + '.hit')
+            return value
+
+    def put(self, key, value):
+        """
+        Caches value for key till the ttl expires
+
+        :param key: a hashable key
+        :param value: the value to cache
+        :return: None
+        """
+        if self.ttl <= 0 or self.size <= 0:
+            return
+        with self.__lock:
+            self.__entries.pop(key, None)
+            self.__entries[key] = (value, time.time() + self.ttl)
+            while len(self.__entries) > self.size:
+                self.__entries.popitem(last=False)
+
+    def invalidate(self, predicate):
+        """
+        Removes every entry whose key matches
+
+        :param predicate: function taking a key and returning True if the
+        entry should be removed
+        :return: None
+        """
+        with self.__lock:
+            for key in [key for key in self.__entries if predicate(key)]:
+                del self.__entries[key]
+
+    def clear(self):
+        """
+        Removes all entries
+
+        :return: None
+        """
+        with self.__lock:
+            self.__entries.clear()
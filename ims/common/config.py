@@ -55,7 +55,7 @@ class BMIConfig:
         if not self.config.read(self.configfile):
             raise IOError('cannot load ' + self.configfile)
 
-    def option(self, section, option, type=str, required=True):
+    def option(self, section, option, type=str, required=True, default=None):
         """
         Parses the given option from config, converts to another type if
         required or raises an exception if found missing and adds it as
@@ -65,14 +65,12 @@ class BMIConfig:
         :param option: Option should be parsed
         :param type: the conversion function for the required type like int,etc
         :param required: Whether an exception should be raised if missing
+        :param default: The value to use if an optional option is missing
         :return: None
         """
         try:
             value = self.config.get(section, option)
-            section_obj = getattr(self, section, None)
-            if section_obj is None:
-                section_obj = ConfigSection()
-                setattr(self, section, section_obj)
+            section_obj = self.__get_section_obj(section)
             if type is bool:
                 v = value.lower()
                 if v in ['true', 'false']:
@@ -85,6 +83,8 @@ class BMIConfig:
             if required:
                 raise config_exceptions.MissingOptionInConfigException(option,
                                                                        section)
+            if default is not None:
+                setattr(self.__get_section_obj(section), option, default)
         except ValueError:
             raise config_exceptions.InvalidValueConfigException(option,
                                                                 section)
@@ -99,10 +99,7 @@ class BMIConfig:
         """
         try:
             section = self.config.items(section_name)
-            section_obj = getattr(self, section_name, None)
-            if section_obj is None:
-                section_obj = ConfigSection()
-                setattr(self, section_name, section_obj)
+            section_obj = self.__get_section_obj(section_name)
 
             for name, value in section:
                 setattr(section_obj, name, value)
@@ -112,6 +109,20 @@ class BMIConfig:
                 raise config_exceptions.MissingSectionInConfigException(
                     section_name)
 
+    def __get_section_obj(self, section_name):
+        """
+        Returns the object holding the options of the given section, creating
+        it if this is the first option seen for that section
+
+        :param section_name: the section whose object should be returned
+        :return: the ConfigSection object
+        """
+        section_obj = getattr(self, section_name, None)
+        if section_obj is None:
+            section_obj = ConfigSection()
+            setattr(self, section_name, section_obj)
+        return section_obj
+
 
 class ConfigSection:
     """ A Simple Object to be used to get cfg.section.option """
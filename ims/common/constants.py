@@ -30,19 +30,52 @@ FS_DRIVER_OPT = 'fs'
 
 # Network Isolator Keys
 NET_ISOLATOR_URL_OPT = 'url'
+NET_ISOLATOR_PARALLEL_CALLS_OPT = 'parallel_calls'
+NET_ISOLATOR_POOL_SIZE_OPT = 'pool_size'
+NET_ISOLATOR_CONNECT_TIMEOUT_OPT = 'connect_timeout'
+NET_ISOLATOR_READ_TIMEOUT_OPT = 'read_timeout'
+NET_ISOLATOR_CACHE_TTL_OPT = 'cache_ttl'
+NET_ISOLATOR_CACHE_SIZE_OPT = 'cache_size'
 
 # ISCSI Keys
 ISCSI_PASSWORD_OPT = 'password'
 ISCSI_IP_OPT = 'ip'
+ISCSI_TGT_MODE_OPT = 'tgt_mode'
+ISCSI_TGTADM_OPT = 'tgtadm'
+ISCSI_SUDO_OPT = 'sudo'
+ISCSI_CONFIG_DIR_OPT = 'config_dir'
+ISCSI_RECONCILE_INTERVAL_OPT = 'reconcile_interval'
 
 # DB
 DB_PATH_OPT = 'path'
+DB_URL_OPT = 'url'
+DB_POOL_SIZE_OPT = 'pool_size'
+DB_MAX_OVERFLOW_OPT = 'max_overflow'
+DB_POOL_RECYCLE_OPT = 'pool_recycle'
+DB_POOL_PRE_PING_OPT = 'pool_pre_ping'
+DB_NAME_CACHE_SIZE_OPT = 'name_cache_size'
+DB_NAME_CACHE_TTL_OPT = 'name_cache_ttl'
+DB_GROUP_COMMIT_WINDOW_OPT = 'group_commit_window'
+DB_GROUP_COMMIT_SIZE_OPT = 'group_commit_size'
+DB_JOURNAL_MODE_OPT = 'journal_mode'
+DB_SYNCHRONOUS_OPT = 'synchronous'
+DB_BUSY_TIMEOUT_OPT = 'busy_timeout'
+SQLITE_URL_PREFIX = 'sqlite:///'
+POSTGRESQL_DIALECT = 'postgresql'
 
 # Ceph Keys in Config File
 CEPH_ID_OPT = 'id'
 CEPH_POOL_OPT = 'pool'
 CEPH_CONFIG_FILE_OPT = 'conf_file'
 CEPH_KEY_RING_OPT = 'keyring'
+CEPH_IOCTX_POOL_SIZE_OPT = 'ioctx_pool_size'
+CEPH_PARALLEL_CALLS_OPT = 'parallel_calls'
+CEPH_IMAGE_CACHE_SIZE_OPT = 'image_cache_size'
+CEPH_FLATTEN_WORKERS_OPT = 'flatten_workers'
+CEPH_FLATTEN_POOL_LIMIT_OPT = 'flatten_pool_limit'
+CEPH_SYSFS_ROOT_OPT = 'sysfs_root'
+CEPH_MAP_HELPER_OPT = 'map_helper'
+CEPH_MAP_SUDO_OPT = 'map_sudo'
 
 # ISCSI
 ISCSI_UPDATE_SUCCESS = 'successfully'
@@ -66,6 +99,7 @@ REST_API_PORT_OPT = 'port'
 LOGS_PATH_OPT = 'path'
 LOGS_DEBUG_OPT = 'debug'
 LOGS_VERBOSE_OPT = 'verbose'
+LOGS_DECORATORS_OPT = 'decorators'
 
 # TFTP
 PXELINUX_PATH_OPT = 'pxelinux_path'
@@ -75,24 +109,76 @@ IPXE_PATH_OPT = 'ipxe_path'
 UID_OPT = 'uid'
 SERVICE_OPT = 'service'
 SNAPSHOT_OPT = 'snapshot'
+JOB_WORKERS_OPT = 'job_workers'
 
 # Response Related Keys
 STATUS_CODE_KEY = 'status_code'
 RETURN_VALUE_KEY = 'retval'
 MESSAGE_KEY = 'msg'
 
+# Separates the image and the snapshot of a ceph snapshot in the entries of
+# a bulk import (like centos7@base) and the results of its entries
+CEPH_SNAPSHOT_SEPARATOR = '@'
+IMPORT_DONE = 'imported'
+IMPORT_SKIPPED = 'skipped'
+
+# Name prefix of the pre-cloned disks kept in the warm pool, users cannot
+# create images with this prefix so these disks are hidden from listings
+STANDBY_DISK_PREFIX = '.standby-'
+
+# Job Related Keys
+JOB_ID_KEY = 'id'
+JOB_COMMAND_KEY = 'command'
+JOB_ARGS_KEY = 'args'
+JOB_STATE_KEY = 'state'
+JOB_PROGRESS_KEY = 'progress'
+JOB_RESULT_KEY = 'result'
+JOB_CREATED_KEY = 'created'
+JOB_STARTED_KEY = 'started'
+JOB_FINISHED_KEY = 'finished'
+
+# Flatten Related Keys, the other keys are the ones of jobs
+FLATTEN_IMAGE_KEY = 'image'
+
+# Job States
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+
 # Commands
 LIST_IMAGES_COMMAND = "list_images"
+LIST_ALL_IMAGES_COMMAND = "list_all_images"
 CREATE_SNAPSHOT_COMMAND = "create_snapshot"
 CREATE_DISK_COMMAND = "create_disk"
+CREATE_DISKS_COMMAND = "create_disks"
+IMPORT_CEPH_IMAGE_COMMAND = "import_ceph_image"
+IMPORT_CEPH_SNAPSHOT_COMMAND = "import_ceph_snapshot"
+IMPORT_CEPH_IMAGES_COMMAND = "import_ceph_images"
+EXPORT_CEPH_IMAGE_COMMAND = "export_ceph_image"
+COPY_IMAGE_COMMAND = "copy_image"
+SET_WARM_POOL_COMMAND = "set_warm_pool"
+SHOW_WARM_POOL_COMMAND = "show_warm_pool"
+SHOW_FLATTENS_COMMAND = "show_flattens"
+SUBMIT_JOB_COMMAND = "submit_job"
+LIST_JOBS_COMMAND = "list_jobs"
+SHOW_JOB_COMMAND = "show_job"
+CANCEL_JOB_COMMAND = "cancel_job"
 DELETE_DISK_COMMAND = "delete_disk"
+MOUNT_IMAGE_COMMAND = "mount_image"
+UMOUNT_IMAGE_COMMAND = "umount_image"
 PROVISION_COMMAND = "provision"
 DEPROVISION_COMMAND = "deprovision"
 LIST_SNAPSHOTS_COMMAND = "list_snapshots"
 REMOVE_IMAGE_COMMAND = "remove_image"
+SHOW_METRICS_COMMAND = "show_metrics"
+PROVISION_MANY_COMMAND = "provision_many"
+DEPROVISION_MANY_COMMAND = "deprovision_many"
 
 # Parameters
 DISK_NAME_PARAMETER = 'disk_name'
+DISK_NAMES_PARAMETER = 'disk_names'
 NODE_NAME_PARAMETER = 'node'
 IMAGE_NAME_PARAMETER = "img"
 SNAP_NAME_PARAMETER = "snap_name"
@@ -102,7 +188,21 @@ DEST_PROJECT_PARAMETER = "dest_project"
 IMAGE1_NAME_PARAMETER = "img1"
 IMAGE2_NAME_PARAMETER = "img2"
 NIC_PARAMETER = "nic"
+NODES_PARAMETER = "nodes"
+COMMAND_PARAMETER = "command"
+ARGS_PARAMETER = "args"
+JOB_ID_PARAMETER = "job_id"
+LOW_PARAMETER = "low"
+HIGH_PARAMETER = "high"
 CHANNEL_PARAMETER = "channel"
+LIMIT_PARAMETER = "limit"
+AFTER_PARAMETER = "after"
+FILTER_PROJECT_PARAMETER = "filter_project"
+FILTER_NAME_PARAMETER = "filter_name"
+FILTER_CEPH_PARAMETER = "filter_ceph"
+SNAPSHOTS_PARAMETER = "snapshots"
+CLONES_PARAMETER = "clones"
+PUBLIC_PARAMETER = "public"
 
 # Template Parameters
 IPXE_TARGET_NAME = "${target_name}"
@@ -116,6 +216,12 @@ IET_MAPPING_TEMP = 'Target iqn.2015.${ceph_img_name}\n        ' \
                    'Lun 0 Path=${rbd_name},Type=blockio,ScsiId=lun0,ScsiSN=' \
                    'lun0\n'
 IET_ISCSI_CONFIG_LOC = '/etc/iet/ietd.conf'
+TGT_DEFAULT_CONFIG_DIR = '/etc/tgt/conf.d/'
+TGT_ADMIN_MODE = 'admin'
+TGT_DIRECT_MODE = 'direct'
+# The mode page tgt-admin sets for write-cache off
+TGT_WRITE_CACHE_OFF_MODE_PAGE = '8:0:18:0x10:0:0xff:0xff:0:0:0xff:0xff:0xff:' \
+                                '0xff:0x80:0x14:0:0:0:0:0:0'
 IET_ISCSI_CONFIG_TEMP_LOC = '/etc/iet/ietd.temp'
 IET_TARGET_STARTING = 'Target'
 IET_LUN_STARTING = "Lun"
@@ -124,6 +230,101 @@ DNSMASQ_LEASES_LOC = '/var/lib/misc/dnsmasq.leases'
 
 HIL_CALL_TIMEOUT = 10
 
+# Seconds between the checks of the target registry against the iscsi server
+DEFAULT_ISCSI_RECONCILE_INTERVAL = 300
+
+# Number of idle ceph ioctxs einstein keeps open between requests
+DEFAULT_IOCTX_POOL_SIZE = 8
+
+# Maximum number of concurrent HIL calls made by a batch operation
+DEFAULT_HIL_PARALLEL_CALLS = 16
+
+# Number of keep-alive connections kept to HIL and the seconds to wait for a
+# connection to HIL and for its response
+DEFAULT_HIL_POOL_SIZE = DEFAULT_HIL_PARALLEL_CALLS
+DEFAULT_HIL_CONNECT_TIMEOUT = 5
+DEFAULT_HIL_READ_TIMEOUT = HIL_CALL_TIMEOUT
+
+# Seconds for which HIL node and project lookups are cached and the maximum
+# number of lookups that are cached
+DEFAULT_HIL_CACHE_TTL = 60
+DEFAULT_HIL_CACHE_SIZE = 4096
+
+# Maximum number of concurrent ceph calls made by a batch operation
+DEFAULT_CEPH_PARALLEL_CALLS = 8
+
+# Number of rbd images a request keeps open while it runs
+DEFAULT_CEPH_IMAGE_CACHE_SIZE = 16
+
+# Number of threads that flatten images, maximum number of flattens run at
+# once on a ceph pool (0 is only bounded by the threads) and number of
+# finished flattens remembered
+DEFAULT_FLATTEN_WORKERS = 4
+DEFAULT_FLATTEN_POOL_LIMIT = 0
+DEFAULT_FLATTEN_HISTORY = 100
+
+# Where sysfs is mounted, the kernel rbd driver is under bus/rbd in it
+DEFAULT_SYSFS_ROOT = '/sys'
+RBD_SYSFS_DIR = 'bus/rbd'
+RBD_DEVICE_PREFIX = '/dev/rbd'
+# The current_snap of a device that maps the head of an image
+RBD_NO_SNAP = '-'
+
+# The script installed by setup.py that maps and unmaps rbd devices as root
+DEFAULT_MAP_HELPER = 'bmi-rbd-helper'
+# Requests understood by the rbd map helper and its reply on success
+MAP_HELPER_PING = 'ping'
+MAP_HELPER_ADD = 'add'
+MAP_HELPER_REMOVE = 'remove'
+MAP_HELPER_OK = 'ok'
+# Seconds to wait for the map helper to answer once started, sudo reading
+# the password from its stdin waits for another one if it is wrong
+MAP_HELPER_START_TIMEOUT = 10
+
+# Seconds between the progress updates given to the job waiting for a
+# flatten
+FLATTEN_PROGRESS_INTERVAL = 1
+
+# Number of threads that run jobs and number of finished jobs remembered
+DEFAULT_JOB_WORKERS = 4
+DEFAULT_JOB_HISTORY = 1000
+
+# Connections kept open to a db server (not sqlite), the extra connections
+# opened under load, the seconds after which a connection is replaced and
+# whether connections are checked before they are used
+DEFAULT_DB_POOL_SIZE = 5
+DEFAULT_DB_MAX_OVERFLOW = 10
+DEFAULT_DB_POOL_RECYCLE = 3600
+DEFAULT_DB_POOL_PRE_PING = True
+
+# Maximum number of project and image ids cached by name and the seconds
+# for which they are cached
+DEFAULT_DB_NAME_CACHE_SIZE = 4096
+DEFAULT_DB_NAME_CACHE_TTL = 60
+
+# Seconds for which concurrent writes are gathered into one commit (0 commits
+# every write on its own) and the most writes in one commit
+DEFAULT_DB_GROUP_COMMIT_WINDOW = 0
+DEFAULT_DB_GROUP_COMMIT_SIZE = 64
+
+# The journal of sqlite dbs, how often sqlite fsyncs and the seconds a
+# connection waits for the lock of another writer
+DEFAULT_DB_JOURNAL_MODE = 'WAL'
+DEFAULT_DB_SYNCHRONOUS = 'NORMAL'
+DEFAULT_DB_BUSY_TIMEOUT = 5
+
+# Maximum number of ids in one IN clause as old versions of SQLite only allow
+# 999 parameters in a query
+DB_MAX_IN_CLAUSE_SIZE = 500
+
+# Commands that can be run as jobs and the number of arguments they take
+JOB_COMMANDS = {IMPORT_CEPH_IMAGE_COMMAND: 1,
+                IMPORT_CEPH_SNAPSHOT_COMMAND: 3,
+                IMPORT_CEPH_IMAGES_COMMAND: 2,
+                CREATE_SNAPSHOT_COMMAND: 2,
+                COPY_IMAGE_COMMAND: 3,
+                EXPORT_CEPH_IMAGE_COMMAND: 2}
+
 BMI_ADMIN_PROJECT = "bmi_infra"
 
 HIL_BMI_CHANNEL = "vlan/native"
@@ -1,6 +1,7 @@
-import inspect
+import functools
 import logging
 import logging.handlers
+import sys
 import traceback
 
 import os
@@ -14,52 +15,77 @@ _cfg = config.get()
 _base_path = _cfg.logs.path
 _debug = _cfg.logs.debug
 _verbose = _cfg.logs.verbose
+_decorators = _cfg.logs.decorators
+
+_special = {'special': True}
+
+
+# The caller location and the parameters are only formatted by the logging
+# module when a record is emitted, so a disabled level costs a level check
+class _Caller:
+    def __init__(self, frame):
+        self.frame = frame
+
+    def __str__(self):
+        return str.format("File '{0}', line {1} in {2}",
+                          self.frame.f_code.co_filename, self.frame.f_lineno,
+                          self.frame.f_code.co_name)
+
+
+class _Args:
+    def __init__(self, args, kwargs):
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self):
+        return format_args(*self.args, **self.kwargs)
 
 
 def log(func):
+    if not _decorators:
+        return func
+
+    logger = create_logger(func.__module__)
+    name = func.__name__
+
+    @functools.wraps(func)
     def func_wrapper(*args, **kwargs):
-        name = inspect.getmodule(func).__name__
-        logger = create_logger(name)
-        rec = inspect.stack()[1]
-        file_path = rec[1]
-        line = rec[2]
-        func_name = rec[3]
-        base_msg = str.format("File '{0}', line {1} in {2}\n", file_path, line,
-                              func_name)
-        logger.debug(base_msg + "Entering %s with Parameters\n%s",
-                     func.__name__, format_args(*args, **kwargs),
-                     extra={'special': True})
+        if not logger.isEnabledFor(logging.INFO):
+            return func(*args, **kwargs)
+        caller = _Caller(sys._getframe(1))
+        logger.debug("%s\nEntering %s with Parameters\n%s", caller, name,
+                     _Args(args, kwargs), extra=_special)
         ret = func(*args, **kwargs)
-        if func.__name__ == "__init__":
-            logger.info(base_msg + "Successfully Initialised %s instance",
-                        list(args)[0].__class__.__name__,
-                        extra={'special': True})
+        if name == "__init__":
+            logger.info("%s\nSuccessfully Initialised %s instance", caller,
+                        args[0].__class__.__name__, extra=_special)
         else:
-            logger.info(base_msg + "Successfully Executed %s",
-                        func.__name__, extra={'special': True})
-        logger.debug(base_msg + "Exiting %s with return value = %s",
-                     func.__name__, ret, extra={'special': True})
+            logger.info("%s\nSuccessfully Executed %s", caller, name,
+                        extra=_special)
+        logger.debug("%s\nExiting %s with return value = %s", caller, name,
+                     ret, extra=_special)
         return ret
 
     return func_wrapper
 
 
 def trace(func):
+    if not _decorators:
+        return func
+
+    logger = create_logger(func.__module__)
+    name = func.__name__
+
+    @functools.wraps(func)
     def func_wrapper(*args, **kwargs):
-        name = inspect.getmodule(func).__name__
-        logger = create_logger(name)
-        rec = inspect.stack()[1]
-        file_path = rec[1]
-        line = rec[2]
-        func_name = rec[3]
-        base_msg = str.format("File '{0}', line {1} in {2}\n", file_path, line,
-                              func_name)
-        logger.debug(base_msg + "Entering %s with Parameters\n%s",
-                     func.__name__, format_args(*args, **kwargs),
-                     extra={'special': True})
+        if not logger.isEnabledFor(logging.DEBUG):
+            return func(*args, **kwargs)
+        caller = _Caller(sys._getframe(1))
+        logger.debug("%s\nEntering %s with Parameters\n%s", caller, name,
+                     _Args(args, kwargs), extra=_special)
         ret = func(*args, **kwargs)
-        logger.debug(base_msg + "Exiting %s with return value = %s",
-                     func.__name__, ret, extra={'special': True})
+        logger.debug("%s\nExiting %s with return value = %s", caller, name,
+                     ret, extra=_special)
         return ret
 
     return func_wrapper
@@ -67,8 +93,8 @@ def trace(func):
 
 def format_args(*args, **kwargs):
     string = ""
-    l = list(args)
-    for arg in l:
+    arg_list = list(args)
+    for arg in arg_list:
         string += str(arg) + "\n"
 
     for k, v in kwargs.iteritems():
@@ -0,0 +1,50 @@
+# Process wide counters used to observe the behaviour of einstein
+# (connection reuse, cache hit rates, etc.)
+# All functions are thread safe as einstein serves requests from a thread pool
+import threading
+
+_counters = {}
+_lock = threading.Lock()
+
+
+def increment(name, value=1):
+    """
+    Increments the given counter, creating it if required
+
+    :param name: the name of the counter like ceph.ioctx_reused
+    :param value: the amount by which the counter should be increased
+    :return: None
+    """
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def get(name):
+    """
+    Returns the current value of the given counter
+
+    :param name: the name of the counter
+    :return: the value of the counter or 0 if it was never incremented
+    """
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def snapshot():
+    """
+    Returns a copy of all the counters
+
+    :return: a dict of counter name to value
+    """
+    with _lock:
+        return dict(_counters)
+
+
+def reset():
+    """
+    Clears all counters, only meant to be used by tests
+
+    :return: None
+    """
+    with _lock:
+        _counters.clear()
@@ -0,0 +1,26 @@
+# Helpers for running independent calls concurrently from einstein
+# Threads are used as the calls are network bound (HIL, ceph)
+from multiprocessing.pool import ThreadPool
+
+
+def map(func, items, workers):
+    """
+    Calls func on every item using at most workers threads
+
+    :param func: the function to call, must be thread safe
+    :param items: the list of arguments, func is called once per item
+    :param workers: the maximum number of concurrent calls
+    :return: the list of return values in the same order as items
+    """
+    items = list(items)
+    if not items:
+        return []
+    if workers <= 1 or len(items) == 1:
+        return [func(item) for item in items]
+
+    pool = ThreadPool(min(workers, len(items)))
+    try:
+        return pool.map(func, items)
+    finally:
+        pool.terminate()
+        pool.join()
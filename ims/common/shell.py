@@ -27,6 +27,9 @@ def call(command, sudo=False):
         return output
     except subprocess.CalledProcessError as e:
         raise shell_exceptions.CommandFailedException(str(e))
+    except OSError as e:
+        # Like when the command is not installed
+        raise shell_exceptions.CommandFailedException(str(e))
 
 
 @trace
@@ -2,14 +2,16 @@ from ims.common.log import log
 from ims.database.db_connection import DatabaseConnection
 from ims.database.image import ImageRepository
 from ims.database.project import ProjectRepository
+from ims.database.warm_pool import WarmPoolRepository
 
 
 class Database:
     @log
-    def __init__(self):
-        self.__connection = DatabaseConnection()
+    def __init__(self, read_only=False):
+        self.__connection = DatabaseConnection(read_only)
         self.project = ProjectRepository(self.__connection)
         self.image = ImageRepository(self.__connection)
+        self.warm_pool = WarmPoolRepository(self.__connection)
 
     def __enter__(self):
         return self
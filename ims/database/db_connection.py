@@ -1,14 +1,61 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine.url import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import SingletonThreadPool
 
 import ims.common.config as config
 import ims.common.constants as constants
+from ims.common.cache import TTLCache
+from ims.database.group_commit import GroupCommitter
 
 _cfg = config.get()
 
 
+def create_db_engine(db_cfg, read_only=False):
+    """
+    Creates the engine for the database in the db section of the config
+
+    SQLite keeps a single connection per thread as it does not handle
+    concurrent writers. Its connections use the journal_mode and synchronous
+    level of the config (WAL and NORMAL by default, so that readers do not
+    wait for writers and a commit does not fsync the db) and wait up to
+    busy_timeout seconds for the lock of another writer. Every other backend
+    (like PostgreSQL) gets a queue pool of pool_size connections that can
+    grow by max_overflow under load.
+
+    :param db_cfg: the db section of the config
+    :param read_only: whether the connections must refuse writes
+    :return: the sqlalchemy engine
+    """
+    url = make_url(db_cfg.url)
+    if url.get_backend_name() == 'sqlite':
+        engine = create_engine(url, poolclass=SingletonThreadPool,
+                               connect_args={'timeout': db_cfg.busy_timeout})
+        pragmas = ["PRAGMA journal_mode={0}".format(db_cfg.journal_mode),
+                   "PRAGMA synchronous={0}".format(db_cfg.synchronous)]
+        if read_only:
+            pragmas.append("PRAGMA query_only=ON")
+    else:
+        engine = create_engine(url, pool_size=db_cfg.pool_size,
+                               max_overflow=db_cfg.max_overflow,
+                               pool_recycle=db_cfg.pool_recycle,
+                               pool_pre_ping=db_cfg.pool_pre_ping)
+        pragmas = ["SET SESSION CHARACTERISTICS AS TRANSACTION READ ONLY"] \
+            if read_only else []
+
+    if pragmas:
+        @event.listens_for(engine, 'connect')
+        def configure(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+            dbapi_connection.commit()
+
+    return engine
+
+
 # The class which represents the BMI database
 # It is responsible for creating and closing sessions
 class DatabaseConnection:
@@ -18,19 +65,70 @@ class DatabaseConnection:
     # the engine and session maker are made static so that only one of them
     # needs to be created
     # creates the engine for the database
-    # sample_bmi.db should be changed to something more realistic
-    # NullPool pool class is equivalent to no connection pool
-    # Should be adapted to postgres SQL
-    engine = create_engine('sqlite:///' + _cfg.db.path,
-                           poolclass=SingletonThreadPool)
+    engine = create_db_engine(_cfg.db)
 
     # creates a session maker for creating sessions
     session_maker = sessionmaker(bind=engine)
 
-    # creates all tables if not present
-    def __init__(self):
-        DatabaseConnection.Base.metadata.create_all(DatabaseConnection.engine)
-        self.session = DatabaseConnection.session_maker()
+    # listings use sessions on their own read-only connections so that they
+    # never queue behind the session of a write
+    read_engine = create_db_engine(_cfg.db, read_only=True)
+    read_session_maker = sessionmaker(bind=read_engine)
+
+    # project ids keyed by (PROJECT_KEY, project name) and image ids keyed by
+    # (IMAGE_KEY, project name, image name), shared by all sessions. The
+    # repositories remove the entries of the rows they change.
+    name_cache = TTLCache('db.name_cache', _cfg.db.name_cache_size,
+                          _cfg.db.name_cache_ttl)
+    PROJECT_KEY = 'project'
+    IMAGE_KEY = 'image'
+
+    # writes of concurrent requests are committed together by the committer
+    # if a group commit window is configured, otherwise each write commits
+    # on its own
+    committer = GroupCommitter(session_maker, _cfg.db.group_commit_window,
+                               _cfg.db.group_commit_size) \
+        if _cfg.db.group_commit_window > 0 else None
+
+    # the tables are created by migrations.upgrade when einstein starts, so
+    # making a connection does no DDL
+    def __init__(self, read_only=False):
+        self.session = DatabaseConnection.read_session_maker() if read_only \
+            else DatabaseConnection.session_maker()
+
+    # Applies the mutation (a function taking a session that makes changes
+    # without committing) and commits it, returns what the mutation returned.
+    # If the mutation or the commit fails nothing is committed and the
+    # exception is raised.
+    def write(self, mutation):
+        if self.committer is not None:
+            # Ends the read transaction of the session so that it holds no
+            # lock the committer waits for, the objects it loaded are
+            # expired and see the committed changes
+            self.session.rollback()
+            return self.committer.submit(mutation)
+        try:
+            ret = mutation(self.session)
+            self.session.commit()
+            return ret
+        except Exception:
+            self.session.rollback()
+            raise
+
+    # Rows inserted with an explicit id do not advance the sequence of a
+    # postgres serial column, so the next row without an id would get an id
+    # that is already taken. Must be called after the rows are flushed.
+    # The next id is the highest one plus one (1 for an empty table) like
+    # sqlite gives.
+    @staticmethod
+    def sync_id_sequence(session, table_name):
+        if session.bind.dialect.name != constants.POSTGRESQL_DIALECT:
+            return
+        session.execute(
+            text("SELECT setval(pg_get_serial_sequence(:table, 'id'), "
+                 "(SELECT COALESCE(MAX(id), 0) + 1 FROM {0}), false)".format(
+                     table_name)),
+            {'table': table_name})
 
     def close(self):
         self.session.close()
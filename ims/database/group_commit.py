@@ -0,0 +1,142 @@
+import Queue
+import threading
+import time
+
+import ims.common.metrics as metrics
+from ims.common.log import create_logger, log, trace
+
+logger = create_logger(__name__)
+
+
+class _Write:
+    """ A mutation waiting to be committed and its outcome """
+
+    def __init__(self, mutation):
+        self.mutation = mutation
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class GroupCommitter:
+    """
+    Commits the writes of concurrent requests together so that they share
+    one transaction (and one fsync on SQLite).
+
+    A write is a function taking a session that makes its changes without
+    committing. The writes that arrive within window seconds of the first
+    one, up to size of them, are applied in order and flushed one by one.
+    If a write fails the transaction is rolled back, only that write gets
+    the error and the others are applied again, so every caller sees the
+    outcome of its own write as if it had committed alone.
+    """
+
+    @log
+    def __init__(self, session_maker, window, size):
+        self.session_maker = session_maker
+        self.window = window
+        self.size = size
+        self.__queue = Queue.Queue()
+        self.__lock = threading.Lock()
+        self.__thread = None
+
+    @log
+    def submit(self, mutation):
+        """
+        Applies the mutation in the next group commit and waits for it
+
+        :param mutation: function taking a session and making changes to it
+        without committing
+        :return: what mutation returned
+        """
+        write = _Write(mutation)
+        with self.__lock:
+            # The committer is started on first use so that processes which
+            # never write do not get an idle thread
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__work,
+                                                 name="bmi-group-commit")
+                self.__thread.daemon = True
+                self.__thread.start()
+            self.__queue.put(write)
+        write.done.wait()
+        if write.error is not None:
+            raise write.error
+        return write.result
+
+    @log
+    def shutdown(self):
+        """
+        Stops the committer after the writes that were submitted
+
+        :return: None
+        """
+        with self.__lock:
+            thread = self.__thread
+            self.__thread = None
+            if thread is not None:
+                self.__queue.put(None)
+        if thread is not None:
+            thread.join()
+
+    def __work(self):
+        stop = False
+        while not stop:
+            write = self.__queue.get()
+            if write is None:
+                return
+            batch = [write]
+            deadline = time.time() + self.window
+            while len(batch) < self.size:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                try:
+                    write = self.__queue.get(timeout=timeout)
+                except Queue.Empty:
+                    break
+                if write is None:
+                    stop = True
+                    break
+                batch.append(write)
+            self.__commit(batch)
+
+    @trace
+    def __commit(self, batch):
+        session = self.session_maker()
+        pending = list(batch)
+        try:
+            while pending:
+                failed = None
+                for write in pending:
+                    try:
+                        write.result = write.mutation(session)
+                        session.flush()
+                    except Exception as e:
+                        write.error = e
+                        failed = write
+                        break
+                if failed is None:
+                    break
+                session.rollback()
+                pending.remove(failed)
+
+            if pending:
+                try:
+                    session.commit()
+                except Exception as e:
+                    logger.exception('')
+                    session.rollback()
+                    for write in pending:
+                        write.error = e
+                metrics.increment('db.group_commit.commits')
+                metrics.increment('db.group_commit.writes', len(pending))
+        except Exception as e:
+            # Unexpected errors (like a lost connection) fail the whole batch
+            logger.exception('')
+            for write in pending:
+                write.error = write.error or e
+        finally:
+            session.close()
+            for write in batch:
+                write.done.set()
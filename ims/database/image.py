@@ -1,9 +1,10 @@
 from sqlalchemy import Boolean, ForeignKey
-from sqlalchemy import Column, Integer, String
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import Column, Index, Integer, String
+from sqlalchemy import UniqueConstraint, and_, or_
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import aliased, relationship
 
+import ims.common.constants as constants
 import ims.exception.db_exceptions as db_exceptions
 from ims.common.log import create_logger, log, trace
 from ims.database.db_connection import DatabaseConnection
@@ -21,12 +22,13 @@ class ImageRepository:
         self.connection = connection
 
     # inserts the arguments into table
-    # Commits if inserted successfully otherwise rollbacks if some issue
-    # occured and bubbles the exception
+    # Commits if inserted successfully (with the writes of other requests if
+    # group commit is enabled) otherwise rollbacks if some issue occured and
+    # bubbles the exception
     @log
     def insert(self, image_name, project_id, parent_id=None, is_public=False,
                is_snapshot=False, id=None):
-        try:
+        def insert(session):
             img = Image()
             img.name = image_name
             img.project_id = project_id
@@ -35,10 +37,52 @@ class ImageRepository:
             img.parent_id = parent_id
             if id is not None:
                 img.id = id
-            self.connection.session.add(img)
-            self.connection.session.commit()
+            session.add(img)
+            if id is not None:
+                session.flush()
+                DatabaseConnection.sync_id_sequence(session,
+                                                    Image.__tablename__)
+
+        try:
+            self.connection.write(insert)
+            self.__forget([image_name])
+        except SQLAlchemyError as e:
+            raise db_exceptions.ORMException(e.message)
+
+    # inserts several images with the same project and parent in one
+    # transaction, either all of them are inserted or none
+    @log
+    def insert_many(self, image_names, project_id, parent_id=None,
+                    is_public=False, is_snapshot=False):
+        """
+        Inserts several images in one transaction
+
+        :param image_names: the names of the images to insert
+        :param project_id: the id of the project the images belong to
+        :param parent_id: the id of the image they were cloned from
+        :return: dict of image name to the id it was given
+        """
+        def insert_many(session):
+            images = []
+            for image_name in image_names:
+                img = Image()
+                img.name = image_name
+                img.project_id = project_id
+                img.is_public = is_public
+                img.is_snapshot = is_snapshot
+                img.parent_id = parent_id
+                images.append(img)
+            session.add_all(images)
+            # flush assigns the ids, reading them after the commit would
+            # reload every image
+            session.flush()
+            return dict((img.name, img.id) for img in images)
+
+        try:
+            ids = self.connection.write(insert_many)
+            self.__forget(image_names)
+            return ids
         except SQLAlchemyError as e:
-            self.connection.session.rollback()
             raise db_exceptions.ORMException(e.message)
 
     # deletes images with name under the given project name
@@ -46,39 +90,37 @@ class ImageRepository:
     # exception is bubbled up
     @log
     def delete_with_name_from_project(self, name, project_name):
-        try:
-            image = self.connection.session.query(Image). \
-                filter(Image.project.has(name=project_name)).filter_by(
-                name=name).one_or_none()
-            if image is not None:
+        def delete(session):
+            image = self.__query_project_in(session, project_name).filter(
+                Image.name == name).one_or_none()
+            if image is None:
+                raise db_exceptions.ImageNotFoundException(name)
 
-                if self.__image_has_clones(image):
-                    raise db_exceptions.ImageHasClonesException(image)
+            if self.__image_has_clones(image):
+                raise db_exceptions.ImageHasClonesException(image)
 
-                for child in image.children:
-                    child.parent_id = None
-                    child.is_snapshot = False
-                self.connection.session.delete(image)
-                self.connection.session.commit()
-            else:
-                raise db_exceptions.ImageNotFoundException(name)
+            for child in image.children:
+                child.parent_id = None
+                child.is_snapshot = False
+            session.delete(image)
+
+        try:
+            self.connection.write(delete)
+            self.__forget([name], project_name)
         except SQLAlchemyError as e:
-            self.connection.session.rollback()
             raise db_exceptions.ORMException(e.message)
 
     @log
     def copy_image(self, src_project_name, name, dest_pid, new_name=None):
-        try:
-
-            project = self.connection.session.query(Project).filter_by(
+        def copy(session):
+            project = session.query(Project).filter_by(
                 name=src_project_name).one_or_none()
 
             if project is None:
                 raise db_exceptions.ProjectNotFoundException(src_project_name)
 
-            image = self.connection.session.query(Image). \
-                filter(Image.project.has(name=src_project_name)).filter_by(
-                name=name).one_or_none()
+            image = session.query(Image).filter_by(
+                project_id=project.id, name=name).one_or_none()
 
             if image is None:
                 raise db_exceptions.ImageNotFoundException(name)
@@ -97,27 +139,27 @@ class ImageRepository:
             else:
                 new_image.is_snapshot = False
                 new_image.parent_id = None
-            self.connection.session.add(new_image)
-            self.connection.session.commit()
+            session.add(new_image)
+            return new_image.name
+
+        try:
+            self.__forget([self.connection.write(copy)])
         except SQLAlchemyError as e:
-            self.connection.session.rollback()
             raise db_exceptions.ORMException(e.message)
 
     # Need to throw errors
     @log
     def move_image(self, src_project_name, name, dest_project_id,
                    new_name=None):
-        try:
-
-            project = self.connection.session.query(Project).filter_by(
+        def move(session):
+            project = session.query(Project).filter_by(
                 name=src_project_name).one_or_none()
 
             if project is None:
                 raise db_exceptions.ProjectNotFoundException(src_project_name)
 
-            image = self.connection.session.query(Image). \
-                filter(Image.project.has(name=src_project_name)).filter_by(
-                name=name).one_or_none()
+            image = session.query(Image).filter_by(
+                project_id=project.id, name=name).one_or_none()
 
             if image is None:
                 raise db_exceptions.ImageNotFoundException(name)
@@ -128,9 +170,13 @@ class ImageRepository:
                 image.is_snapshot = False
             if new_name is not None:
                 image.name = new_name
-            self.connection.session.commit()
+            return image.name
+
+        try:
+            moved_name = self.connection.write(move)
+            self.__forget([name], src_project_name)
+            self.__forget([moved_name])
         except SQLAlchemyError as e:
-            self.connection.session.rollback()
             raise db_exceptions.ORMException(e.message)
 
     # fetch image ids with name in project with name
@@ -145,13 +191,17 @@ class ImageRepository:
         :return: the id of the image.
         """
 
+        key = (DatabaseConnection.IMAGE_KEY, project_name, name)
+        image_id = self.connection.name_cache.get(key)
+        if image_id is not None:
+            return image_id
         try:
-            image = self.connection.session.query(Image). \
-                filter(Image.project.has(name=project_name)).filter_by(
-                name=name).one_or_none()
-            if image is None:
+            image_id = self.__query_project(project_name, Image.id).filter(
+                Image.name == name).scalar()
+            if image_id is None:
                 raise db_exceptions.ImageNotFoundException(name)
-            return image.id
+            self.connection.name_cache.put(key, image_id)
+            return image_id
         except SQLAlchemyError as e:
             raise db_exceptions.ORMException(e.message)
 
@@ -162,9 +212,9 @@ class ImageRepository:
     @log
     def fetch_names_with_public(self):
         try:
-            img_list = self.connection.session.query(Image).filter_by(
+            images = self.connection.session.query(Image.name).filter_by(
                 is_public=True)
-            return [image.name for image in img_list]
+            return [image.name for image in images]
         except SQLAlchemyError as e:
             raise db_exceptions.ORMException(e.message)
 
@@ -173,60 +223,58 @@ class ImageRepository:
     @log
     def fetch_names_from_project(self, project_name):
         try:
-            images = self.connection.session.query(Image).filter(
-                Image.project.has(name=project_name))
+            images = self.__query_project(project_name, Image.name).filter(
+                ~Image.name.startswith(constants.STANDBY_DISK_PREFIX))
             return [image.name for image in images]
         except SQLAlchemyError as e:
             raise db_exceptions.ORMException(e.message)
 
+    # images are ordered by name, a page starts after the name given as
+    # after and has at most limit images
     @log
-    def fetch_images_from_project(self, project_name):
+    def fetch_images_from_project(self, project_name, limit=None,
+                                  after=None):
         try:
-            images = self.connection.session.query(Image).filter(
-                Image.project.has(name=project_name))
-            names = []
-            for image in images:
-                if image.parent is None:
-                    names.append(image.name)
-            return names
+            images = self.__query_project(project_name, Image.name).filter(
+                Image.parent_id.is_(None))
+            images = self.__page(images, Image.name, limit, after)
+            return [image.name for image in images]
         except SQLAlchemyError as e:
             raise db_exceptions.ORMException(e.message)
 
+    # snapshots are ordered by name and paged like fetch_images_from_project
     @log
-    def fetch_snapshots_from_project(self, project_name):
+    def fetch_snapshots_from_project(self, project_name, limit=None,
+                                     after=None):
         try:
-            images = self.connection.session.query(Image).filter(
-                Image.project.has(name=project_name)).filter_by(
-                is_snapshot=True)
-            return [[image.name, image.parent.name] for image in images]
+            parent = aliased(Image)
+            images = self.__query_project(project_name, Image.name,
+                                          parent.name).join(
+                parent, Image.parent_id == parent.id).filter(
+                Image.is_snapshot.is_(True))
+            images = self.__page(images, Image.name, limit, after)
+            return [list(image) for image in images]
         except SQLAlchemyError as e:
             raise db_exceptions.ORMException(e.message)
 
     @log
     def fetch_clones_from_project(self, project_name):
         try:
-            images = self.connection.session.query(Image).filter(
-                Image.project.has(name=project_name)).filter_by(
-                is_snapshot=False)
-            rows = []
-            for image in images:
-                row = []
-                if image.parent is not None:
-                    row.append(image.name)
-                    row.append(image.parent.name)
-                    rows.append(row)
-            return rows
+            parent = aliased(Image)
+            images = self.__query_project(project_name, Image.name,
+                                          parent.name).join(
+                parent, Image.parent_id == parent.id).filter(
+                Image.is_snapshot.is_(False)).filter(
+                ~Image.name.startswith(constants.STANDBY_DISK_PREFIX))
+            return [list(image) for image in images]
         except SQLAlchemyError as e:
             raise db_exceptions.ORMException(e.message)
 
     @log
     def fetch_parent_id(self, project_name, name):
         try:
-            image = self.connection.session.query(Image). \
-                filter(Image.project.has(name=project_name)).filter_by(
-                name=name).one_or_none()
-            if image is not None and image.parent_id is not None:
-                return image.parent_id
+            return self.__query_project(project_name, Image.parent_id).filter(
+                Image.name == name).scalar()
         except SQLAlchemyError as e:
             raise db_exceptions.ORMException(e.message)
 
@@ -238,19 +286,130 @@ class ImageRepository:
             raise db_exceptions.ORMException(e.message)
 
     @log
-    def fetch_all_images(self):
+    def fetch_all_images(self, project_name=None, name=None, id=None,
+                         snapshots=False, clones=False, public=False,
+                         limit=None, after=None):
+        """
+        Lists the images of all projects ordered by id
+
+        :param project_name: only images of this project if given
+        :param name: only images with this name if given
+        :param id: only the image with this id if given
+        :param snapshots: include snapshots, if none of snapshots, clones
+        and public is set every kind of image is included
+        :param clones: include clones that are not snapshots
+        :param public: include public images
+        :param limit: the maximum number of images returned
+        :param after: only images with an id greater than this
+        :return: list of [id, name, project name, is public, is snapshot,
+        parent name or ''], standby disks are left out
+        """
         try:
-            images = self.connection.session.query(Image)
-            rows = []
-            for image in images:
-                row = [image.id, image.name, image.project.name,
-                       image.is_public, image.is_snapshot]
-                if image.parent is not None:
-                    row.append(image.parent.name)
-                else:
-                    row.append('')
-                rows.append(row)
-            return rows
+            parent = aliased(Image)
+            images = self.connection.session.query(
+                Image.id, Image.name, Project.name, Image.is_public,
+                Image.is_snapshot, parent.name).join(
+                Project, Image.project_id == Project.id).outerjoin(
+                parent, Image.parent_id == parent.id).filter(
+                ~Image.name.startswith(constants.STANDBY_DISK_PREFIX))
+            if project_name is not None:
+                images = images.filter(Project.name == project_name)
+            if name is not None:
+                images = images.filter(Image.name == name)
+            if id is not None:
+                images = images.filter(Image.id == id)
+            kinds = []
+            if snapshots:
+                kinds.append(Image.is_snapshot.is_(True))
+            if clones:
+                kinds.append(and_(Image.is_snapshot.is_(False),
+                                  Image.parent_id.isnot(None)))
+            if public:
+                kinds.append(Image.is_public.is_(True))
+            if kinds:
+                images = images.filter(or_(*kinds))
+            images = self.__page(images, Image.id, limit, after)
+            return [[id, name, project_name, is_public, is_snapshot,
+                     parent_name or ''] for
+                    id, name, project_name, is_public, is_snapshot,
+                    parent_name in images]
+        except SQLAlchemyError as e:
+            raise db_exceptions.ORMException(e.message)
+
+    @log
+    def fetch_project_id_with_id(self, id):
+        try:
+            image = self.connection.session.query(Image).filter_by(
+                id=id).one_or_none()
+            if image is not None:
+                return image.project_id
+        except SQLAlchemyError as e:
+            raise db_exceptions.ORMException(e.message)
+
+    # fetch the ids of the standby disks cloned from the given image
+    # standby disks are clones whose name starts with STANDBY_DISK_PREFIX
+    @log
+    def fetch_standby_ids(self, parent_id):
+        try:
+            images = self.connection.session.query(Image.id).filter_by(
+                parent_id=parent_id).filter(
+                Image.name.startswith(constants.STANDBY_DISK_PREFIX))
+            return [image.id for image in images]
+        except SQLAlchemyError as e:
+            raise db_exceptions.ORMException(e.message)
+
+    # whether the image with the given id has clones other than its standby
+    # disks, which must be deleted before the image
+    @log
+    def has_clones_with_id(self, id):
+        try:
+            clones = self.connection.session.query(Image.id).filter_by(
+                parent_id=id, is_snapshot=False).filter(
+                ~Image.name.startswith(constants.STANDBY_DISK_PREFIX))
+            return clones.first() is not None
+        except SQLAlchemyError as e:
+            raise db_exceptions.ORMException(e.message)
+
+    # renames the standby disk with the given id, this is how a standby disk
+    # is handed to a user as its ceph name and iscsi target depend on the id.
+    # Returns False when the disk is no longer a standby disk, like when an
+    # einstein sharing the db claimed it first.
+    @log
+    def claim_standby_with_id(self, id, new_name):
+        def claim(session):
+            standby = session.query(Image).filter(
+                Image.id == id,
+                Image.name.startswith(constants.STANDBY_DISK_PREFIX))
+            old_name = session.query(Image.name).filter(
+                Image.id == id).scalar()
+            # The filter is checked again by the update itself so that only
+            # one of several concurrent claims renames the disk
+            if standby.update({Image.name: new_name},
+                              synchronize_session=False) == 0:
+                return None
+            return old_name
+
+        try:
+            old_name = self.connection.write(claim)
+        except SQLAlchemyError as e:
+            raise db_exceptions.ORMException(e.message)
+        if old_name is None:
+            return False
+        self.__forget([old_name, new_name])
+        return True
+
+    # deletes the image with the given id if present
+    @log
+    def delete_with_id(self, id):
+        def delete(session):
+            name = session.query(Image.name).filter_by(id=id).scalar()
+            session.query(Image).filter_by(id=id).delete()
+            return name
+
+        try:
+            name = self.connection.write(delete)
+            if name is not None:
+                self.__forget([name])
         except SQLAlchemyError as e:
             raise db_exceptions.ORMException(e.message)
 
@@ -265,6 +424,32 @@ class ImageRepository:
         except SQLAlchemyError as e:
             raise db_exceptions.ORMException(e.message)
 
+    # fetch the name and project name of several images in one query (or one
+    # per DB_MAX_IN_CLAUSE_SIZE ids), ids that do not exist are left out
+    @log
+    def fetch_names_and_projects_with_ids(self, ids):
+        """
+        Resolves image ids to their names and projects
+
+        :param ids: the ids of the images
+        :return: dict of image id to [image name, project name]
+        """
+        try:
+            ids = list(set(ids))
+            names = {}
+            for start in range(0, len(ids),
+                               constants.DB_MAX_IN_CLAUSE_SIZE):
+                images = self.connection.session.query(
+                    Image.id, Image.name, Project.name).join(
+                    Project, Image.project_id == Project.id).filter(
+                    Image.id.in_(
+                        ids[start:start + constants.DB_MAX_IN_CLAUSE_SIZE]))
+                for id, name, project_name in images:
+                    names[id] = [name, project_name]
+            return names
+        except SQLAlchemyError as e:
+            raise db_exceptions.ORMException(e.message)
+
     @log
     def fetch_project_with_id(self, id):
         try:
@@ -275,6 +460,43 @@ class ImageRepository:
         except SQLAlchemyError as e:
             raise db_exceptions.ORMException(e.message)
 
+    # Query on the images of the project with the given name. The project is
+    # joined so that it is looked up once through the index on its name
+    # instead of once per image by an EXISTS subquery. Listings should pass
+    # the columns they need as entities so that no relationship is loaded
+    # per image.
+    def __query_project(self, project_name, *entities):
+        return self.__query_project_in(self.connection.session, project_name,
+                                       *entities)
+
+    # The same query in the given session, used by writes
+    def __query_project_in(self, session, project_name, *entities):
+        query = session.query(*(entities or (Image,)))
+        return query.select_from(Image).join(
+            Project, Image.project_id == Project.id).filter(
+            Project.name == project_name)
+
+    # Removes the cached ids of the images with these names in the given
+    # project or in every project, must be called after the change is
+    # committed
+    def __forget(self, names, project_name=None):
+        names = set(names)
+        self.connection.name_cache.invalidate(
+            lambda key: key[0] == DatabaseConnection.IMAGE_KEY and
+            key[2] in names and
+            (project_name is None or key[1] == project_name))
+
+    # Keyset pagination, the rows are ordered by key which must be unique in
+    # the query so that a page can start right after the last row of the
+    # previous one without counting the rows before it
+    def __page(self, query, key, limit, after):
+        if after is not None:
+            query = query.filter(key > after)
+        query = query.order_by(key)
+        if limit is not None:
+            query = query.limit(limit)
+        return query
+
     def __image_has_clones(self, image):
         for child in image.children:
             if not child.is_snapshot:
@@ -297,7 +519,8 @@ class Image(DatabaseConnection.Base):
     is_public = Column(Boolean, nullable=False, default=False)
     is_snapshot = Column(Boolean, nullable=False, default=False)
     project_id = Column(Integer, ForeignKey("project.id"), nullable=False)
-    parent_id = Column(Integer, ForeignKey("image.id"), nullable=True)
+    parent_id = Column(Integer, ForeignKey("image.id"), nullable=True,
+                       index=True)
 
     # Relationships in the table
     # Back populates to images in Project Class and is eagerly loaded
@@ -307,9 +530,14 @@ class Image(DatabaseConnection.Base):
 
     # Users should not be able to create images with same name in a given
     # project. So we are creating a unique constraint.
+    # The unique constraint also indexes lookups by project and name, the
+    # other index is for listing the snapshots of a project. The children of
+    # an image are found through the index on parent_id.
     __table_args__ = (UniqueConstraint("project_id", "name",
                                        name="_project_id_image_name_unique"
-                                            "_constraint"),)
+                                            "_constraint"),
+                      Index("ix_image_project_id_is_snapshot", "project_id",
+                            "is_snapshot"))
 
     # Removed snapshot class for now
     # snapshots = relationship("Snapshot", back_populates="image",
@@ -0,0 +1,115 @@
+import fcntl
+from contextlib import contextmanager
+
+from sqlalchemy import Boolean, Column, Index, Integer, MetaData, Table
+from sqlalchemy import func, inspect, select
+
+from ims.common.log import create_logger, log
+from ims.database.db_connection import DatabaseConnection
+# The tables must be imported so that they are part of the metadata
+from ims.database.image import Image
+from ims.database.project import Project
+from ims.database.warm_pool import WarmPool
+
+logger = create_logger(__name__)
+
+# The version of the schema is the only row of this table. It is kept out of
+# the metadata of the tables so that it is never created by create_all.
+schema_version = Table('schema_version', MetaData(),
+                       Column('version', Integer, nullable=False))
+
+# The version of dbs that were created by create_all before the schema was
+# versioned
+BASELINE_VERSION = 1
+
+
+# The id of the PostgreSQL advisory lock held while the schema is upgraded
+UPGRADE_LOCK_ID = 0x626d69
+
+
+def _add_image_indexes(conn):
+    """ Adds the indexes on image lookups to tables created without them """
+    # The columns of the image table that the indexes of version 2 are on.
+    # The migration must not follow the model, which may get more indexes.
+    image = Table('image', MetaData(), Column('project_id', Integer),
+                  Column('is_snapshot', Boolean), Column('parent_id', Integer))
+    indexes = [Index('ix_image_parent_id', image.c.parent_id),
+               Index('ix_image_project_id_is_snapshot', image.c.project_id,
+                     image.c.is_snapshot)]
+    existing = set(index['name'] for index in
+                   inspect(conn).get_indexes(image.name))
+    for index in indexes:
+        if index.name not in existing:
+            index.create(conn)
+
+
+@contextmanager
+def _upgrade_lock(engine):
+    """
+    Holds a lock while the schema is upgraded so that einsteins started
+    together on the same db do not both create it or apply a migration.
+    PostgreSQL has advisory locks for this. A SQLite db can only be shared
+    by the processes of one host, they lock a file next to it.
+    """
+    if engine.dialect.name == 'postgresql':
+        with engine.connect() as conn:
+            conn.execute(select([func.pg_advisory_lock(UPGRADE_LOCK_ID)]))
+            try:
+                yield
+            finally:
+                conn.execute(select([func.pg_advisory_unlock(
+                    UPGRADE_LOCK_ID)]))
+    elif engine.dialect.name == 'sqlite' and \
+            engine.url.database not in (None, '', ':memory:'):
+        with open(engine.url.database + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    else:
+        yield
+
+
+# (version, migration) in the order they must be applied. A migration takes
+# a connection in a transaction and upgrades the schema from the previous
+# version. Changes to the tables must be added here so that existing dbs get
+# them, new dbs are created with the latest tables by create_all.
+MIGRATIONS = [(2, _add_image_indexes)]
+
+LATEST_VERSION = MIGRATIONS[-1][0] if MIGRATIONS else BASELINE_VERSION
+
+
+@log
+def upgrade(engine=None):
+    """
+    Creates the tables or upgrades them to the latest version. It is run
+    once when einstein starts, connections made by requests do no DDL.
+
+    :param engine: the engine of the db, defaults to the one of
+    DatabaseConnection
+    :return: the version of the schema
+    """
+    engine = engine or DatabaseConnection.engine
+    with _upgrade_lock(engine):
+        with engine.begin() as conn:
+            schema_version.create(conn, checkfirst=True)
+            version = conn.execute(select([schema_version.c.version])).scalar()
+            if version is None:
+                # Tables that predate the versioning only get the tables they
+                # miss (like warm_pool) here and the rest from the migrations
+                existed = conn.dialect.has_table(conn, Project.__tablename__)
+                DatabaseConnection.Base.metadata.create_all(conn)
+                version = BASELINE_VERSION if existed else LATEST_VERSION
+                conn.execute(schema_version.insert().values(version=version))
+                logger.info("Created db schema at version %d", version)
+
+        for target, migration in MIGRATIONS:
+            if target <= version:
+                continue
+            with engine.begin() as conn:
+                migration(conn)
+                conn.execute(schema_version.update().values(version=target))
+            version = target
+            logger.info("Upgraded db schema to version %d", version)
+        return version
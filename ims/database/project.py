@@ -18,48 +18,69 @@ class ProjectRepository:
         self.connection = connection
 
     # inserts the arguments into the table
-    # commits after insertion otherwise rollback occurs after which exception
-    # is bubbled up
+    # commits after insertion (with the writes of other requests if group
+    # commit is enabled) otherwise rollback occurs after which exception is
+    # bubbled up
     @log
     def insert(self, name, id=None):
-        try:
+        def insert(session):
             p = Project()
             p.name = name
             if id is not None:
                 p.id = id
-            self.connection.session.add(p)
-            self.connection.session.commit()
+            session.add(p)
+            if id is not None:
+                session.flush()
+                DatabaseConnection.sync_id_sequence(session,
+                                                    Project.__tablename__)
+
+        try:
+            self.connection.write(insert)
+            self.__forget(name)
         except SQLAlchemyError as e:
-            self.connection.session.rollback()
             raise db_exceptions.ORMException(e.message)
 
     # deletes project with name
-    # commits after deletion otherwise rollback occurs after which exception is
+    # commits after deletion (with the writes of other requests if group
+    # commit is enabled) otherwise rollback occurs after which exception is
     # bubbled up
     @log
     def delete_with_name(self, name):
-        try:
-            project = self.connection.session.query(Project).filter_by(
+        def delete(session):
+            project = session.query(Project).filter_by(
                 name=name).one_or_none()
             if project is not None:
-                self.connection.session.delete(project)
-                self.connection.session.commit()
+                session.delete(project)
+            return project is not None
+
+        try:
+            if self.connection.write(delete):
+                self.__forget(name)
         except SQLAlchemyError as e:
-            self.connection.session.rollback()
             raise db_exceptions.ORMException(e.message)
 
     # fetch the project id with name
     # only project object is returned as the name is unique
+    # the id is cached as it is fetched by every BMI call
     @log
     def fetch_id_with_name(self, name):
+        key = (DatabaseConnection.PROJECT_KEY, name)
+        pid = self.connection.name_cache.get(key)
+        if pid is not None:
+            return pid
         try:
-            project = self.connection.session.query(Project).filter_by(
-                name=name).one_or_none()
-            if project is not None:
-                return project.id
+            pid = self.connection.session.query(Project.id).filter_by(
+                name=name).scalar()
+            if pid is not None:
+                self.connection.name_cache.put(key, pid)
+            return pid
         except SQLAlchemyError as e:
             raise db_exceptions.ORMException(e.message)
 
+    # Removes the cached ids of the project and of the images in it
+    def __forget(self, name):
+        self.connection.name_cache.invalidate(lambda key: key[1] == name)
+
     @log
     def fetch_projects(self):
         try:
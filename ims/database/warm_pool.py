@@ -0,0 +1,70 @@
+from sqlalchemy import Column, ForeignKey, Integer
+from sqlalchemy.exc import SQLAlchemyError
+
+import ims.exception.db_exceptions as db_exceptions
+from ims.common.log import create_logger, log, trace
+from ims.database.db_connection import DatabaseConnection
+
+logger = create_logger(__name__)
+
+
+# This class is responsible for doing CRUD operations on the Warm Pool Table
+# in DB. The table holds the number of standby disks einstein keeps for an
+# image. This class was written as per the Repository Model which allows us
+# to change the DB in the future without changing business code
+class WarmPoolRepository:
+    @trace
+    def __init__(self, connection):
+        self.connection = connection
+
+    # inserts the watermarks of the image or updates them if present
+    # commits if successful otherwise rollbacks and bubbles the exception
+    @log
+    def upsert(self, image_id, low, high):
+        def upsert(session):
+            pool = session.query(WarmPool).filter_by(
+                image_id=image_id).one_or_none()
+            if pool is None:
+                pool = WarmPool()
+                pool.image_id = image_id
+                session.add(pool)
+            pool.low = low
+            pool.high = high
+
+        try:
+            self.connection.write(upsert)
+        except SQLAlchemyError as e:
+            raise db_exceptions.ORMException(e.message)
+
+    # deletes the watermarks of the image if present
+    @log
+    def delete_with_image_id(self, image_id):
+        def delete(session):
+            session.query(WarmPool).filter_by(image_id=image_id).delete()
+
+        try:
+            self.connection.write(delete)
+        except SQLAlchemyError as e:
+            raise db_exceptions.ORMException(e.message)
+
+    # returns a list of [image_id, low, high]
+    @log
+    def fetch_all(self):
+        try:
+            pools = self.connection.session.query(WarmPool)
+            return [[pool.image_id, pool.low, pool.high] for pool in pools]
+        except SQLAlchemyError as e:
+            raise db_exceptions.ORMException(e.message)
+
+
+# This class represents the warm pool table
+# einstein refills the standby disks of an image when there are less than
+# low of them and clones till there are high of them
+class WarmPool(DatabaseConnection.Base):
+    __tablename__ = "warm_pool"
+
+    # Columns in the table
+    image_id = Column(Integer, ForeignKey("image.id"), primary_key=True,
+                      nullable=False)
+    low = Column(Integer, nullable=False)
+    high = Column(Integer, nullable=False)
@@ -1,29 +1,95 @@
 #! /bin/python
-import subprocess
+import collections
+import inspect
+import threading
 from contextlib import contextmanager
 
 import os
 import rados
 import rbd
-import sh
 
 import ims.common.constants as constants
+import ims.common.metrics as metrics
 import ims.exception.file_system_exceptions as file_system_exceptions
 from ims.common.log import create_logger, log, trace
+from ims.einstein import jobs
+from ims.einstein.flatten import Flatten
+from ims.einstein.rbd_mapper import create_mapper
 
 logger = create_logger(__name__)
 
 
+def flatten_reports_progress():
+    """
+    Whether Image.flatten of the librbd bindings takes on_progress, which
+    they do since nautilus
+
+    :return: True or False
+    """
+    try:
+        return 'on_progress' in inspect.getargspec(rbd.Image.flatten).args
+    except TypeError:
+        # Compiled without signatures, its docstring describes the argument
+        return 'on_progress' in (rbd.Image.flatten.__doc__ or '')
+
+
+# Decided once rather than by retrying a flatten that raised TypeError, which
+# would also retry errors raised by on_progress or after the flatten started
+FLATTEN_PROGRESS = flatten_reports_progress()
+
+
+@trace
+def connect_cluster(rid, conf_file):
+    """
+    Connects to the ceph cluster
+
+    :param rid: the ceph id to connect as
+    :param conf_file: the path to the ceph config file
+    :return: the connected rados.Rados handle
+    """
+    cluster = rados.Rados(rados_id=rid, conffile=conf_file)
+    cluster.connect()
+    metrics.increment('ceph.cluster_connects')
+    return cluster
+
+
+class CachedImage:
+    """ An image handle kept open by RBD and the number of calls using it """
+
+    def __init__(self, img):
+        self.img = img
+        self.users = 0
+        # False once evicted or forgotten, the last user then closes it
+        self.cached = True
+
+
 # Need to think if there is a better way to reduce boilerplate exception
 # handling code in methods
 class RBD:
     @log
-    def __init__(self, config, password):
+    def __init__(self, config, password, context=None, flattener=None,
+                 mapper=None):
         self.__validate(config)
+        self.config = config
         self.password = password
-        self.cluster = self.__init_cluster()
-        self.context = self.__init_context()
+        # The FlattenExecutor of the service context, flattens run in the
+        # calling thread without it
+        self.flattener = flattener
+        self.mapper = mapper
+        self.__own_mapper = False
+        if context is None:
+            self.cluster = self.__init_cluster()
+            self.context = self.__init_context()
+        else:
+            # The ioctx is borrowed from the service context which owns both
+            # the ioctx and the cluster handle, so we must not close them.
+            self.cluster = None
+            self.context = context
         self.rbd = rbd.RBD()
+        # Open images by name, least recently used first. A multi-step
+        # operation opens each image once instead of once per step.
+        self.__images = collections.OrderedDict()
+        self.__images_lock = threading.Lock()
 
     # Validates the config arguments passed
     # If all are present then the values are copied to variables
@@ -34,6 +100,7 @@ class RBD:
             self.r_conf = config.conf_file
             self.pool = config.pool
             self.keyring = config.keyring
+            self.image_cache_size = config.image_cache_size
         except KeyError as e:
             raise file_system_exceptions.MissingConfigArgumentException(
                 e.args[0])
@@ -48,9 +115,7 @@ class RBD:
 
     @trace
     def __init_cluster(self):
-        cluster = rados.Rados(rados_id=self.rid, conffile=self.r_conf)
-        cluster.connect()
-        return cluster
+        return connect_cluster(self.rid, self.r_conf)
 
     def __enter__(self):
         return self
@@ -61,19 +126,115 @@ class RBD:
     # Written to use 'with' for opening and closing images
     # Passing context as it is outside class
     # Need to see if it is ok to put it inside the class
+    # The image is kept open in the cache afterwards. The cache lock is only
+    # held to find or insert the handle, the handle counts its users so that
+    # it is not closed while another thread uses it. Long running calls (like
+    # flatten) should pass cache=False so their handle is their own.
     @trace
     @contextmanager
-    def __open_image(self, img_name):
-        img = None
+    def __open_image(self, img_name, cache=True):
+        if not cache or self.image_cache_size <= 0:
+            img = None
+            try:
+                img = rbd.Image(self.context, img_name)
+                metrics.increment('ceph.image_opened')
+                yield (img)
+            finally:
+                if img is not None:
+                    img.close()
+            return
+
+        entry = self.__acquire_image(img_name)
         try:
-            img = rbd.Image(self.context, img_name)
-            yield (img)
+            yield (entry.img)
+        except rbd.ImageNotFound:
+            # Removed outside of this instance, the handle is stale
+            self.__release_image(entry)
+            entry = None
+            self.__forget_image(img_name)
+            raise
         finally:
-            if img is not None:
-                img.close()
+            if entry is not None:
+                self.__release_image(entry)
+
+    def __acquire_image(self, img_name):
+        with self.__images_lock:
+            entry = self.__use_cached_image(img_name)
+            if entry is not None:
+                metrics.increment('ceph.image_reused')
+                return entry
+        # Opened without the lock so that the other images can be used
+        img = rbd.Image(self.context, img_name)
+        metrics.increment('ceph.image_opened')
+        with self.__images_lock:
+            entry = self.__use_cached_image(img_name)
+            if entry is None:
+                entry = CachedImage(img)
+                entry.users += 1
+                self.__images[img_name] = entry
+                while len(self.__images) > self.image_cache_size:
+                    self.__retire(self.__images.popitem(last=False)[1])
+                return entry
+        # Another thread opened it meanwhile
+        img.close()
+        return entry
+
+    # Must be called with __images_lock held
+    def __use_cached_image(self, img_name):
+        entry = self.__images.pop(img_name, None)
+        if entry is not None:
+            entry.users += 1
+            # Most recently used last
+            self.__images[img_name] = entry
+        return entry
+
+    def __release_image(self, entry):
+        with self.__images_lock:
+            entry.users -= 1
+            if entry.users == 0 and not entry.cached:
+                entry.img.close()
+
+    # Takes the handle out of the cache, it is closed by its last user
+    # Must be called with __images_lock held
+    def __retire(self, entry):
+        entry.cached = False
+        if entry.users == 0:
+            entry.img.close()
+
+    # Closes the cached handle of the image if any, must be called before
+    # the image is removed or renamed
+    def __forget_image(self, img_name):
+        with self.__images_lock:
+            entry = self.__images.pop(img_name, None)
+            if entry is not None:
+                self.__retire(entry)
+
+    @log
+    def close_images(self):
+        """
+        Closes the cached image handles, must be called before the ioctx is
+        given back or closed
+
+        :return: None
+        """
+        with self.__images_lock:
+            while self.__images:
+                self.__retire(self.__images.popitem()[1])
+
+    @log
+    def close_mapper(self):
+        # Only the mapper started by this instance, not a shared one
+        if self.__own_mapper:
+            self.mapper.shutdown()
+            self.mapper = None
+            self.__own_mapper = False
 
     @log
     def tear_down(self):
+        self.close_images()
+        self.close_mapper()
+        if self.cluster is None:
+            return
         self.context.close()
         logger.info("Successfully Closed Context")
         self.cluster.shutdown()
@@ -137,12 +298,18 @@ class RBD:
         try:
             with self.__open_image(img_id) as img:
                 img.set_snap(parent_snap)
-                return img.list_children()
+                try:
+                    return img.list_children()
+                finally:
+                    # The cached handle must stay on the image itself
+                    img.set_snap(None)
         except rbd.ImageNotFound:
             raise file_system_exceptions.ImageNotFoundException(img_id)
 
     @log
     def remove(self, img_id):
+        # An open handle is a watcher which would keep the image busy
+        self.__forget_image(img_id)
         try:
             self.rbd.remove(self.context, img_id)
             return True
@@ -256,13 +423,71 @@ class RBD:
 
     @log
     def flatten(self, img_id):
+        """
+        Flattens the image and waits for it, the progress is reported to
+        the job run by the calling thread
+
+        :param img_id: what the image is called
+        :return: True
+        """
+        flatten = self.flatten_async(img_id)
+        while not flatten.wait(constants.FLATTEN_PROGRESS_INTERVAL):
+            jobs.report_progress(flatten.progress)
+        flatten.result()
+        return True
+
+    @log
+    def flatten_async(self, img_id):
+        """
+        Starts flattening the image on the flatten executor. The flatten
+        uses the ioctx of this instance, so it must not be released before
+        the flatten finishes.
+
+        :param img_id: what the image is called
+        :return: the Flatten, its result raises the FileSystemException of
+        the flatten if it failed
+        """
+        def run(on_progress):
+            self.__flatten(img_id, on_progress)
+
+        if self.flattener is not None:
+            return self.flattener.submit(self.pool, img_id, run)
+        flatten = Flatten(self.pool, img_id, run)
+        flatten.run()
+        return flatten
+
+    def __flatten(self, img_id, on_progress):
         try:
+            # Not cached as the handle is used for minutes by another thread
+            with self.__open_image(img_id, cache=False) as img:
+                if FLATTEN_PROGRESS:
+                    img.flatten(on_progress=on_progress)
+                else:
+                    img.flatten()
+        except rbd.ImageNotFound:
+            raise file_system_exceptions.ImageNotFoundException(img_id)
+        except rbd.Error as e:
+            raise file_system_exceptions.FlattenFailedException(img_id,
+                                                                str(e))
 
-            with self.__open_image(img_id) as img:
-                img.flatten()
-                return True
+    @log
+    def rename(self, img_id, new_img_id):
+        """
+        Renames the image
+
+        :param img_id: what the image is called
+        :param new_img_id: what the image will be called
+        :return: True
+        """
+        self.__forget_image(img_id)
+        self.__forget_image(new_img_id)
+        try:
+            self.rbd.rename(self.context, img_id, new_img_id)
+            return True
         except rbd.ImageNotFound:
             raise file_system_exceptions.ImageNotFoundException(img_id)
+        except rbd.ImageExists:
+            raise file_system_exceptions.ImageExistsException(new_img_id)
 
     @log
     def list_snapshots(self, img_id):
@@ -283,6 +508,88 @@ class RBD:
         except rbd.ImageBusy:
             raise file_system_exceptions.SnapshotBusyException(name)
 
+    # Compound Operations Section
+    # The import and snapshot pipelines use these so that each image is
+    # opened and its snapshots are listed once per step instead of once per
+    # call
+    @log
+    def snap_and_protect(self, img_id, snap_name):
+        """
+        Creates a snapshot of the image and protects it so that it can be
+        cloned
+
+        :param img_id: what the image is called
+        :param snap_name: the snapshot to create
+        :return: True
+        """
+        try:
+            with self.__open_image(img_id) as img:
+                # Work around for Ceph problem
+                if snap_name in [snap['name'] for snap in img.list_snaps()]:
+                    raise file_system_exceptions.ImageExistsException(
+                        snap_name)
+                img.create_snap(snap_name)
+                img.protect_snap(snap_name)
+                return True
+        except rbd.ImageExists:
+            raise file_system_exceptions.ImageExistsException(img_id)
+        except rbd.ImageNotFound:
+            raise file_system_exceptions.ImageNotFoundException(img_id)
+
+    @log
+    def clone_flatten_and_seal(self, parent_img_name, parent_snap_name,
+                               clone_img_name, snap_name):
+        """
+        Clones the snapshot of the parent, flattens the clone so that it no
+        longer depends on the parent and creates a protected snapshot of it
+        that disks can be cloned from
+
+        :param parent_img_name: the image to clone
+        :param parent_snap_name: the snapshot of the image to clone
+        :param clone_img_name: what the clone is called
+        :param snap_name: the snapshot of the clone to create
+        :return: True
+        """
+        self.clone(parent_img_name, parent_snap_name, clone_img_name)
+        self.flatten(clone_img_name)
+        try:
+            # The clone has no snapshots so there is nothing to list
+            with self.__open_image(clone_img_name) as img:
+                img.create_snap(snap_name)
+                img.protect_snap(snap_name)
+                return True
+        except rbd.ImageNotFound:
+            raise file_system_exceptions.ImageNotFoundException(
+                clone_img_name)
+
+    @log
+    def release_snapshot(self, img_id, snap_name):
+        """
+        Unprotects the snapshot if it is protected and removes it
+
+        :param img_id: what the image is called
+        :param snap_name: the snapshot to remove
+        :return: True
+        """
+        try:
+            with self.__open_image(img_id) as img:
+                if snap_name not in [snap['name'] for snap in
+                                     img.list_snaps()]:
+                    raise file_system_exceptions.ImageNotFoundException(
+                        snap_name)
+                if img.is_protected_snap(snap_name):
+                    try:
+                        img.unprotect_snap(snap_name)
+                    except rbd.ImageBusy:
+                        raise file_system_exceptions.ImageBusyException(
+                            img_id)
+                img.remove_snap(snap_name)
+                return True
+        except rbd.ImageNotFound:
+            raise file_system_exceptions.ImageNotFoundException(img_id)
+        except rbd.ImageBusy:
+            raise file_system_exceptions.SnapshotBusyException(snap_name)
+
     @log
     def get_image(self, img_id):
         try:
@@ -299,46 +606,22 @@ class RBD:
             # Should be changed to special exception
             raise file_system_exceptions.ImageNotFoundException(img_id)
 
+    # The mapper of the service context is shared so that there is a single
+    # map helper, an instance made without one starts its own
+    def __get_mapper(self):
+        if self.mapper is None:
+            self.mapper = create_mapper(self.config, self.password)
+            self.__own_mapper = True
+        return self.mapper
+
     @log
     def map(self, ceph_img_name):
-        command = "echo {0} | sudo -S rbd --keyring {1} --id {2} map " \
-                  "{3}/{4}".format(self.password, self.keyring, self.rid,
-                                   self.pool, ceph_img_name)
-        p = subprocess.Popen(command, shell=True,
-                             stderr=subprocess.STDOUT, stdout=subprocess.PIPE)
-        output, err = p.communicate()
-        # output = sh.rbd.map(ceph_img_name, keyring=self.keyring, id=self.rid,
-        #            pool=self.pool)
-        if p.returncode == 0:
-            if output.find("sudo") != -1:
-                return output.split(":")[1].strip()
-            else:
-                return output.strip()
-        else:
-            raise file_system_exceptions.MapFailedException(ceph_img_name)
+        return self.__get_mapper().map(self.pool, ceph_img_name)
 
     @log
     def unmap(self, rbd_name):
-        command = "echo {0} | sudo -S rbd --keyring {1} --id {2} unmap " \
-                  "{3}".format(self.password, self.keyring, self.rid, rbd_name)
-        p = subprocess.Popen(command, shell=True,
-                             stderr=subprocess.STDOUT, stdout=subprocess.PIPE)
-        output, err = p.communicate()
-        # output = sh.rbd.unmap(rbd_name, keyring=self.keyring, id=self.rid)
-        if p.returncode == 0:
-            return output.strip()
-        else:
-            raise file_system_exceptions.UnmapFailedException(rbd_name)
+        self.__get_mapper().unmap(rbd_name)
 
     @log
     def showmapped(self):
-        output = sh.rbd.showmapped()
-        if output.exit_code == 0:
-            lines = output.split('\n')[1:-1]
-            maps = {}
-            for line in lines:
-                parts = line.split()
-                maps[parts[2]] = parts[4]
-            return maps
-        else:
-            pass
+        return self.__get_mapper().showmapped(self.pool)
@@ -0,0 +1,258 @@
+import Queue
+import atexit
+import threading
+
+import ims.common.config as config
+import ims.common.constants as constants
+import ims.common.metrics as metrics
+from ims.common.log import create_logger, log, trace
+from ims.database import migrations
+from ims.database.db_connection import DatabaseConnection
+from ims.einstein.ceph import RBD, connect_cluster
+from ims.einstein.disk_pool import DiskPool
+from ims.einstein.dnsmasq import DNSMasq
+from ims.einstein.flatten import FlattenExecutor
+from ims.einstein.iscsi.tgt import TGT
+from ims.einstein.jobs import JobManager
+from ims.einstein.rbd_mapper import create_mapper
+from ims.exception.exception import ISCSIException
+
+logger = create_logger(__name__)
+
+__context = None
+__lock = threading.Lock()
+
+
+def start():
+    """
+    Creates the process wide service context of einstein and starts its
+    background threads. Must only be called by the einstein daemon.
+
+    :return: The Global ServiceContext
+    """
+    global __context
+    with __lock:
+        if __context is None:
+            ctx = ServiceContext()
+            try:
+                ctx.start()
+            except Exception:
+                ctx.shutdown()
+                raise
+            __context = ctx
+            atexit.register(close)
+    return __context
+
+
+def get():
+    """
+    Returns the service context of einstein
+
+    :return: The Global ServiceContext or None outside of einstein (like in
+    the CLI)
+    """
+    return __context
+
+
+def close():
+    """
+    Tears down the process wide service context if it was created
+
+    :return: None
+    """
+    global __context
+    with __lock:
+        if __context is not None:
+            __context.shutdown()
+            __context = None
+
+
+class IoctxPool:
+    """ A bounded pool of idle ioctxs opened on a single ceph pool """
+
+    def __init__(self, cluster, pool, size):
+        self.cluster = cluster
+        self.pool = pool
+        self.__idle = Queue.LifoQueue(maxsize=size)
+
+    @trace
+    def get(self):
+        """
+        Returns an idle ioctx or opens a new one if none are available
+
+        :return: an open rados.Ioctx
+        """
+        try:
+            ioctx = self.__idle.get_nowait()
+            metrics.increment('ceph.ioctx_reused')
+            return ioctx
+        except Queue.Empty:
+            metrics.increment('ceph.ioctx_opened')
+            return self.cluster.open_ioctx(self.pool.encode('utf-8'))
+
+    @trace
+    def put(self, ioctx):
+        """
+        Returns the ioctx to the pool, closes it if the pool is already full
+
+        :param ioctx: the ioctx that was obtained using get
+        :return: None
+        """
+        try:
+            self.__idle.put_nowait(ioctx)
+        except Queue.Full:
+            ioctx.close()
+
+    @trace
+    def close(self):
+        """
+        Closes all idle ioctxs
+
+        :return: None
+        """
+        while True:
+            try:
+                self.__idle.get_nowait().close()
+            except Queue.Empty:
+                return
+
+
+class TargetReconciler(threading.Thread):
+    """
+    Loads the target registry of the iscsi driver when einstein starts and
+    then reconciles it with the iscsi server periodically
+    """
+
+    def __init__(self, iscsi, interval):
+        threading.Thread.__init__(self, name="bmi-target-reconciler")
+        self.daemon = True
+        self.iscsi = iscsi
+        self.interval = interval
+        self.__stop = threading.Event()
+
+    def run(self):
+        while True:
+            try:
+                missing, stale = self.iscsi.reconcile_targets()
+                if missing or stale:
+                    logger.info("Reconciled targets, missing = %s stale = %s",
+                                missing, stale)
+            except ISCSIException:
+                logger.exception('')
+            except Exception:
+                # The next pass may succeed, the thread must not die
+                logger.exception('')
+            if self.interval <= 0 or self.__stop.wait(self.interval):
+                return
+
+    def stop(self):
+        self.__stop.set()
+        self.join()
+
+
+class ServiceContext:
+    """
+    Holds the state that lives as long as the einstein process
+
+    The ceph cluster handle, the ioctx pool, the db engine and the driver
+    instances are created once here and shared by every BMI instance, so
+    a request only carries its own credentials, project and db session.
+
+    Creating a context only connects to ceph and creates the drivers, which
+    is all that BMI needs when the CLI runs it in its own process. start
+    adds the parts that only einstein runs, the schema migrations and the
+    background threads.
+    """
+
+    @log
+    def __init__(self):
+        self.cfg = config.get()
+        # The engine is created once per process by DatabaseConnection
+        self.engine = DatabaseConnection.engine
+        self.cluster = connect_cluster(self.cfg.fs.id, self.cfg.fs.conf_file)
+        self.ioctx_pool = IoctxPool(self.cluster, self.cfg.fs.pool,
+                                    self.cfg.fs.ioctx_pool_size)
+        self.dhcp = DNSMasq()
+        # self.iscsi = IET(self.fs, self.config.iscsi_update_password)
+        # Need to make this generic by passing specific config
+        self.iscsi = TGT(self.cfg.fs.conf_file,
+                         self.cfg.fs.id,
+                         self.cfg.fs.pool,
+                         mode=self.cfg.iscsi.tgt_mode,
+                         tgtadm=self.cfg.iscsi.tgtadm,
+                         sudo=self.cfg.iscsi.sudo,
+                         config_dir=self.cfg.iscsi.config_dir)
+        # Only hands out and evicts standby disks till it is started
+        self.disk_pool = DiskPool(self)
+        # Flattens run in the calling thread and RBD instances map with a
+        # helper of their own without these
+        self.flattener = None
+        self.jobs = None
+        self.mapper = None
+        self.reconciler = None
+
+    @log
+    def start(self):
+        """
+        Runs the schema migrations and starts the background threads of
+        einstein
+
+        :return: None
+        """
+        migrations.upgrade(self.engine)
+        self.flattener = FlattenExecutor(self.cfg.fs.flatten_workers,
+                                         self.cfg.fs.flatten_pool_limit,
+                                         constants.DEFAULT_FLATTEN_HISTORY)
+        self.jobs = JobManager(self.cfg.bmi.job_workers,
+                               constants.DEFAULT_JOB_HISTORY)
+        self.disk_pool.start()
+        # One map helper and index of mapped devices for every request
+        self.mapper = create_mapper(self.cfg.fs, self.cfg.iscsi.password)
+        # Started last so that it is not left running if the rest failed
+        self.reconciler = TargetReconciler(self.iscsi,
+                                           self.cfg.iscsi.reconcile_interval)
+        self.reconciler.start()
+
+    @log
+    def acquire_fs(self):
+        """
+        Returns an RBD instance backed by a pooled ioctx.
+        Must be given back using release_fs.
+
+        :return: RBD instance
+        """
+        return RBD(self.cfg.fs, self.cfg.iscsi.password,
+                   context=self.ioctx_pool.get(), flattener=self.flattener,
+                   mapper=self.mapper)
+
+    @log
+    def release_fs(self, fs):
+        """
+        Returns the ioctx used by the given RBD instance to the pool
+
+        :param fs: RBD instance returned by acquire_fs
+        :return: None
+        """
+        fs.close_images()
+        # The CLI has no shared mapper so the instance started its own
+        fs.close_mapper()
+        self.ioctx_pool.put(fs.context)
+
+    @log
+    def shutdown(self):
+        # Running jobs still use the cluster
+        if self.jobs is not None:
+            self.jobs.shutdown()
+        self.disk_pool.shutdown()
+        if self.flattener is not None:
+            self.flattener.shutdown()
+        # Commits the writes of the requests that finished
+        if DatabaseConnection.committer is not None:
+            DatabaseConnection.committer.shutdown()
+        if self.reconciler is not None:
+            self.reconciler.stop()
+        if self.mapper is not None:
+            self.mapper.shutdown()
+        self.ioctx_pool.close()
+        self.cluster.shutdown()
+        logger.info("Successfully Shutdown Ceph Cluster Connection")
@@ -0,0 +1,307 @@
+import Queue
+import threading
+import uuid
+
+import ims.common.constants as constants
+import ims.common.metrics as metrics
+import ims.common.parallel as parallel
+from ims.common.log import create_logger, log, trace
+from ims.database.database import Database
+from ims.exception.exception import DBException, FileSystemException, \
+    ISCSIException
+
+logger = create_logger(__name__)
+
+
+class DiskPool:
+    """
+    Keeps pre-cloned and pre-exported standby disks for images so that
+    create_disk only has to rename a db row.
+
+    Standby disks are regular clones whose name starts with
+    STANDBY_DISK_PREFIX. They live in the project of the image they were
+    cloned from, their ceph name and iscsi target depend only on their id.
+    The watermarks of every image are stored in the db, when an image has
+    less than low standby disks a background thread clones till there are
+    high of them.
+    """
+
+    @log
+    def __init__(self, ctx):
+        self.ctx = ctx
+        self.cfg = ctx.cfg
+        # image id -> [project id, low, high]
+        self.__watermarks = {}
+        # image id -> ids of standby disks that can be claimed
+        self.__standby = {}
+        self.__lock = threading.Lock()
+        # Serializes refills and evictions so that an image is never evicted
+        # while its disks are being cloned
+        self.__fill_lock = threading.Lock()
+        self.__queue = Queue.Queue()
+        self.__queued = set()
+        self.__thread = None
+        self.__loaded = False
+        self.__started = False
+
+    @log
+    def claim(self, image_id):
+        """
+        Takes a standby disk of the image out of the pool
+
+        :param image_id: the id of the image the disk should be cloned from
+        :return: the id of the standby disk or None if there is none
+        """
+        self.__load()
+        with self.__lock:
+            standby = self.__standby.get(image_id)
+            if not standby:
+                if image_id in self.__watermarks:
+                    metrics.increment('disk_pool.miss')
+                    self.__schedule(image_id)
+                return None
+            disk_id = standby.pop()
+            metrics.increment('disk_pool.hit')
+            if len(standby) < self.__watermarks[image_id][1]:
+                self.__schedule(image_id)
+            return disk_id
+
+    @log
+    def release(self, image_id, disk_id):
+        """
+        Puts back a standby disk that was claimed but not used
+
+        :param image_id: the id the disk was claimed with
+        :param disk_id: the id returned by claim
+        :return: None
+        """
+        with self.__lock:
+            if image_id in self.__watermarks:
+                self.__standby.setdefault(image_id, []).append(disk_id)
+                return
+        # The image was evicted in the meantime
+        self.__destroy([disk_id])
+
+    @log
+    def lost(self, image_id, disk_id):
+        """
+        Counts a claim as a miss when the db says another einstein sharing it
+        claimed the disk first. The disk is not put back.
+
+        :param image_id: the id the disk was claimed with
+        :param disk_id: the id returned by claim
+        :return: None
+        """
+        with self.__lock:
+            metrics.increment('disk_pool.miss')
+            metrics.increment('disk_pool.lost')
+            if image_id in self.__watermarks:
+                self.__schedule(image_id)
+
+    @log
+    def set_watermarks(self, image_id, project_id, low, high):
+        """
+        Changes the number of standby disks kept for the image.
+        The caller is responsible for storing them in the db.
+
+        :param image_id: the id of the image
+        :param project_id: the id of the project the image belongs to
+        :param low: refill when there are less standby disks than this
+        :param high: number of standby disks after a refill
+        :return: None
+        """
+        self.__load()
+        if high == 0:
+            self.evict(image_id)
+            return
+        with self.__lock:
+            self.__watermarks[image_id] = [project_id, low, high]
+            self.__standby.setdefault(image_id, [])
+            self.__schedule(image_id)
+
+    @log
+    def evict(self, image_id):
+        """
+        Forgets the image and removes all its standby disks
+
+        :param image_id: the id of the image
+        :return: None
+        """
+        self.__load()
+        with self.__fill_lock:
+            with self.__lock:
+                self.__watermarks.pop(image_id, None)
+                disk_ids = self.__standby.pop(image_id, [])
+            if disk_ids:
+                metrics.increment('disk_pool.evicted', len(disk_ids))
+                self.__destroy(disk_ids)
+
+    @log
+    def stats(self):
+        """
+        Returns the watermarks and the number of standby disks of every image
+
+        :return: dict of image id to [low, high, standby disks]
+        """
+        self.__load()
+        with self.__lock:
+            return dict((image_id, [low, high,
+                                    len(self.__standby.get(image_id, []))])
+                        for image_id, (_, low, high) in
+                        self.__watermarks.iteritems())
+
+    @log
+    def start(self):
+        """
+        Lets the pool clone standby disks in the background, which only
+        einstein does. Till then the pool hands out and evicts the standby
+        disks in the db but does not refill them.
+
+        :return: None
+        """
+        with self.__lock:
+            self.__started = True
+            if self.__loaded:
+                for image_id in self.__watermarks:
+                    self.__schedule(image_id)
+
+    @log
+    def shutdown(self):
+        """
+        Stops the refill thread after the refill in progress
+
+        :return: None
+        """
+        with self.__lock:
+            thread = self.__thread
+            self.__thread = None
+        if thread is not None:
+            self.__queue.put(None)
+            thread.join()
+
+    # The pool is loaded on first use so that processes that never create
+    # disks do not read it
+    def __load(self):
+        with self.__lock:
+            if self.__loaded:
+                return
+            self.__loaded = True
+            with Database() as db:
+                for image_id, low, high in db.warm_pool.fetch_all():
+                    project_id = db.image.fetch_project_id_with_id(image_id)
+                    if project_id is None:
+                        continue
+                    self.__watermarks[image_id] = [project_id, low, high]
+                    self.__standby[image_id] = db.image.fetch_standby_ids(
+                        image_id)
+            for image_id in self.__watermarks:
+                self.__schedule(image_id)
+
+    # Queues the image to be refilled up to its high watermark
+    # Must be called with __lock held
+    def __schedule(self, image_id):
+        if not self.__started or image_id in self.__queued:
+            return
+        self.__queued.add(image_id)
+        if self.__thread is None:
+            self.__thread = threading.Thread(target=self.__work,
+                                             name="bmi-disk-pool")
+            self.__thread.daemon = True
+            self.__thread.start()
+        self.__queue.put(image_id)
+
+    def __work(self):
+        while True:
+            image_id = self.__queue.get()
+            if image_id is None:
+                return
+            with self.__lock:
+                self.__queued.discard(image_id)
+            try:
+                self.__refill(image_id)
+            except Exception:
+                logger.exception('')
+
+    @trace
+    def __refill(self, image_id):
+        with self.__fill_lock:
+            with self.__lock:
+                if image_id not in self.__watermarks:
+                    return
+                project_id, _, high = self.__watermarks[image_id]
+                count = high - len(self.__standby.get(image_id, []))
+            if count <= 0:
+                return
+
+            names = [constants.STANDBY_DISK_PREFIX + uuid.uuid4().hex for _ in
+                     range(count)]
+            with Database() as db:
+                ids = db.image.insert_many(names, project_id, image_id)
+            disk_ids = [ids[name] for name in names]
+            parent_ceph_name = self.__ceph_name(image_id)
+
+            fs = self.ctx.acquire_fs()
+            try:
+                def clone(disk_id):
+                    try:
+                        fs.clone(parent_ceph_name, self.cfg.bmi.snapshot,
+                                 self.__ceph_name(disk_id))
+                        return True
+                    except FileSystemException:
+                        logger.exception('')
+                        return False
+
+                cloned = parallel.map(clone, disk_ids,
+                                      self.cfg.fs.parallel_calls)
+            finally:
+                self.ctx.release_fs(fs)
+
+            failed = [disk_id for disk_id, ok in zip(disk_ids, cloned) if
+                      not ok]
+            self.__delete_rows(failed)
+            disk_ids = [disk_id for disk_id, ok in zip(disk_ids, cloned) if
+                        ok]
+
+            errors = self.ctx.iscsi.add_targets(
+                [self.__ceph_name(disk_id) for disk_id in disk_ids])
+            failed = [disk_id for disk_id in disk_ids if
+                      self.__ceph_name(disk_id) in errors]
+            self.__destroy(failed, remove_target=False)
+            disk_ids = [disk_id for disk_id in disk_ids if
+                        disk_id not in failed]
+
+            with self.__lock:
+                self.__standby.setdefault(image_id, []).extend(disk_ids)
+            metrics.increment('disk_pool.refilled', len(disk_ids))
+
+    # Removes the target, the clone and the db row of every disk. Failures
+    # are logged as the disks are hidden and only waste space
+    def __destroy(self, disk_ids, remove_target=True):
+        if not disk_ids:
+            return
+        fs = self.ctx.acquire_fs()
+        try:
+            for disk_id in disk_ids:
+                ceph_name = self.__ceph_name(disk_id)
+                try:
+                    if remove_target:
+                        self.ctx.iscsi.remove_target(ceph_name)
+                    fs.remove(ceph_name)
+                except (ISCSIException, FileSystemException):
+                    logger.exception('')
+        finally:
+            self.ctx.release_fs(fs)
+        self.__delete_rows(disk_ids)
+
+    def __delete_rows(self, disk_ids):
+        if not disk_ids:
+            return
+        with Database() as db:
+            for disk_id in disk_ids:
+                try:
+                    db.image.delete_with_id(disk_id)
+                except DBException:
+                    logger.exception('')
+
+    def __ceph_name(self, image_id):
+        return str(self.cfg.bmi.uid) + "img" + str(image_id)
@@ -0,0 +1,232 @@
+import collections
+import threading
+import time
+
+import ims.common.constants as constants
+import ims.common.metrics as metrics
+from ims.common.log import create_logger, log
+
+logger = create_logger(__name__)
+
+
+class Flatten:
+    """
+    A flatten run by a FlattenExecutor. It is the future of the flatten, the
+    caller waits on it and it keeps the progress reported by librbd.
+    """
+
+    def __init__(self, pool, image, func):
+        self.pool = pool
+        self.image = image
+        self.func = func
+        self.state = constants.JOB_QUEUED
+        self.progress = 0
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.__done = threading.Event()
+
+    def is_finished(self):
+        return self.__done.is_set()
+
+    def wait(self, timeout=None):
+        """
+        Waits for the flatten to finish
+
+        :param timeout: the seconds to wait, forever if None
+        :return: True if the flatten finished
+        """
+        self.__done.wait(timeout)
+        return self.__done.is_set()
+
+    def result(self):
+        """
+        Waits for the flatten to finish and raises its error if it failed
+
+        :return: None
+        """
+        self.wait()
+        if self.error is not None:
+            raise self.error
+
+    def run(self):
+        """
+        Runs the flatten in the calling thread
+
+        :return: None
+        """
+        self.state = constants.JOB_RUNNING
+        self.started = time.time()
+        try:
+            self.func(self.on_progress)
+            self.finish()
+        except Exception as e:
+            logger.exception('')
+            self.finish(e)
+
+    def on_progress(self, offset, total):
+        """ The progress callback given to librbd """
+        if total > 0:
+            self.progress = max(0, min(100, offset * 100 / total))
+        return 0
+
+    def finish(self, error=None):
+        self.error = error
+        if error is None:
+            self.state = constants.JOB_SUCCEEDED
+            self.progress = 100
+        else:
+            self.state = constants.JOB_FAILED
+        self.finished = time.time()
+        self.__done.set()
+
+    def to_dict(self):
+        """
+        Returns the flatten as a dict that can be sent to clients
+
+        :return: dict of flatten attributes
+        """
+        return {constants.FLATTEN_IMAGE_KEY: self.image,
+                constants.JOB_STATE_KEY: self.state,
+                constants.JOB_PROGRESS_KEY: self.progress,
+                constants.JOB_RESULT_KEY: None if self.error is None else
+                str(self.error),
+                constants.JOB_CREATED_KEY: self.created,
+                constants.JOB_STARTED_KEY: self.started,
+                constants.JOB_FINISHED_KEY: self.finished}
+
+
+class FlattenExecutor:
+    """
+    Runs the flattens of images on dedicated threads so that a flatten of a
+    large image never takes a job worker or a request thread for its run,
+    and at most pool_limit flattens load the OSDs of a ceph pool at once.
+
+    A flatten is only handed to a worker when its pool has room, the
+    flattens of a pool that is saturated wait in order without taking a
+    worker so that they never hold up the flattens of other pools.
+
+    Like jobs, flattens are only kept in memory and only the latest finished
+    ones are remembered.
+    """
+
+    @log
+    def __init__(self, workers, pool_limit, history):
+        self.workers = workers
+        self.pool_limit = pool_limit
+        self.history = history
+        self.__flattens = []
+        # Flattens handed to the workers and those waiting for their pool
+        self.__ready = collections.deque()
+        self.__waiting = collections.deque()
+        # Number of flattens of each pool that are ready or running
+        self.__running = {}
+        self.__lock = threading.Lock()
+        self.__changed = threading.Condition(self.__lock)
+        self.__stopping = False
+        self.__threads = []
+
+    @log
+    def submit(self, pool, image, func):
+        """
+        Queues a flatten
+
+        :param pool: the ceph pool of the image
+        :param image: the ceph name of the image
+        :param func: callable taking the progress callback of librbd that
+        flattens the image, it raises a FileSystemException if it fails
+        :return: the Flatten which is the future of the flatten
+        """
+        flatten = Flatten(pool, image, func)
+        with self.__lock:
+            self.__start_workers()
+            self.__flattens.append(flatten)
+            self.__forget_finished()
+            if self.__has_room(pool):
+                self.__dispatch(flatten)
+            else:
+                self.__waiting.append(flatten)
+        metrics.increment('ceph.flattens')
+        return flatten
+
+    @log
+    def list(self):
+        """
+        Returns the flattens in the order they were submitted
+
+        :return: list of Flattens
+        """
+        with self.__lock:
+            return list(self.__flattens)
+
+    @log
+    def shutdown(self):
+        """
+        Stops the workers after the submitted flattens finish, as the jobs
+        and requests that wait for them are stopped first
+
+        :return: None
+        """
+        with self.__lock:
+            threads = self.__threads
+            self.__threads = []
+            self.__stopping = True
+            self.__changed.notify_all()
+        for t in threads:
+            t.join()
+        with self.__lock:
+            self.__stopping = False
+
+    # Workers are started on first submit so that processes which never
+    # flatten do not get idle threads
+    def __start_workers(self):
+        while len(self.__threads) < self.workers:
+            name = "bmi-flatten-worker-%d" % len(self.__threads)
+            t = threading.Thread(target=self.__work, name=name)
+            t.daemon = True
+            t.start()
+            self.__threads.append(t)
+
+    def __forget_finished(self):
+        finished = [flatten for flatten in self.__flattens if
+                    flatten.is_finished()]
+        for flatten in finished[:max(0, len(finished) - self.history)]:
+            self.__flattens.remove(flatten)
+
+    # The methods below must be called with __lock held
+    def __has_room(self, pool):
+        return self.pool_limit <= 0 or \
+            self.__running.get(pool, 0) < self.pool_limit
+
+    def __dispatch(self, flatten):
+        self.__running[flatten.pool] = self.__running.get(flatten.pool, 0) + 1
+        self.__ready.append(flatten)
+        self.__changed.notify()
+
+    # Hands the waiting flattens whose pool got room to the workers
+    def __dispatch_waiting(self):
+        for flatten in list(self.__waiting):
+            if self.__has_room(flatten.pool):
+                self.__waiting.remove(flatten)
+                self.__dispatch(flatten)
+
+    def __work(self):
+        while True:
+            with self.__lock:
+                while not self.__ready:
+                    # A flatten only waits while another one of its pool is
+                    # ready or running, so none are left when both are empty
+                    if self.__stopping and not self.__waiting:
+                        return
+                    self.__changed.wait()
+                flatten = self.__ready.popleft()
+            flatten.run()
+            with self.__lock:
+                self.__running[flatten.pool] -= 1
+                if not self.__running[flatten.pool]:
+                    del self.__running[flatten.pool]
+                self.__dispatch_waiting()
+                if self.__stopping:
+                    # The idle workers check whether they can stop
+                    self.__changed.notify_all()
@@ -1,15 +1,91 @@
 import json
+import threading
 import urlparse
 
 import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.connectionpool import HTTPConnectionPool, \
+    HTTPSConnectionPool
 
+import ims.common.config as config
+from ims.common.cache import TTLCache
 import ims.common.constants as constants
+import ims.common.metrics as metrics
 import ims.exception.hil_exceptions as hil_exceptions
 from ims.common.log import create_logger, trace, log
 
 logger = create_logger(__name__)
 HIL_API = 'v0'
 
+# One keep-alive session per HIL base url shared by all threads, so calls
+# only pay for the connection setup when the pool has no idle connection
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+# Responses of GET calls keyed by (base url, user, password, api) so that
+# a user never sees what HIL returned to someone else
+_cache = None
+_cache_lock = threading.Lock()
+
+
+@trace
+def get_cache():
+    """
+    Returns the cache of HIL responses shared by all HIL instances
+
+    :return: TTLCache
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                cfg = config.get().net_isolator
+                _cache = TTLCache('hil.cache', cfg.cache_size, cfg.cache_ttl)
+    return _cache
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        metrics.increment('hil.connections_opened')
+        return HTTPConnectionPool._new_conn(self)
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        metrics.increment('hil.connections_opened')
+        return HTTPSConnectionPool._new_conn(self)
+
+
+class _CountingAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        HTTPAdapter.init_poolmanager(self, *args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _CountingHTTPConnectionPool,
+            'https': _CountingHTTPSConnectionPool}
+
+
+@trace
+def get_session(base_url):
+    """
+    Returns the session used to talk to the HIL at base_url
+
+    :param base_url: the url of HIL
+    :return: requests.Session with a connection pool
+    """
+    session = _sessions.get(base_url)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(base_url)
+            if session is None:
+                pool_size = config.get().net_isolator.pool_size
+                adapter = _CountingAdapter(pool_connections=1,
+                                           pool_maxsize=pool_size)
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _sessions[base_url] = session
+    return session
+
 
 class HIL:
     class Request:
@@ -27,20 +103,26 @@ class HIL:
 
     class Communicator:
         @trace
-        def __init__(self, url, request):
+        def __init__(self, url, request, session):
             self.url = url
             self.request = request
+            self.session = session
 
         @trace
         def send_request(self):
+            cfg = config.get().net_isolator
+            timeout = (cfg.connect_timeout, cfg.read_timeout)
             try:
+                metrics.increment('hil.requests')
                 if self.request.method == "get":
                     return self.resp_parse(
-                        requests.get(self.url, auth=self.request.auth))
+                        self.session.get(self.url, auth=self.request.auth,
+                                         timeout=timeout))
                 if self.request.method == "post":
                     return self.resp_parse(
-                        requests.post(self.url, data=self.request.data,
-                                      auth=self.request.auth))
+                        self.session.post(self.url, data=self.request.data,
+                                          auth=self.request.auth,
+                                          timeout=timeout))
             except requests.RequestException:
                 raise hil_exceptions.ConnectionException()
 
@@ -69,18 +151,35 @@ class HIL:
         self.base_url = urlparse.urljoin(base_url + '/', HIL_API)
         self.usr = usr
         self.passwd = passwd
+        self.session = get_session(self.base_url)
 
+    # Only successful responses are cached, the cached dict is shared so
+    # callers must not modify it
     @trace
     def __call_rest_api(self, api):
+        key = (self.base_url, self.usr, self.passwd, api)
+        ret = get_cache().get(key)
+        if ret is not None:
+            return ret
         link = urlparse.urljoin(self.base_url + '/', api)
         request = HIL.Request('get', None, auth=(self.usr, self.passwd))
-        return HIL.Communicator(link, request).send_request()
+        ret = HIL.Communicator(link, request, self.session).send_request()
+        get_cache().put(key, ret)
+        return ret
+
+    # Removes the cached responses about the project and node for every user
+    # as attaching or detaching changes them
+    @trace
+    def __invalidate(self, project, node):
+        apis = ['free_nodes', 'project/' + project + '/nodes', 'node/' + node]
+        get_cache().invalidate(
+            lambda key: key[0] == self.base_url and key[3] in apis)
 
     @trace
     def __call_rest_api_with_body(self, api, body):
         link = urlparse.urljoin(self.base_url + '/', api)
         request = HIL.Request('post', body, auth=(self.usr, self.passwd))
-        return HIL.Communicator(link, request).send_request()
+        return HIL.Communicator(link, request, self.session).send_request()
 
     @log
     def list_free_nodes(self):
@@ -96,13 +195,19 @@ class HIL:
     def detach_node_from_project(self, project, node):
         api = 'project/' + project + '/detach_node'
         body = {"node": node}
-        return self.__call_rest_api_with_body(api=api, body=body)
+        try:
+            return self.__call_rest_api_with_body(api=api, body=body)
+        finally:
+            self.__invalidate(project, node)
 
     @log
     def attach_node_hil_project(self, project, node):
         api = 'project/' + project + '/connect_node'
         body = {"node": node}
-        return self.__call_rest_api_with_body(api=api, body=body)
+        try:
+            return self.__call_rest_api_with_body(api=api, body=body)
+        finally:
+            self.__invalidate(project, node)
 
     @log
     def get_node_mac_addr(self, node, nic_to_boot_from):
@@ -8,7 +8,7 @@ import ims.common.constants as constants
 import ims.exception.file_system_exceptions as file_system_exceptions
 import ims.exception.iscsi_exceptions as iscsi_exceptions
 from ims.common.log import create_logger, log
-from ims.interfaces.iscsi import ISCSI
+from ims.interfaces.iscsi import ISCSI, Target
 
 logger = create_logger(__name__)
 
@@ -17,6 +17,7 @@ logger = create_logger(__name__)
 class IET(ISCSI):
     @log
     def __init__(self, fs, password):
+        super(IET, self).__init__()
         self.fs = fs
         self.password = password
 
@@ -24,13 +25,13 @@ class IET(ISCSI):
     def add_target(self, ceph_img_name):
         rbd_name = None
         try:
-            mappings = self.list_targets()
-            if ceph_img_name in mappings:
+            if self.has_target(ceph_img_name):
                 raise iscsi_exceptions.NodeAlreadyInUseException()
             rbd_name = self.fs.map(ceph_img_name)
             self.__add_mapping(ceph_img_name, rbd_name)
             self.restart_server()
             self.__check_status(True)
+            self._register(ceph_img_name, Target(None, 0, rbd_name))
         except iscsi_exceptions.UpdateConfigFailedException as e:
             maps = self.fs.showmapped()
             self.fs.unmap(maps[ceph_img_name])
@@ -47,14 +48,14 @@ class IET(ISCSI):
     def remove_target(self, ceph_img_name):
         mappings = None
         try:
-            iscsi_mappings = self.list_targets()
-            if ceph_img_name not in iscsi_mappings:
+            if not self.has_target(ceph_img_name):
                 raise iscsi_exceptions.NodeAlreadyUnmappedException()
             self.stop_server()
             self.__check_status(False)
             mappings = self.fs.showmapped()
             self.__remove_mapping(ceph_img_name, mappings[ceph_img_name])
             self.fs.unmap(mappings[ceph_img_name])
+            self._unregister(ceph_img_name)
             self.restart_server()
             self.__check_status(True)
         except iscsi_exceptions.UpdateConfigFailedException as e:
@@ -73,7 +74,7 @@ class IET(ISCSI):
             raise e
 
     @log
-    def list_targets(self):
+    def scan_targets(self):
         mappings = {}
         try:
             with open(constants.IET_ISCSI_CONFIG_LOC, 'r') as fi:
@@ -87,7 +88,8 @@ class IET(ISCSI):
                             raise iscsi_exceptions.InvalidConfigException()
                     elif line.startswith(constants.IET_LUN_STARTING):
                         if target is not None:
-                            mappings[target] = line.split(',')[0].split('=')[1]
+                            mappings[target] = Target(
+                                None, 0, line.split(',')[0].split('=')[1])
                             target = None
                         else:
                             raise iscsi_exceptions.InvalidConfigException()
@@ -199,13 +201,14 @@ class IET(ISCSI):
         if not self.fs.showmapped():
             return
 
-        mappings = self.list_targets()
+        mappings = self.scan_targets()
 
         for k, v in mappings.items():
-            self.__remove_mapping(k, v)
+            self.__remove_mapping(k, v.backing_store)
 
         for k, v in mappings.items():
             rbd_name = self.fs.map(k)
             self.__add_mapping(k, rbd_name)
 
         self.restart_server()
+        self.reconcile_targets()
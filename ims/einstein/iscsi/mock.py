@@ -1,5 +1,5 @@
 import ims.exception.iscsi_exceptions as iscsi_exceptions
-from ims.interfaces.iscsi import ISCSI
+from ims.interfaces.iscsi import ISCSI, Target
 
 
 class MockISCSI(ISCSI):
@@ -16,6 +16,7 @@ class MockISCSI(ISCSI):
     will have helper methods for setting target_lists and server status.
     """
     def __init__(self):
+        super(MockISCSI, self).__init__()
         # Initial target list
         self.target_list = []
         # Initial state of iSCSI server
@@ -87,6 +88,16 @@ class MockISCSI(ISCSI):
         """
         return self.target_list
 
+    def scan_targets(self):
+        """
+        Returns the targets in current iSCSI server.
+
+        Returns:
+            dict of target name to Target.
+        """
+        return dict((target_name, Target(None, 0, target_name)) for
+                    target_name in self.target_list)
+
     def start_server(self):
         """
         Starts the iSCSI server.
@@ -1,26 +1,45 @@
 import os
 import re
 
+import ims.common.constants as constants
 from ims.common import shell
 from ims.common.log import create_logger, log
 from ims.exception import iscsi_exceptions
 from ims.exception import shell_exceptions
 from ims.exception.exception import ShellException
-from ims.interfaces.iscsi import ISCSI
+from ims.interfaces.iscsi import ISCSI, Target
 
 logger = create_logger(__name__)
 
 
 class TGT(ISCSI):
-    """ Class for implementing TGT """
+    """
+    Class for implementing TGT
+
+    In admin mode targets are applied by tgt-admin, which rescans every
+    config file and every target, so each call costs O(targets).
+    In direct mode each target and its LUN are created and deleted with
+    tgtadm using a tid allocated here, so each call costs the same however
+    many targets exist. The config files are written in both modes so that
+    tgt-admin can restore the targets when tgtd restarts.
+    """
 
-    # TODO add TGT_ISCSI_CONFIG in config, update in PR related to Issue #30
     # TODO add service name in config
-    def __init__(self, fs_config_loc, fs_user, fs_pool):
-        self.TGT_ISCSI_CONFIG = "/etc/tgt/conf.d/"
+    def __init__(self, fs_config_loc, fs_user, fs_pool,
+                 mode=constants.TGT_ADMIN_MODE, tgtadm='tgtadm', sudo=True,
+                 config_dir=constants.TGT_DEFAULT_CONFIG_DIR):
+        super(TGT, self).__init__()
+        self.TGT_ISCSI_CONFIG = config_dir
         self.fs_config_loc = fs_config_loc
         self.fs_user = fs_user
         self.fs_pool = fs_pool
+        self.mode = mode
+        self.tgtadm = tgtadm
+        self.sudo = sudo
+        # The tid allocator of direct mode, it is initialised from the
+        # registry when the first tid is needed
+        self.__next_tid = None
+        self.__free_tids = []
 
     @log
     def start_server(self):
@@ -101,18 +120,97 @@ class TGT(ISCSI):
         :param target_name: Name of target to be added
         :return: None
         """
+        if self.mode == constants.TGT_DIRECT_MODE:
+            return self.__add_target_direct(target_name)
+        with self._registry_lock():
+            try:
+                if not self.has_target(target_name):
+                    self.__generate_config_file(target_name)
+                    command = "tgt-admin --execute"
+                    shell.call(command, sudo=self.sudo)
+                    # The tid is filled in by the next reconcile
+                    self._register(target_name,
+                                   self.__target(None, target_name))
+                else:
+                    raise iscsi_exceptions.TargetExistsException()
+            except iscsi_exceptions.ListTargetFailedException as e:
+                raise iscsi_exceptions.TargetCreationFailed(str(e))
+            except (IOError, OSError) as e:
+                raise iscsi_exceptions.TargetCreationFailed(str(e))
+            except shell_exceptions.CommandFailedException as e:
+                raise iscsi_exceptions.TargetCreationFailed(str(e))
+
+    @log
+    def add_targets(self, target_names):
+        """
+        Adds several targets by writing all their config files and then
+        applying them with a single tgt-admin call
+
+        :param target_names: Names of targets to be added
+        :return: dict of target name to exception for targets that failed
+        """
+        if self.mode == constants.TGT_DIRECT_MODE:
+            # Each target is already applied on its own
+            return super(TGT, self).add_targets(target_names)
+        failed = {}
+        with self._registry_lock():
+            try:
+                targets = self.get_targets()
+            except iscsi_exceptions.ListTargetFailedException as e:
+                return dict((target_name, e) for target_name in target_names)
+
+            written = []
+            for target_name in target_names:
+                if target_name in targets:
+                    failed[target_name] = \
+                        iscsi_exceptions.TargetExistsException()
+                    continue
+                try:
+                    self.__generate_config_file(target_name)
+                    written.append(target_name)
+                except (IOError, OSError) as e:
+                    failed[target_name] = \
+                        iscsi_exceptions.TargetCreationFailed(str(e))
+
+            if not written:
+                return failed
+
+            error = None
+            try:
+                shell.call("tgt-admin --execute", sudo=self.sudo)
+            except shell_exceptions.CommandFailedException as e:
+                # Some of the targets may still have been created
+                logger.exception('')
+                error = str(e)
+
+            # One scan tells which targets were created and gives their tids
+            try:
+                self.reconcile_targets()
+                targets = self.get_targets()
+            except iscsi_exceptions.ListTargetFailedException as e:
+                targets = {}
+                error = str(e)
+
+            for target_name in written:
+                if target_name not in targets:
+                    self.__remove_config_file(target_name)
+                    failed[target_name] = \
+                        iscsi_exceptions.TargetCreationFailed(
+                            error or "Target not created by tgt-admin")
+            return failed
+
+    def __remove_config_file(self, target_name):
+        """
+        Removes the config file of the target if present
+
+        :param target_name: Target whose config file should be removed
+        :return: None
+        """
         try:
-            targets = self.list_targets()
-            if target_name not in targets:
-                self.__generate_config_file(target_name)
-                command = "tgt-admin --execute"
-                shell.call(command, sudo=True)
-            else:
-                raise iscsi_exceptions.TargetExistsException()
-        except (IOError, OSError) as e:
-            raise iscsi_exceptions.TargetCreationFailed(str(e))
-        except shell_exceptions.CommandFailedException as e:
-            raise iscsi_exceptions.TargetCreationFailed(str(e))
+            os.remove(os.path.join(self.TGT_ISCSI_CONFIG,
+                                   target_name + ".conf"))
+        except OSError:
+            logger.exception('')
 
     @log
     def remove_target(self, target_name):
@@ -122,36 +220,166 @@ class TGT(ISCSI):
         :param target_name: Name of target to be removed
         :return: None
         """
-        try:
-            targets = self.list_targets()
-            if target_name in targets:
-                os.remove(os.path.join(self.TGT_ISCSI_CONFIG,
-                                       target_name + ".conf"))
-                command = "tgt-admin -f --delete {0}".format(target_name)
-                output = shell.call(command, sudo=True)
-                logger.debug("Output = %s", output)
-            else:
-                raise iscsi_exceptions.TargetDoesntExistException()
-        except (IOError, OSError) as e:
-            raise iscsi_exceptions.TargetDeletionFailed(str(e))
-        except shell_exceptions.CommandFailedException as e:
-            raise iscsi_exceptions.TargetDeletionFailed(str(e))
+        if self.mode == constants.TGT_DIRECT_MODE:
+            return self.__remove_target_direct(target_name)
+        with self._registry_lock():
+            try:
+                if self.has_target(target_name):
+                    os.remove(os.path.join(self.TGT_ISCSI_CONFIG,
+                                           target_name + ".conf"))
+                    command = "tgt-admin -f --delete {0}".format(target_name)
+                    output = shell.call(command, sudo=self.sudo)
+                    logger.debug("Output = %s", output)
+                    self._unregister(target_name)
+                else:
+                    raise iscsi_exceptions.TargetDoesntExistException()
+            except iscsi_exceptions.ListTargetFailedException as e:
+                raise iscsi_exceptions.TargetDeletionFailed(str(e))
+            except (IOError, OSError) as e:
+                raise iscsi_exceptions.TargetDeletionFailed(str(e))
+            except shell_exceptions.CommandFailedException as e:
+                raise iscsi_exceptions.TargetDeletionFailed(str(e))
 
     @log
-    def list_targets(self):
+    def scan_targets(self):
         """
-        Lists all the targets available by querying tgt-admin
+        Lists all the targets exported by tgtd by querying tgt-admin (or
+        tgtadm in direct mode)
 
-        :return: None
+        :return: dict of target name to Target
         """
         try:
-            command = "tgt-admin -s"
-            output = shell.call(command, sudo=True)
+            if self.mode == constants.TGT_DIRECT_MODE:
+                output = self.__call_tgtadm("--mode target --op show")
+            else:
+                output = shell.call("tgt-admin -s", sudo=self.sudo)
             logger.debug("Output = %s", output)
-            formatted_output = output.split("\n")
-            target_list = [target.split(":")[1].strip() for target in
-                           formatted_output if
-                           re.match("^Target [0-9]+:", target)]
-            return target_list
         except shell_exceptions.CommandFailedException as e:
             raise iscsi_exceptions.ListTargetFailedException(str(e))
+
+        targets = {}
+        name, tid, lun = None, None, None
+        for line in output.split("\n"):
+            match = re.match("^Target ([0-9]+): (.+)$", line)
+            if match:
+                tid, name = int(match.group(1)), match.group(2).strip()
+                targets[name] = Target(tid, None, None)
+                continue
+            match = re.match("^\\s+LUN: ([0-9]+)$", line)
+            if match:
+                lun = int(match.group(1))
+                continue
+            match = re.match("^\\s+Backing store path: (.+)$", line)
+            # LUN 0 is the controller and has no backing store
+            if match and name is not None and match.group(1) != "None" and \
+                    targets[name].lun is None:
+                targets[name] = Target(tid, lun, match.group(1).strip())
+        return targets
+
+    @log
+    def reconcile_targets(self):
+        with self._registry_lock():
+            ret = super(TGT, self).reconcile_targets()
+            # The tids in use may have changed
+            self.__next_tid = None
+            self.__free_tids = []
+            return ret
+
+    def __target(self, tid, target_name):
+        return Target(tid, 1, "{0}/{1}".format(self.fs_pool, target_name))
+
+    def __call_tgtadm(self, args):
+        return shell.call("{0} --lld iscsi {1}".format(self.tgtadm, args),
+                          sudo=self.sudo)
+
+    # Must be called with the registry lock held
+    # The tids are scanned from the server, not the registry, so that tids
+    # of targets created outside of BMI are skipped
+    def __allocate_tid(self):
+        if self.__free_tids:
+            return self.__free_tids.pop()
+        if self.__next_tid is None:
+            targets = self.scan_targets().values() + \
+                self.get_targets().values()
+            tids = [target.tid for target in targets if
+                    target.tid is not None]
+            self.__next_tid = max(tids or [0]) + 1
+        tid = self.__next_tid
+        self.__next_tid += 1
+        return tid
+
+    def __add_target_direct(self, target_name):
+        with self._registry_lock():
+            try:
+                if self.has_target(target_name):
+                    raise iscsi_exceptions.TargetExistsException()
+            except iscsi_exceptions.ListTargetFailedException as e:
+                raise iscsi_exceptions.TargetCreationFailed(str(e))
+
+            try:
+                tid = self.__allocate_tid()
+            except iscsi_exceptions.ListTargetFailedException as e:
+                raise iscsi_exceptions.TargetCreationFailed(str(e))
+            try:
+                self.__generate_config_file(target_name)
+            except (IOError, OSError) as e:
+                self.__free_tids.append(tid)
+                raise iscsi_exceptions.TargetCreationFailed(str(e))
+            try:
+                self.__call_tgtadm(
+                    "--mode target --op new --tid {0} --targetname {1}".format(
+                        tid, target_name))
+            except shell_exceptions.CommandFailedException as e:
+                # Most likely the tid is used by a target BMI does not know
+                # of, it is not handed out again and the next allocation
+                # scans the server for the tids in use like after a reconcile
+                self.__next_tid = None
+                self.__free_tids = []
+                self.__remove_config_file(target_name)
+                raise iscsi_exceptions.TargetCreationFailed(str(e))
+
+            try:
+                self.__call_tgtadm(
+                    "--mode logicalunit --op new --tid {0} --lun 1 "
+                    "--bstype rbd --backing-store {1}/{2} "
+                    "--bsopts conf={3};id={4}".format(
+                        tid, self.fs_pool, target_name, self.fs_config_loc,
+                        self.fs_user))
+                self.__call_tgtadm(
+                    "--mode logicalunit --op update --tid {0} --lun 1 "
+                    "--params mode_page={1}".format(
+                        tid, constants.TGT_WRITE_CACHE_OFF_MODE_PAGE))
+                self.__call_tgtadm(
+                    "--mode target --op bind --tid {0} "
+                    "--initiator-address ALL".format(tid))
+            except shell_exceptions.CommandFailedException as e:
+                try:
+                    self.__call_tgtadm(
+                        "--mode target --op delete --force --tid {0}".format(
+                            tid))
+                    self.__free_tids.append(tid)
+                except shell_exceptions.CommandFailedException:
+                    # The tid is still in use so it is never handed out again
+                    logger.exception('')
+                self.__remove_config_file(target_name)
+                raise iscsi_exceptions.TargetCreationFailed(str(e))
+            self._register(target_name, self.__target(tid, target_name))
+
+    def __remove_target_direct(self, target_name):
+        with self._registry_lock():
+            try:
+                target = self.get_target(target_name)
+            except iscsi_exceptions.ListTargetFailedException as e:
+                raise iscsi_exceptions.TargetDeletionFailed(str(e))
+            if target is None:
+                raise iscsi_exceptions.TargetDoesntExistException()
+
+            try:
+                self.__call_tgtadm(
+                    "--mode target --op delete --force --tid {0}".format(
+                        target.tid))
+            except shell_exceptions.CommandFailedException as e:
+                raise iscsi_exceptions.TargetDeletionFailed(str(e))
+            self._unregister(target_name)
+            self.__free_tids.append(target.tid)
+            self.__remove_config_file(target_name)
@@ -0,0 +1,236 @@
+import Queue
+import collections
+import threading
+import time
+import uuid
+
+import ims.common.constants as constants
+import ims.exception.job_exceptions as job_exceptions
+from ims.common.log import create_logger, log, trace
+
+logger = create_logger(__name__)
+
+_current = threading.local()
+
+
+def report_progress(progress):
+    """
+    Updates the progress of the job being run by the calling thread.
+    Does nothing if the calling thread is not running a job, so long running
+    operations can call it whether or not they were submitted as a job.
+
+    :param progress: percentage of the job that is done (0 to 100)
+    :return: None
+    """
+    progress_reporter()(progress)
+
+
+def progress_reporter():
+    """
+    Returns a function that updates the progress of the job being run by the
+    calling thread and that can be called from any thread, like the threads
+    of parallel.map. The function does nothing if the calling thread is not
+    running a job.
+
+    :return: function taking the percentage of the job that is done
+    """
+    job = getattr(_current, 'job', None)
+
+    def report(progress):
+        if job is not None:
+            job.progress = max(0, min(100, progress))
+
+    return report
+
+
+class Job:
+    """ A long running BMI operation that is run by a JobManager """
+
+    def __init__(self, project, command, args, func):
+        self.id = uuid.uuid4().hex
+        self.project = project
+        self.command = command
+        self.args = args
+        self.func = func
+        self.state = constants.JOB_QUEUED
+        self.progress = 0
+        self.result = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    def is_finished(self):
+        return self.state in [constants.JOB_SUCCEEDED, constants.JOB_FAILED,
+                              constants.JOB_CANCELLED]
+
+    def to_dict(self):
+        """
+        Returns the job as a dict that can be sent to clients
+
+        :return: dict of job attributes
+        """
+        return {constants.JOB_ID_KEY: self.id,
+                constants.JOB_COMMAND_KEY: self.command,
+                constants.JOB_ARGS_KEY: self.args,
+                constants.JOB_STATE_KEY: self.state,
+                constants.JOB_PROGRESS_KEY: self.progress,
+                constants.JOB_RESULT_KEY: self.result,
+                constants.JOB_CREATED_KEY: self.created,
+                constants.JOB_STARTED_KEY: self.started,
+                constants.JOB_FINISHED_KEY: self.finished}
+
+
+class JobManager:
+    """
+    Runs jobs on a bounded pool of worker threads and keeps track of them.
+
+    Jobs are only kept in memory, so they are lost when einstein restarts.
+    Only the latest finished jobs are remembered.
+    """
+
+    @log
+    def __init__(self, workers, history):
+        self.workers = workers
+        self.history = history
+        self.__jobs = collections.OrderedDict()
+        self.__queue = Queue.Queue()
+        self.__lock = threading.Lock()
+        self.__threads = []
+
+    @log
+    def submit(self, project, command, args, func):
+        """
+        Queues func to be run by a worker
+
+        :param project: the project that submitted the job
+        :param command: the name of the operation, only used for display
+        :param args: the arguments of the operation, only used for display
+        :param func: callable taking no arguments that returns a BMI response
+        dict, a job succeeds if the status code of the response is 200
+        :return: the Job
+        """
+        job = Job(project, command, args, func)
+        with self.__lock:
+            self.__start_workers()
+            self.__jobs[job.id] = job
+            self.__forget_finished()
+        self.__queue.put(job)
+        return job
+
+    @log
+    def get(self, job_id, project=None):
+        """
+        Returns the job with the given id
+
+        :param job_id: the id returned by submit
+        :param project: if given the job must belong to this project
+        :return: the Job
+        """
+        with self.__lock:
+            job = self.__jobs.get(job_id)
+        if job is None or (project is not None and job.project != project):
+            raise job_exceptions.JobNotFoundException(job_id)
+        return job
+
+    @log
+    def list(self, project=None):
+        """
+        Returns the jobs in the order they were submitted
+
+        :param project: if given only jobs of this project are returned
+        :return: list of Jobs
+        """
+        with self.__lock:
+            return [job for job in self.__jobs.values() if
+                    project is None or job.project == project]
+
+    @log
+    def cancel(self, job_id, project=None):
+        """
+        Cancels a job that has not started running yet
+
+        :param job_id: the id returned by submit
+        :param project: if given the job must belong to this project
+        :return: the Job
+        """
+        job = self.get(job_id, project)
+        with self.__lock:
+            if job.state != constants.JOB_QUEUED:
+                raise job_exceptions.JobNotCancellableException(job_id,
+                                                                job.state)
+            job.state = constants.JOB_CANCELLED
+            job.finished = time.time()
+        return job
+
+    @log
+    def shutdown(self):
+        """
+        Stops the workers after the jobs that are running finish.
+        Jobs that are still queued are not run.
+
+        :return: None
+        """
+        with self.__lock:
+            threads = self.__threads
+            self.__threads = []
+        for t in threads:
+            self.__queue.put(None)
+        for t in threads:
+            t.join()
+
+    # Workers are started on first submit so that processes which never run
+    # jobs (like the cli) do not get idle threads
+    def __start_workers(self):
+        while len(self.__threads) < self.workers:
+            name = "bmi-job-worker-%d" % len(self.__threads)
+            t = threading.Thread(target=self.__work, name=name)
+            t.daemon = True
+            t.start()
+            self.__threads.append(t)
+
+    def __forget_finished(self):
+        finished = [job.id for job in self.__jobs.values() if
+                    job.is_finished()]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self.__jobs[job_id]
+
+    def __work(self):
+        while True:
+            job = self.__queue.get()
+            if job is None:
+                return
+            with self.__lock:
+                if job.state != constants.JOB_QUEUED:
+                    continue
+                job.state = constants.JOB_RUNNING
+                job.started = time.time()
+            self.__run(job)
+
+    @trace
+    def __run(self, job):
+        _current.job = job
+        try:
+            result = job.func()
+        except Exception as e:
+            logger.exception('')
+            result = {constants.STATUS_CODE_KEY: 500,
+                      constants.MESSAGE_KEY: str(e)}
+        finally:
+            _current.job = None
+
+        if not isinstance(result, dict) or \
+                constants.STATUS_CODE_KEY not in result:
+            logger.error("Job %s returned %r instead of a response", job.id,
+                         result)
+            result = {constants.STATUS_CODE_KEY: 500,
+                      constants.MESSAGE_KEY: "Invalid response {0!r}".format(
+                          result)}
+
+        with self.__lock:
+            job.result = result
+            if result[constants.STATUS_CODE_KEY] == 200:
+                job.state = constants.JOB_SUCCEEDED
+                job.progress = 100
+            else:
+                job.state = constants.JOB_FAILED
+            job.finished = time.time()
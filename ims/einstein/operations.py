@@ -1,5 +1,7 @@
 #!/usr/bin/python
 import base64
+import json
+import threading
 import time
 
 import os
@@ -7,40 +9,51 @@ import errno
 
 import ims.common.config as config
 import ims.common.constants as constants
+import ims.common.metrics as metrics
+import ims.common.parallel as parallel
+import ims.einstein.context as context
+import ims.einstein.jobs as jobs
 import ims.exception.db_exceptions as db_exceptions
 from ims.common.log import create_logger, log, trace
 from ims.database.database import Database
-from ims.einstein.ceph import RBD
-from ims.einstein.dnsmasq import DNSMasq
 from ims.einstein.hil import HIL
-from ims.einstein.iscsi.tgt import TGT
 from ims.exception.exception import RegistrationFailedException, \
     FileSystemException, DBException, HILException, ISCSIException, \
-    AuthorizationFailedException, DHCPException
+    AuthorizationFailedException, DHCPException, InvalidArgumentException, \
+    JobException
 
 logger = create_logger(__name__)
 
+_templates = {}
+
+
+def _read_template(name):
+    """
+    Returns the contents of a template shipped with ims. Templates are read
+    once per process as they never change.
+
+    :param name: the file name of the template like ipxe.temp
+    :return: the template as a string
+    """
+    if name not in _templates:
+        template_loc = os.path.abspath(
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+        logger.debug("Template LOC = %s", template_loc)
+        with open(os.path.join(template_loc, name), 'r') as template:
+            _templates[name] = template.read()
+    return _templates[name]
+
 
 class BMI:
     @log
     def __init__(self, *args):
+        # The read-only db of the listings, opened when first needed
+        self.__reader = None
         if args.__len__() == 1:
             credentials = args[0]
             self.cfg = config.get()
             self.db = Database()
             self.__process_credentials(credentials)
-            self.hil = HIL(
-                base_url=self.cfg.net_isolator.url,
-                usr=self.username,
-                passwd=self.password)
-            self.fs = RBD(self.cfg.fs,
-                          self.cfg.iscsi.password)
-            self.dhcp = DNSMasq()
-            # self.iscsi = IET(self.fs, self.config.iscsi_update_password)
-            # Need to make this generic by passing specific config
-            self.iscsi = TGT(self.cfg.fs.conf_file,
-                             self.cfg.fs.id,
-                             self.cfg.fs.pool)
         elif args.__len__() == 3:
             username, password, project = args
             self.cfg = config.get()
@@ -50,19 +63,28 @@ class BMI:
             self.db = Database()
             self.pid = self.__does_project_exist(self.proj)
             self.is_admin = self.__check_admin()
-            self.hil = HIL(
-                base_url=self.cfg.net_isolator.url,
-                usr=self.username,
-                passwd=self.password)
-            self.fs = RBD(self.cfg.fs,
-                          self.cfg.iscsi.password)
             logger.debug("Username is %s and Password is %s", self.username,
                          self.password)
-            self.dhcp = DNSMasq()
-            # self.iscsi = IET(self.fs, self.config.iscsi_update_password)
-            self.iscsi = TGT(self.cfg.fs.conf_file,
-                             self.cfg.fs.id,
-                             self.cfg.fs.pool)
+        self.hil = HIL(
+            base_url=self.cfg.net_isolator.url,
+            usr=self.username,
+            passwd=self.password)
+        # The drivers and the ceph connection are shared by all requests and
+        # are owned by the service context of einstein. Outside of einstein
+        # (like in the CLI) BMI makes a context of its own, which has none
+        # of the background threads of einstein.
+        self.ctx = context.get()
+        self.__own_ctx = self.ctx is None
+        if self.__own_ctx:
+            self.ctx = context.ServiceContext()
+        self.dhcp = self.ctx.dhcp
+        self.iscsi = self.ctx.iscsi
+        try:
+            self.fs = self.ctx.acquire_fs()
+        except Exception:
+            self.fs = None
+            self.shutdown()
+            raise
 
     def __enter__(self):
         return self
@@ -90,6 +112,9 @@ class BMI:
     def __get_ceph_image_name(self, name):
         img_id = self.db.image.fetch_id_with_name_from_project(name,
                                                                self.proj)
+        return self.__get_ceph_name_with_id(img_id)
+
+    def __get_ceph_name_with_id(self, img_id):
         return str(self.cfg.bmi.uid) + "img" + str(img_id)
 
     def get_ceph_image_name_from_project(self, name, project_name):
@@ -99,14 +124,44 @@ class BMI:
             logger.info("Raising Image Not Found Exception for %s", name)
             raise db_exceptions.ImageNotFoundException(name)
 
-        return str(self.cfg.bmi.uid) + "img" + str(img_id)
+        return self.__get_ceph_name_with_id(img_id)
+
+    # Parses the limit and cursor of a listing, they are strings when they
+    # come over REST and empty if they were not given
+    @trace
+    def __parse_page(self, limit, after):
+        if limit is None or limit == '':
+            limit = None
+        else:
+            limit = self.__parse_int(limit, "limit")
+            if limit <= 0:
+                raise InvalidArgumentException("limit must be positive")
+        if after == '':
+            after = None
+        return limit, after
 
     @trace
-    def __extract_id(self, ceph_img_name):
-        start_index = ceph_img_name.find("img")
-        start_index += 3
-        img_id = ceph_img_name[start_index:]
-        return img_id
+    def __parse_int(self, value, name):
+        try:
+            return int(value)
+        except ValueError:
+            raise InvalidArgumentException(name + " must be an integer")
+
+    # Names with the prefix of the standby disks are reserved for the disk
+    # pool, an image named like that would be hidden from the listings and
+    # handed out or evicted by the pool as one of its disks
+    @trace
+    def __check_name(self, name):
+        if str(name).startswith(constants.STANDBY_DISK_PREFIX):
+            raise InvalidArgumentException(
+                "Image names cannot start with " +
+                constants.STANDBY_DISK_PREFIX)
+
+    @trace
+    def __parse_flag(self, value):
+        if isinstance(value, basestring):
+            return value.lower() == 'true'
+        return bool(value)
 
     @trace
     def __process_credentials(self, credentials):
@@ -160,19 +215,15 @@ class BMI:
 
     @log
     def __generate_ipxe_file(self, node_name, target_name):
-        template_loc = os.path.abspath(
-            os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
-        logger.debug("Template LOC = %s", template_loc)
         path = self.cfg.tftp.ipxe_path + node_name + ".ipxe"
         logger.debug("The Path for ipxe file is %s", path)
         try:
+            content = _read_template("ipxe.temp")
+            content = content.replace(constants.IPXE_TARGET_NAME, target_name)
+            content = content.replace(constants.IPXE_ISCSI_IP,
+                                      self.cfg.iscsi.ip)
             with open(path, 'w') as ipxe:
-                for line in open(template_loc + "/ipxe.temp", 'r'):
-                    line = line.replace(constants.IPXE_TARGET_NAME,
-                                        target_name)
-                    line = line.replace(constants.IPXE_ISCSI_IP,
-                                        self.cfg.iscsi.ip)
-                    ipxe.write(line)
+                ipxe.write(content)
             logger.info("Generated ipxe file")
             os.chmod(path, 0755)
             logger.info("Changed permissions to 755")
@@ -183,18 +234,15 @@ class BMI:
 
     @log
     def __generate_mac_addr_file(self, img_name, node_name, mac_addr):
-        template_loc = os.path.abspath(
-            os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
-        logger.debug("Template LOC = %s", template_loc)
         path = self.cfg.tftp.pxelinux_path + mac_addr
         logger.debug("The Path for mac addr file is %s", path)
         try:
+            content = _read_template("mac.temp")
+            content = content.replace(constants.MAC_IMG_NAME, img_name)
+            content = content.replace(constants.MAC_IPXE_NAME,
+                                      node_name + ".ipxe")
             with open(path, 'w') as mac:
-                for line in open(template_loc + "/mac.temp", 'r'):
-                    line = line.replace(constants.MAC_IMG_NAME, img_name)
-                    line = line.replace(constants.MAC_IPXE_NAME,
-                                        node_name + ".ipxe")
-                    mac.write(line)
+                mac.write(content)
             logger.info("Generated mac addr file")
             os.chmod(path, 0644)
             logger.debug("Changed permissions to 644")
@@ -203,6 +251,63 @@ class BMI:
                         node_name)
             raise RegistrationFailedException(node_name, e.message)
 
+    @log
+    def __parse_batch(self, entries, length=None):
+        """
+        Validates the entries of a batch call
+
+        :param entries: list of entries or the JSON encoding of it (REST)
+        :param length: the number of fields each entry must have or None if
+        each entry is a single name
+        :return: list of tuples (or names), one per entry
+        """
+        if isinstance(entries, basestring):
+            try:
+                entries = json.loads(entries)
+            except ValueError:
+                raise InvalidArgumentException("Batch is not valid JSON")
+        if not isinstance(entries, list):
+            raise InvalidArgumentException("Batch must be a list")
+        parsed = []
+        for entry in entries:
+            if length is None:
+                if not isinstance(entry, basestring):
+                    raise InvalidArgumentException(
+                        "Each entry must be a name")
+                parsed.append(str(entry))
+            elif isinstance(entry, (list, tuple)) and len(entry) == length:
+                parsed.append(tuple(str(field) for field in entry))
+            else:
+                raise InvalidArgumentException(
+                    "Each entry must have {0} fields".format(length))
+        names = parsed if length is None else [entry[0] for entry in parsed]
+        if len(set(names)) != len(names):
+            raise InvalidArgumentException("Entries are repeated in batch")
+        return parsed
+
+    @log
+    def __fetch_mac_addrs(self, nodes):
+        """
+        Fetches the mac addresses of the given nics from HIL concurrently
+
+        :param nodes: list of (node, nic) tuples
+        :return: dict of node to mac addr file name or the HILException
+        raised while looking it up
+        """
+
+        def fetch(node):
+            node_name, nic = node
+            try:
+                return "01-" + self.hil.get_node_mac_addr(node_name, nic). \
+                    replace(":", "-")
+            except HILException as e:
+                logger.exception('')
+                return e
+
+        macs = parallel.map(fetch, nodes,
+                            self.cfg.net_isolator.parallel_calls)
+        return dict(zip([node[0] for node in nodes], macs))
+
     # Parses the Exception and returns the dict that should be returned to user
     @log
     def __return_error(self, ex):
@@ -238,8 +343,22 @@ class BMI:
 
     @log
     def shutdown(self):
-        self.fs.tear_down()
+        if self.fs is not None:
+            self.ctx.release_fs(self.fs)
+            self.fs = None
+        if self.__own_ctx:
+            self.ctx.shutdown()
+            self.__own_ctx = False
         self.db.close()
+        if self.__reader is not None:
+            self.__reader.close()
+
+    # Listings read through their own read-only session so that they never
+    # wait behind a write made for another request
+    def __read_db(self):
+        if self.__reader is None:
+            self.__reader = Database(read_only=True)
+        return self.__reader
 
     # Provisions from HIL and Boots the given node with given image
 
@@ -254,11 +373,22 @@ class BMI:
         """
         # Database Operations
         try:
+            self.__check_name(disk_name)
             # Find the image id by using the image name, and then create a new
             # entry for the new disk image.
             parent_id = self.db.image.fetch_id_with_name_from_project(img_name,
                                                                       self.proj
                                                                       )
+
+            # A standby disk is already cloned and exported, it only has to
+            # be given the name of the disk
+            standby_id = self.ctx.disk_pool.claim(parent_id)
+            if standby_id is not None:
+                response = self.__claim_standby_disk(disk_name, parent_id,
+                                                     standby_id)
+                if response is not None:
+                    return response
+
             self.db.image.insert(disk_name, self.pid, parent_id)
 
             # This generates the name that BMI *must* have used when it created
@@ -272,7 +402,7 @@ class BMI:
             return {constants.STATUS_CODE_KEY: 409,
                     constants.MESSAGE_KEY:
                     "Disk exists. Endpoint:" + clone_ceph_name}
-        except DBException as e:
+        except (DBException, InvalidArgumentException) as e:
             logger.exception('')
             return self.__return_error(e)
 
@@ -298,6 +428,107 @@ class BMI:
         # target including the endpoint, port and target name.
         return self.__return_success(clone_ceph_name)
 
+    # Returns None when another einstein sharing the db claimed the standby
+    # disk first, the disk is then cloned like when the pool is empty
+    @log
+    def __claim_standby_disk(self, disk_name, parent_id, standby_id):
+        clone_ceph_name = self.__get_ceph_name_with_id(standby_id)
+        try:
+            if not self.db.image.claim_standby_with_id(standby_id, disk_name):
+                self.ctx.disk_pool.lost(parent_id, standby_id)
+                return None
+        except db_exceptions.ORMException:
+            self.ctx.disk_pool.release(parent_id, standby_id)
+            return {constants.STATUS_CODE_KEY: 409,
+                    constants.MESSAGE_KEY:
+                    "Disk exists. Endpoint:" +
+                    self.__get_ceph_image_name(disk_name)}
+        logger.info("The create_disk command claimed %s", clone_ceph_name)
+        return self.__return_success(clone_ceph_name)
+
+    @log
+    def create_disks(self, img_name, disk_names):
+        """
+        Creates a disk for every name in <disk_names> from <img_name>.
+        The db rows are inserted in one transaction, the clones are made
+        concurrently and the iscsi targets are applied in one go. A disk that
+        fails is rolled back on its own without affecting the others.
+
+        : param img_name: Name of the image to create the disks from
+        : param disk_names: list of disk names
+        : return: dict of disk name to the result of creating that disk. On
+        success the result holds the iscsi target name like create_disk.
+        """
+        try:
+            disk_names = self.__parse_batch(disk_names)
+            for disk_name in disk_names:
+                self.__check_name(disk_name)
+            parent_id = self.db.image.fetch_id_with_name_from_project(img_name,
+                                                                      self.proj
+                                                                      )
+            ceph_img_name = self.__get_ceph_image_name(img_name)
+
+            results = {}
+            existing = set(self.db.image.fetch_names_from_project(self.proj))
+            for disk_name in disk_names:
+                if disk_name in existing:
+                    results[disk_name] = {
+                        constants.STATUS_CODE_KEY: 409,
+                        constants.MESSAGE_KEY: "Disk exists"}
+            new_disks = [disk_name for disk_name in disk_names if
+                         disk_name not in results]
+            ids = self.db.image.insert_many(new_disks, self.pid, parent_id)
+        except (DBException, InvalidArgumentException) as e:
+            logger.exception('')
+            return self.__return_error(e)
+
+        clone_ceph_names = dict(
+            (disk_name, self.__get_ceph_name_with_id(ids[disk_name])) for
+            disk_name in new_disks)
+
+        def rollback(disk_name, e, remove_clone):
+            if remove_clone:
+                try:
+                    self.fs.remove(clone_ceph_names[disk_name])
+                except FileSystemException:
+                    logger.exception('')
+            try:
+                self.db.image.delete_with_name_from_project(disk_name,
+                                                            self.proj)
+            except DBException:
+                logger.exception('')
+            results[disk_name] = self.__return_error(e)
+
+        # Storage Operations
+        def clone(disk_name):
+            try:
+                self.fs.clone(ceph_img_name, self.cfg.bmi.snapshot,
+                              clone_ceph_names[disk_name])
+            except FileSystemException as e:
+                logger.exception('')
+                return e
+
+        errors = parallel.map(clone, new_disks, self.cfg.fs.parallel_calls)
+        for disk_name, e in zip(new_disks, errors):
+            if e is not None:
+                rollback(disk_name, e, False)
+
+        # iSCSI Operations
+        cloned = [disk_name for disk_name in new_disks if
+                  disk_name not in results]
+        failed = self.iscsi.add_targets(
+            [clone_ceph_names[disk_name] for disk_name in cloned])
+        for disk_name in cloned:
+            e = failed.get(clone_ceph_names[disk_name])
+            if e is not None:
+                rollback(disk_name, e, True)
+            else:
+                results[disk_name] = self.__return_success(
+                    clone_ceph_names[disk_name])
+
+        logger.info("The create_disks command was executed successfully")
+        return self.__return_success(results)
+
     @log
     def delete_disk(self, disk_name):
         """
@@ -350,6 +581,41 @@ class BMI:
             logger.exception('')
             return self.__return_error(e)
 
+    @log
+    def provision_many(self, nodes):
+        """
+        Provisions several nodes in one call.
+        The mac addresses of all nodes are fetched from HIL concurrently and
+        then the ipxe and mac address files of every node are written.
+
+        : param nodes: list of [node, disk_name, nic]
+        : return: dict of node name to the result of provisioning that node
+        """
+        try:
+            nodes = self.__parse_batch(nodes, 3)
+            macs = self.__fetch_mac_addrs([(node_name, nic) for
+                                           node_name, disk_name, nic in nodes])
+            ceph_names = {}
+            results = {}
+            for node_name, disk_name, nic in nodes:
+                try:
+                    if isinstance(macs[node_name], HILException):
+                        raise macs[node_name]
+                    if disk_name not in ceph_names:
+                        ceph_names[disk_name] = self.__get_ceph_image_name(
+                            disk_name)
+                    self.__register(node_name, disk_name,
+                                    ceph_names[disk_name], macs[node_name])
+                    results[node_name] = self.__return_success(True)
+                except (RegistrationFailedException, DBException,
+                        HILException) as e:
+                    logger.exception('')
+                    results[node_name] = self.__return_error(e)
+            return self.__return_success(results)
+        except InvalidArgumentException as e:
+            logger.exception('')
+            return self.__return_error(e)
+
     @log
     def deprovision(self, node_name, nic):
         """
@@ -367,35 +633,58 @@ class BMI:
             logger.exception('')
             return self.__return_error(e)
 
+    @log
+    def deprovision_many(self, nodes):
+        """
+        Deprovisions several nodes in one call.
+        The mac addresses of all nodes are fetched from HIL concurrently and
+        then the ipxe and mac address files of every node are deleted.
+
+        : param nodes: list of [node, nic]
+        : return: dict of node name to the result of deprovisioning that node
+        """
+        try:
+            nodes = self.__parse_batch(nodes, 2)
+            macs = self.__fetch_mac_addrs(nodes)
+            results = {}
+            for node_name, nic in nodes:
+                try:
+                    if isinstance(macs[node_name], HILException):
+                        raise macs[node_name]
+                    self.__unregister(node_name, macs[node_name])
+                    results[node_name] = self.__return_success(True)
+                except (RegistrationFailedException, HILException) as e:
+                    logger.exception('')
+                    results[node_name] = self.__return_error(e)
+            return self.__return_success(results)
+        except InvalidArgumentException as e:
+            logger.exception('')
+            return self.__return_error(e)
+
     # Creates snapshot for the given image with snap_name as given name
     # fs_obj will be populated by decorator
     @log
     def create_snapshot(self, disk_name, snap_name):
         try:
             self.hil.validate_project(self.proj)
+            self.__check_name(snap_name)
 
             ceph_img_name = self.__get_ceph_image_name(disk_name)
 
-            self.fs.snap_image(ceph_img_name, self.cfg.bmi.snapshot)
-            self.fs.snap_protect(ceph_img_name,
-                                 self.cfg.bmi.snapshot)
+            self.fs.snap_and_protect(ceph_img_name, self.cfg.bmi.snapshot)
             parent_id = self.db.image.fetch_parent_id(self.proj, disk_name)
             self.db.image.insert(snap_name, self.pid, parent_id,
                                  is_snapshot=True)
             snap_ceph_name = self.__get_ceph_image_name(snap_name)
-            self.fs.clone(ceph_img_name, self.cfg.bmi.snapshot,
-                          snap_ceph_name)
-            self.fs.flatten(snap_ceph_name)
-            self.fs.snap_image(snap_ceph_name, self.cfg.bmi.snapshot)
-            self.fs.snap_protect(snap_ceph_name,
-                                 self.cfg.bmi.snapshot)
-            self.fs.snap_unprotect(ceph_img_name,
-                                   self.cfg.bmi.snapshot)
-            self.fs.remove_snapshot(ceph_img_name,
-                                    self.cfg.bmi.snapshot)
+            self.fs.clone_flatten_and_seal(ceph_img_name,
+                                           self.cfg.bmi.snapshot,
+                                           snap_ceph_name,
+                                           self.cfg.bmi.snapshot)
+            self.fs.release_snapshot(ceph_img_name, self.cfg.bmi.snapshot)
             return self.__return_success(True)
 
-        except (HILException, DBException, FileSystemException) as e:
+        except (HILException, DBException, FileSystemException,
+                InvalidArgumentException) as e:
             logger.exception('')
             return self.__return_error(e)
 
@@ -403,13 +692,23 @@ class BMI:
     # URL's have to be read from BMI config file
     # fs_obj will be populated by decorator
     @log
-    def list_snapshots(self):
+    def list_snapshots(self, limit=None, after=None):
+        """
+        Lists the snapshots of the project ordered by name
+
+        :param limit: the maximum number of snapshots returned
+        :param after: the name of the last snapshot of the previous page
+        :return: list of [snapshot name, parent name]
+        """
         try:
+            limit, after = self.__parse_page(limit, after)
             self.hil.validate_project(self.proj)
-            snapshots = self.db.image.fetch_snapshots_from_project(self.proj)
+            snapshots = self.__read_db().image.fetch_snapshots_from_project(
+                self.proj, limit, after)
             return self.__return_success(snapshots)
 
-        except (HILException, DBException, FileSystemException) as e:
+        except (HILException, DBException, FileSystemException,
+                InvalidArgumentException) as e:
             logger.exception('')
             return self.__return_error(e)
 
@@ -419,28 +718,62 @@ class BMI:
     def remove_image(self, img_name):
         try:
             self.hil.validate_project(self.proj)
-            ceph_img_name = self.__get_ceph_image_name(img_name)
+            img_id = self.db.image.fetch_id_with_name_from_project(img_name,
+                                                                   self.proj)
+            ceph_img_name = self.__get_ceph_name_with_id(img_id)
+
+            # Checked before the standby disks are evicted so that a remove
+            # that cannot succeed leaves the warm pool as it was
+            if self.db.image.has_clones_with_id(img_id):
+                raise db_exceptions.ImageHasClonesException(img_name)
+            watermarks = self.ctx.disk_pool.stats().get(img_id)
+        except (HILException, DBException) as e:
+            logger.exception('')
+            return self.__return_error(e)
 
-            self.fs.snap_unprotect(ceph_img_name,
-                                   self.cfg.bmi.snapshot)
-            self.fs.remove_snapshot(ceph_img_name,
-                                    self.cfg.bmi.snapshot)
+        try:
+            # Standby disks are clones of the image and must go first
+            self.ctx.disk_pool.evict(img_id)
+            self.db.warm_pool.delete_with_image_id(img_id)
+
+            self.fs.release_snapshot(ceph_img_name, self.cfg.bmi.snapshot)
             self.fs.remove(ceph_img_name)
+            watermarks = None
             self.db.image.delete_with_name_from_project(img_name, self.proj)
             return self.__return_success(True)
-        except (HILException, DBException, FileSystemException) as e:
+        except (DBException, FileSystemException) as e:
             logger.exception('')
+            # Only while the image is still there to clone from
+            if watermarks is not None:
+                self.__restore_warm_pool(img_id, watermarks[0], watermarks[1])
             return self.__return_error(e)
 
+    # Puts back the warm pool of an image whose removal failed
+    def __restore_warm_pool(self, img_id, low, high):
+        try:
+            self.db.warm_pool.upsert(img_id, low, high)
+            self.ctx.disk_pool.set_watermarks(img_id, self.pid, low, high)
+        except DBException:
+            logger.exception('')
+
     # Lists the images for the project which includes the snapshot
     @log
-    def list_images(self):
+    def list_images(self, limit=None, after=None):
+        """
+        Lists the images of the project ordered by name
+
+        :param limit: the maximum number of images returned
+        :param after: the name of the last image of the previous page
+        :return: list of image names
+        """
         try:
+            limit, after = self.__parse_page(limit, after)
             self.hil.validate_project(self.proj)
-            names = self.db.image.fetch_images_from_project(self.proj)
+            names = self.__read_db().image.fetch_images_from_project(
+                self.proj, limit, after)
             return self.__return_success(names)
 
-        except (HILException, DBException) as e:
+        except (HILException, DBException, InvalidArgumentException) as e:
             logger.exception('')
             return self.__return_error(e)
 
@@ -449,24 +782,58 @@ class BMI:
         """Show all disks that belong to <project>."""
 
         try:
-            clones = self.db.image.fetch_clones_from_project(self.proj)
+            clones = self.__read_db().image.fetch_clones_from_project(
+                self.proj)
             return self.__return_success(clones)
         except DBException as e:
             logger.exception('')
             return self.__return_error(e)
 
     @log
-    def list_all_images(self):
+    def list_all_images(self, project=None, name=None, ceph=None,
+                        snapshots=False, clones=False, public=False,
+                        limit=None, after=None):
+        """
+        Lists the images of all projects ordered by id, the filters are
+        applied by the db. Empty strings are treated as not given as that
+        is how missing REST parameters arrive.
+
+        :param project: only images of this project
+        :param name: only images with this name
+        :param ceph: only the image with this ceph name
+        :param snapshots: include snapshots
+        :param clones: include clones
+        :param public: include public images, if none of snapshots, clones
+        and public is set every image is included
+        :param limit: the maximum number of images returned
+        :param after: the id of the last image of the previous page
+        :return: list of [id, name, project, ceph name, is public,
+        is snapshot, parent name or '']
+        """
         try:
-            images = self.db.image.fetch_all_images()
-            new_images = []
+            if not self.is_admin:
+                raise AuthorizationFailedException()
+            limit, after = self.__parse_page(limit, after)
+            if after is not None:
+                after = self.__parse_int(after, "after")
+            img_id = None
+            if ceph:
+                # Ceph names are made from the id, others are not BMI images
+                prefix = self.__get_ceph_name_with_id('')
+                if not (ceph.startswith(prefix) and
+                        ceph[len(prefix):].isdigit()):
+                    return self.__return_success([])
+                img_id = int(ceph[len(prefix):])
+            images = self.__read_db().image.fetch_all_images(
+                project or None, name or None, img_id,
+                self.__parse_flag(snapshots), self.__parse_flag(clones),
+                self.__parse_flag(public), limit, after)
+            # The ceph name only depends on the id that is already fetched
             for image in images:
-                image.insert(3, self.get_ceph_image_name_from_project(image[1],
-                                                                      image[
-                                                                          2]))
-                new_images.append(image)
-            return self.__return_success(new_images)
-        except DBException as e:
+                image.insert(3, self.__get_ceph_name_with_id(image[0]))
+            return self.__return_success(images)
+        except (DBException, AuthorizationFailedException,
+                InvalidArgumentException) as e:
             logger.exception('')
             return self.__return_error(e)
 
@@ -483,13 +850,12 @@ class BMI:
 
         try:
             ceph_img_name = str(img)
+            self.__check_name(ceph_img_name)
 
             # create a snapshot of the golden image and protect it
             # this is needed because, in ceph, you can only create clones from
             # snapshots.
-            self.fs.snap_image(ceph_img_name, self.cfg.bmi.snapshot)
-            self.fs.snap_protect(ceph_img_name,
-                                 self.cfg.bmi.snapshot)
+            self.fs.snap_and_protect(ceph_img_name, self.cfg.bmi.snapshot)
 
             # insert golden image name into bmi db
             self.db.image.insert(ceph_img_name, self.pid)
@@ -499,26 +865,21 @@ class BMI:
             # a name like 4img1 based on the UID in config and image id in db
             snap_ceph_name = self.__get_ceph_image_name(ceph_img_name)
 
-            # clone the snapshot of the golden image and then flatten it
-            self.fs.clone(ceph_img_name, self.cfg.bmi.snapshot,
-                          snap_ceph_name)
-            self.fs.flatten(snap_ceph_name)
-
-            # create a snapshot of our newly created golden image so that when
-            # we provision, we can easily make clones from this readily
+            # clone the snapshot of the golden image, flatten it and create
+            # a protected snapshot of our newly created golden image so that
+            # when we provision, we can easily make clones from this readily
             # available snapshot.
-            self.fs.snap_image(snap_ceph_name, self.cfg.bmi.snapshot)
-            self.fs.snap_protect(snap_ceph_name,
-                                 self.cfg.bmi.snapshot)
+            self.fs.clone_flatten_and_seal(ceph_img_name,
+                                           self.cfg.bmi.snapshot,
+                                           snap_ceph_name,
+                                           self.cfg.bmi.snapshot)
 
             # unprotect and delete the snapshot of the original golden because
             # we no longer need it.
-            self.fs.snap_unprotect(ceph_img_name,
-                                   self.cfg.bmi.snapshot)
-            self.fs.remove_snapshot(ceph_img_name,
-                                    self.cfg.bmi.snapshot)
+            self.fs.release_snapshot(ceph_img_name, self.cfg.bmi.snapshot)
             return self.__return_success(True)
-        except (DBException, FileSystemException) as e:
+        except (DBException, FileSystemException,
+                InvalidArgumentException) as e:
             logger.exception('')
             return self.__return_error(e)
 
@@ -536,22 +897,138 @@ class BMI:
         """
         try:
             ceph_img_name = str(img)
+            self.__check_name(ceph_img_name)
 
             if protect:
                 self.fs.snap_protect(ceph_img_name, snap_name)
             self.db.image.insert(ceph_img_name, self.pid)
             snap_ceph_name = self.__get_ceph_image_name(ceph_img_name)
-            self.fs.clone(ceph_img_name, snap_name,
-                          snap_ceph_name)
-            self.fs.flatten(snap_ceph_name)
-            self.fs.snap_image(snap_ceph_name, self.cfg.bmi.snapshot)
-            self.fs.snap_protect(snap_ceph_name,
-                                 self.cfg.bmi.snapshot)
+            self.fs.clone_flatten_and_seal(ceph_img_name, snap_name,
+                                           snap_ceph_name,
+                                           self.cfg.bmi.snapshot)
             return self.__return_success(True)
-        except (DBException, FileSystemException) as e:
+        except (DBException, FileSystemException,
+                InvalidArgumentException) as e:
+            logger.exception('')
+            return self.__return_error(e)
+
+    @log
+    def import_ceph_images(self, images, protect=False):
+        """
+        Imports several images and snapshots from ceph at once. Their
+        pipelines (snapshot, clone, flatten and seal) run concurrently on at
+        most parallel_calls threads and the flattens are bounded by the
+        flatten executor. An image that fails does not stop the others.
+
+        The import is resumable, running it again skips the images whose
+        sealed snapshot already exists and redoes the others. The progress
+        of each image is shown by show_flattens and the progress of the job
+        running the import is the share of images that are done.
+
+        : param images: list of ceph image names, ceph snapshots are given
+        as <image>@<snapshot>, or the JSON encoding of it (REST)
+        : param protect: whether the ceph snapshots should be protected
+        before cloning
+        : return: dict of image name to the result of importing that image.
+        On success the result is imported or skipped.
+        """
+        try:
+            entries = []
+            for entry in self.__parse_batch(images):
+                img, _, snap = entry.partition(
+                    constants.CEPH_SNAPSHOT_SEPARATOR)
+                if not img or (snap == '' and
+                               constants.CEPH_SNAPSHOT_SEPARATOR in entry):
+                    raise InvalidArgumentException(
+                        "{0} is not an image or snapshot".format(entry))
+                self.__check_name(img)
+                entries.append((img, snap or None))
+            names = [img for img, snap in entries]
+            if len(set(names)) != len(names):
+                raise InvalidArgumentException(
+                    "Images are repeated in batch")
+            protect = self.__parse_flag(protect)
+
+            # The db rows are the points the import resumes from, rows left
+            # by an earlier run keep their id and so their ceph name
+            results = {}
+            ids = {}
+            existing = set(self.db.image.fetch_names_from_project(self.proj))
+            for img in names:
+                if img not in existing:
+                    continue
+                if self.db.image.fetch_parent_id(self.proj, img) is not None:
+                    # Disks and snapshots made by BMI are not imports
+                    results[img] = {constants.STATUS_CODE_KEY: 409,
+                                    constants.MESSAGE_KEY: "Image exists"}
+                else:
+                    ids[img] = self.db.image.fetch_id_with_name_from_project(
+                        img, self.proj)
+            ids.update(self.db.image.insert_many(
+                [img for img in names if img not in existing], self.pid))
+            ceph_images = set(self.fs.list_images())
+        except (DBException, FileSystemException,
+                InvalidArgumentException) as e:
             logger.exception('')
             return self.__return_error(e)
 
+        pending = [(img, snap) for img, snap in entries if img in ids]
+        report = jobs.progress_reporter()
+        done = [len(entries) - len(pending)]
+        lock = threading.Lock()
+
+        # Storage Operations
+        def run(entry):
+            img, snap = entry
+            try:
+                result = self.__import_pipeline(
+                    img, snap, protect, self.__get_ceph_name_with_id(ids[img]),
+                    ceph_images)
+            except FileSystemException as e:
+                logger.exception('')
+                result = self.__return_error(e)
+            with lock:
+                done[0] += 1
+                report(done[0] * 100 / len(entries))
+            return result
+
+        for (img, snap), result in zip(pending, parallel.map(
+                run, pending, self.cfg.fs.parallel_calls)):
+            results[img] = result
+        logger.info("The import_ceph_images command was executed")
+        return self.__return_success(results)
+
+    # Imports one entry of import_ceph_images into the BMI image whose row
+    # was already inserted, it cleans up what an interrupted run left
+    def __import_pipeline(self, img, snap, protect, ceph_name, ceph_images):
+        snapshot = self.cfg.bmi.snapshot
+        if ceph_name in ceph_images:
+            sealed = snapshot in self.fs.list_snapshots(ceph_name) and \
+                self.fs.is_snap_protected(ceph_name, snapshot)
+            if sealed:
+                if snap is None and snapshot in self.fs.list_snapshots(img):
+                    self.fs.release_snapshot(img, snapshot)
+                return self.__return_success(constants.IMPORT_SKIPPED)
+            # The clone was not flattened or sealed before the run stopped
+            if snapshot in self.fs.list_snapshots(ceph_name):
+                self.fs.release_snapshot(ceph_name, snapshot)
+            self.fs.remove(ceph_name)
+
+        if snap is not None:
+            if protect and not self.fs.is_snap_protected(img, snap):
+                self.fs.snap_protect(img, snap)
+            self.fs.clone_flatten_and_seal(img, snap, ceph_name, snapshot)
+            return self.__return_success(constants.IMPORT_DONE)
+
+        if snapshot in self.fs.list_snapshots(img):
+            if not self.fs.is_snap_protected(img, snapshot):
+                self.fs.snap_protect(img, snapshot)
+        else:
+            self.fs.snap_and_protect(img, snapshot)
+        self.fs.clone_flatten_and_seal(img, snapshot, ceph_name, snapshot)
+        self.fs.release_snapshot(img, snapshot)
+        return self.__return_success(constants.IMPORT_DONE)
+
     @log
     def export_ceph_image(self, img, name):
         try:
@@ -579,6 +1056,7 @@ class BMI:
         try:
             if not self.is_admin:
                 raise AuthorizationFailedException()
+            self.__check_name(img)
             parent_id = None
             if parent is not None:
                 parent_id = self.db.image.fetch_id_with_name_from_project(
@@ -587,7 +1065,8 @@ class BMI:
             pid = self.__does_project_exist(project)
             self.db.image.insert(img, pid, parent_id, public, snap, id)
             return self.__return_success(True)
-        except (DBException, AuthorizationFailedException) as e:
+        except (DBException, AuthorizationFailedException,
+                InvalidArgumentException) as e:
             logger.exception('')
             return self.__return_error(e)
 
@@ -614,6 +1093,7 @@ class BMI:
         try:
             if not self.is_admin and (self.proj != dest_project):
                 raise AuthorizationFailedException()
+            self.__check_name(img1 if img2 is None else img2)
             dest_pid = self.__does_project_exist(dest_project)
             self.db.image.copy_image(self.proj, img1, dest_pid, img2)
             if img2 is not None:
@@ -622,17 +1102,13 @@ class BMI:
             else:
                 ceph_name = self.get_ceph_image_name_from_project(img1,
                                                                   dest_project)
-            self.fs.clone(self.get_ceph_image_name_from_project(
-                img1, self.proj),
-                self.cfg.bmi.snapshot,
-                ceph_name)
-
-            self.fs.flatten(ceph_name)
-            self.fs.snap_image(ceph_name, self.cfg.bmi.snapshot)
-            self.fs.snap_protect(ceph_name, self.cfg.bmi.snapshot)
+            self.fs.clone_flatten_and_seal(
+                self.get_ceph_image_name_from_project(img1, self.proj),
+                self.cfg.bmi.snapshot, ceph_name, self.cfg.bmi.snapshot)
 
             return self.__return_success(True)
-        except (DBException, FileSystemException) as e:
+        except (DBException, FileSystemException,
+                AuthorizationFailedException, InvalidArgumentException) as e:
             logger.exception('')
             return self.__return_error(e)
 
@@ -641,10 +1117,12 @@ class BMI:
         try:
             if not self.is_admin and (self.proj != dest_project):
                 raise AuthorizationFailedException()
+            self.__check_name(img1 if img2 is None else img2)
             dest_pid = self.__does_project_exist(dest_project)
             self.db.image.move_image(self.proj, img1, dest_pid, img2)
             return self.__return_success(True)
-        except DBException as e:
+        except (DBException, AuthorizationFailedException,
+                InvalidArgumentException) as e:
             logger.exception('')
             return self.__return_error(e)
 
@@ -675,7 +1153,7 @@ class BMI:
         try:
             if not self.is_admin:
                 raise AuthorizationFailedException()
-            projects = self.db.project.fetch_projects()
+            projects = self.__read_db().project.fetch_projects()
             return self.__return_success(projects)
         except (DBException, AuthorizationFailedException) as e:
             logger.exception('')
@@ -710,18 +1188,204 @@ class BMI:
         try:
             if not self.is_admin:
                 raise AuthorizationFailedException()
-            mappings = self.iscsi.list_targets()
-            swapped_mappings = {}
+            # The registry of the driver answers without asking the daemon
+            mappings = self.iscsi.get_targets()
+            # Targets that are not named like BMI disks of this uid (like
+            # those of another BMI using the same iscsi server) are skipped
+            prefix = self.__get_ceph_name_with_id('')
+            ids = {}
             for k, v in mappings.iteritems():
-                img_id = self.__extract_id(k)
-                if self.proj == self.db.image.fetch_project_with_id(img_id):
-                    swapped_mappings[
-                        self.db.image.fetch_name_with_id(img_id)] = v
+                if k.startswith(prefix) and k[len(prefix):].isdigit():
+                    ids[int(k[len(prefix):])] = v
+            # All the targets are resolved together instead of two queries
+            # per target
+            names = self.db.image.fetch_names_and_projects_with_ids(ids.keys())
+            swapped_mappings = {}
+            for img_id, (name, project) in names.iteritems():
+                # Standby disks are exported but not handed out yet
+                if self.proj == project and \
+                        not name.startswith(constants.STANDBY_DISK_PREFIX):
+                    swapped_mappings[name] = ids[img_id].backing_store
             return self.__return_success(swapped_mappings)
         except (ISCSIException, DBException) as e:
             logger.exception('')
             return self.__return_error(e)
 
+    @log
+    def show_metrics(self):
+        """
+        Returns the counters collected by this einstein process like the
+        number of ceph connections that were opened and reused.
+        """
+        try:
+            if not self.is_admin:
+                raise AuthorizationFailedException()
+            return self.__return_success(metrics.snapshot())
+        except AuthorizationFailedException as e:
+            logger.exception('')
+            return self.__return_error(e)
+
+    @log
+    def set_warm_pool(self, img_name, low, high):
+        """
+        Sets how many pre-cloned standby disks einstein keeps for an image.
+        create_disk hands out a standby disk when one is available, the pool
+        is refilled up to high in the background once less than low remain.
+        Setting high to 0 removes the standby disks.
+
+        :param img_name: Name of the image
+        :param low: refill when there are less standby disks than this
+        :param high: number of standby disks after a refill
+        """
+        try:
+            try:
+                low, high = int(low), int(high)
+            except ValueError:
+                raise InvalidArgumentException("Watermarks must be integers")
+            if not 0 <= low <= high:
+                raise InvalidArgumentException(
+                    "Watermarks must satisfy 0 <= low <= high")
+            img_id = self.db.image.fetch_id_with_name_from_project(img_name,
+                                                                   self.proj)
+            if high == 0:
+                self.db.warm_pool.delete_with_image_id(img_id)
+            else:
+                self.db.warm_pool.upsert(img_id, low, high)
+            self.ctx.disk_pool.set_watermarks(img_id, self.pid, low, high)
+            return self.__return_success(True)
+        except (DBException, InvalidArgumentException) as e:
+            logger.exception('')
+            return self.__return_error(e)
+
+    @log
+    def show_warm_pool(self):
+        """
+        Lists the images of the project that have standby disks
+
+        :return: list of [image name, low, high, standby disks]
+        """
+        try:
+            stats = self.ctx.disk_pool.stats()
+            names = self.db.image.fetch_names_and_projects_with_ids(
+                stats.keys())
+            rows = [[name] + stats[img_id] for img_id, (name, project) in
+                    names.iteritems() if project == self.proj]
+            return self.__return_success(sorted(rows))
+        except DBException as e:
+            logger.exception('')
+            return self.__return_error(e)
+
+    @log
+    def show_flattens(self):
+        """
+        Lists the flattens einstein remembers with their progress, like
+        those of the jobs importing or copying images. Users see the
+        flattens of the images of their project, admins see every flatten
+        and those of images that are not in their project by ceph name.
+
+        :return: list of flattens in the order they were started
+        """
+        try:
+            flattens = [flatten.to_dict() for flatten in
+                        self.ctx.flattener.list()]
+            prefix = self.__get_ceph_name_with_id('')
+            ids = {}
+            for flatten in flattens:
+                image = flatten[constants.FLATTEN_IMAGE_KEY]
+                if image.startswith(prefix) and image[len(prefix):].isdigit():
+                    ids[image] = int(image[len(prefix):])
+            names = self.db.image.fetch_names_and_projects_with_ids(
+                ids.values())
+            rows = []
+            for flatten in flattens:
+                img_id = ids.get(flatten[constants.FLATTEN_IMAGE_KEY])
+                if img_id in names and names[img_id][1] == self.proj:
+                    flatten[constants.FLATTEN_IMAGE_KEY] = names[img_id][0]
+                elif not self.is_admin:
+                    continue
+                rows.append(flatten)
+            return self.__return_success(rows)
+        except DBException as e:
+            logger.exception('')
+            return self.__return_error(e)
+
+    @log
+    def submit_job(self, command, args):
+        """
+        Runs a long running operation like import_ceph_image in the
+        background so that the caller does not have to wait for it.
+
+        :param command: name of the operation, must be one of JOB_COMMANDS
+        :param args: list of arguments of the operation or the JSON encoding
+        of it (REST)
+        :return: the id of the job which is used to query it
+        """
+        try:
+            if command not in constants.JOB_COMMANDS:
+                raise InvalidArgumentException(
+                    "{0} cannot be run as a job".format(command))
+            if isinstance(args, basestring):
+                try:
+                    args = json.loads(args)
+                except ValueError:
+                    raise InvalidArgumentException("Args are not valid JSON")
+            if not isinstance(args, list) or \
+                    len(args) != constants.JOB_COMMANDS[command]:
+                raise InvalidArgumentException(
+                    "{0} takes {1} arguments".format(
+                        command, constants.JOB_COMMANDS[command]))
+
+            username, password, project = self.username, self.password, \
+                self.proj
+
+            # Runs on a worker thread with its own db session and fs
+            def run():
+                with BMI(username, password, project) as bmi:
+                    return getattr(bmi, command)(*args)
+
+            job = self.ctx.jobs.submit(self.proj, command, args, run)
+            return self.__return_success(job.id)
+        except InvalidArgumentException as e:
+            logger.exception('')
+            return self.__return_error(e)
+
+    @log
+    def list_jobs(self):
+        """
+        Lists the jobs submitted by the project that einstein remembers
+        """
+        return self.__return_success(
+            [job.to_dict() for job in self.ctx.jobs.list(self.proj)])
+
+    @log
+    def show_job(self, job_id):
+        """
+        Returns the state, progress and result of a job
+
+        :param job_id: the id returned by submit_job
+        """
+        try:
+            return self.__return_success(
+                self.ctx.jobs.get(job_id, self.proj).to_dict())
+        except JobException as e:
+            logger.exception('')
+            return self.__return_error(e)
+
+    @log
+    def cancel_job(self, job_id):
+        """
+        Cancels a job that is still waiting for a worker. Jobs that are
+        already running cannot be cancelled.
+
+        :param job_id: the id returned by submit_job
+        """
+        try:
+            return self.__return_success(
+                self.ctx.jobs.cancel(job_id, self.proj).to_dict())
+        except JobException as e:
+            logger.exception('')
+            return self.__return_error(e)
+
     @log
     def remake_mappings(self):
         try:
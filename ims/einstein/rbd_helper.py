@@ -0,0 +1,98 @@
+# The privileged helper that maps and unmaps rbd devices for einstein
+# It is installed as the bmi-rbd-helper script, which is what sudoers allows
+# einstein to run (as root and without arguments). It is started once by the
+# RbdMapper and kept running, so that mapping an image is a write to sysfs
+# instead of a fork of sudo and the rbd cli. It reads one request per line
+# from stdin, one of
+#   ping
+#   add <monitors> <ceph id> <key> <pool> <image>
+#   remove <device id>
+# writes it to the kernel rbd driver under /sys/bus/rbd and answers with ok
+# or the error on stdout.
+# Every field is checked before anything is written so that whoever can run
+# the helper can only map and unmap rbd images with it. The requests carry
+# the ceph key so they must never be echoed or logged.
+import os
+import re
+import sys
+
+import ims.common.constants as constants
+
+# Fixed so that the sysfs files written as root cannot be chosen by the caller
+RBD_DIR = '/sys/bus/rbd'
+
+# ip:port or [ipv6]:port, the kernel does not resolve host names
+MONITOR = re.compile(
+    r'^(\d{1,3}(\.\d{1,3}){3}|\[[0-9A-Fa-f:.]+\])(:\d{1,5})?$')
+# Ceph ids, pools and images, which also keeps them free of the spaces,
+# commas and = that separate the fields of the driver
+NAME = re.compile(r'^[A-Za-z0-9_][A-Za-z0-9_.-]*$')
+KEY = re.compile(r'^[A-Za-z0-9+/]+=*$')
+
+INVALID_REQUEST = 'Invalid request'
+
+
+def write(rbd_dir, name, value):
+    path = os.path.join(rbd_dir, name)
+    # The driver only accepts the single_major files when they exist
+    if os.path.exists(path + '_single_major'):
+        path += '_single_major'
+    # os.write so that the error of the driver is raised here and not lost
+    # in a buffered close
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        os.write(fd, value)
+    finally:
+        os.close(fd)
+
+
+def check(pattern, value):
+    if not pattern.match(value):
+        # Without the value, it may be the key
+        raise ValueError(INVALID_REQUEST)
+
+
+def handle(rbd_dir, line):
+    fields = line.split()
+    if fields == [constants.MAP_HELPER_PING]:
+        return
+    if len(fields) == 6 and fields[0] == constants.MAP_HELPER_ADD:
+        mons, rid, key, pool, image = fields[1:]
+        for mon in mons.split(','):
+            check(MONITOR, mon)
+        check(NAME, rid)
+        check(KEY, key)
+        check(NAME, pool)
+        check(NAME, image)
+        write(rbd_dir, 'add', "{0} name={1},secret={2} {3} {4}".format(
+            mons, rid, key, pool, image))
+    elif len(fields) == 2 and fields[0] == constants.MAP_HELPER_REMOVE and \
+            fields[1].isdigit():
+        write(rbd_dir, 'remove', fields[1])
+    else:
+        raise ValueError(INVALID_REQUEST)
+
+
+def serve(rbd_dir, stdin, stdout):
+    # readline does not read ahead like iterating over stdin does, which
+    # would wait for more requests before answering this one
+    for line in iter(stdin.readline, ''):
+        try:
+            handle(rbd_dir, line.strip())
+            reply = constants.MAP_HELPER_OK
+        except (OSError, ValueError) as e:
+            reply = str(e).replace('\n', ' ')
+        stdout.write(reply + '\n')
+        stdout.flush()
+    return 0
+
+
+def main():
+    if len(sys.argv) > 1:
+        sys.stderr.write("bmi-rbd-helper takes no arguments\n")
+        return 1
+    return serve(RBD_DIR, sys.stdin, sys.stdout)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,350 @@
+import re
+import select
+import shlex
+import subprocess
+import threading
+
+import os
+
+import ims.common.constants as constants
+import ims.common.metrics as metrics
+import ims.exception.file_system_exceptions as file_system_exceptions
+from ims.common.log import create_logger, log, trace
+from ims.exception import shell_exceptions
+
+logger = create_logger(__name__)
+
+
+@log
+def create_mapper(config, password=None):
+    """
+    Creates the mapper configured in the fs section
+
+    :param config: the fs config section
+    :param password: the sudo password, for hosts where sudoers does not let
+    einstein run the map helper without one
+    :return: RbdMapper
+    """
+    command = shlex.split(config.map_helper)
+    if not config.map_sudo:
+        password = None
+    elif password:
+        # -S reads the password from the stdin of the helper
+        command = ['sudo', '-S', '-p', '', '--'] + command
+    else:
+        # -n as a helper waiting for a password would hang the first map
+        command = ['sudo', '-n', '--'] + command
+    return RbdMapper(MapHelper(command, password), config.sysfs_root,
+                     config.conf_file, config.id, config.keyring)
+
+
+def split_addresses(value, separators):
+    """
+    Splits a list of addresses on the separators outside of brackets, which
+    enclose ipv6 addresses and address vectors
+
+    :param value: the list
+    :param separators: the characters that separate the addresses
+    :return: list of the addresses
+    """
+    addresses, address, depth = [], '', 0
+    for c in value:
+        if c == '[':
+            depth += 1
+        elif c == ']':
+            depth -= 1
+        if depth == 0 and c in separators:
+            if address:
+                addresses.append(address)
+            address = ''
+        else:
+            address += c
+    if address:
+        addresses.append(address)
+    return addresses
+
+
+def parse_mon_host(value):
+    """
+    Returns the monitors of a mon_host option as the kernel rbd driver takes
+    them. Entries are addresses with an optional v1: or v2: prefix and /nonce
+    suffix, or address vectors like [v2:10.0.0.1:3300,v1:10.0.0.1:6789] of
+    which the v1 address is used as the driver does not speak v2.
+
+    :param value: the mon_host option
+    :return: the comma separated monitors or None if there are none
+    """
+    mons = []
+    for entry in split_addresses(value, ', \t;'):
+        if re.match(r'^\[(v1|v2|any):', entry) and entry.endswith(']'):
+            entry = next((address for address in
+                          split_addresses(entry[1:-1], ',')
+                          if not address.startswith('v2:')), None)
+            if entry is None:
+                continue
+        elif entry.startswith('v2:'):
+            continue
+        entry = re.sub(r'^(v1|any):', '', entry).split('/')[0]
+        mons.append(entry)
+    return ','.join(mons) or None
+
+
+def read_option(path, sections, names):
+    """
+    Reads an option from a ceph config or keyring file. They are ini files
+    but indent their options which ConfigParser does not accept.
+
+    :param path: the path of the file
+    :param sections: the sections to look in
+    :param names: the names of the option, spaces are read as underscores
+    like ceph does
+    :return: the value or None if it is not found
+    """
+    section = None
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line[0] in '#;':
+                continue
+            if line.startswith('['):
+                section = line.strip('[]').strip()
+            elif section in sections and '=' in line:
+                name, value = line.split('=', 1)
+                if '_'.join(name.split()) in names:
+                    return value.strip()
+    return None
+
+
+class MapHelper:
+    """
+    Sends requests to the privileged rbd map helper (bmi-rbd-helper)
+
+    The helper is started on first use and restarted if it exits, requests
+    are sent one at a time.
+    """
+
+    def __init__(self, command, password=None,
+                 timeout=constants.MAP_HELPER_START_TIMEOUT):
+        self.command = command
+        self.password = password
+        self.timeout = timeout
+        self.__process = None
+        self.__lock = threading.Lock()
+
+    # Not decorated with log as the add requests carry the ceph key
+    def call(self, op, *args):
+        """
+        Sends a request to the helper and waits for it to be done
+
+        :param op: MAP_HELPER_ADD or MAP_HELPER_REMOVE
+        :param args: the fields of the request
+        :return: None
+        """
+        with self.__lock:
+            try:
+                process = self.__start()
+                process.stdin.write(' '.join((op,) + args) + '\n')
+                process.stdin.flush()
+                reply = process.stdout.readline().strip()
+            except (OSError, IOError) as e:
+                self.__stop()
+                raise shell_exceptions.CommandFailedException(str(e))
+            if not reply:
+                # Like when sudo refused to run it
+                self.__stop()
+                raise shell_exceptions.CommandFailedException(
+                    "map helper exited")
+            if reply != constants.MAP_HELPER_OK:
+                raise shell_exceptions.CommandFailedException(reply)
+
+    def __start(self):
+        if self.__process is not None and self.__process.poll() is None:
+            return self.__process
+        self.__process = subprocess.Popen(self.command, stdin=subprocess.PIPE,
+                                          stdout=subprocess.PIPE,
+                                          close_fds=True)
+        metrics.increment('ceph.map_helper_started')
+        if self.password is not None:
+            self.__wait_ready()
+        return self.__process
+
+    # sudo -S only reads the password when it needs one, a password line it
+    # left is answered by the helper as an invalid request. The ping finds
+    # where the replies to the requests begin.
+    def __wait_ready(self):
+        process = self.__process
+        process.stdin.write(
+            self.password + '\n' + constants.MAP_HELPER_PING + '\n')
+        process.stdin.flush()
+        for _ in range(2):
+            ready = select.select([process.stdout], [], [],
+                                  self.timeout)[0]
+            # Nothing comes when sudo waits for another password
+            reply = process.stdout.readline().strip() if ready else ''
+            if reply == constants.MAP_HELPER_OK:
+                return
+            if not reply:
+                break
+        self.__stop()
+        raise shell_exceptions.CommandFailedException(
+            "map helper did not start")
+
+    def __stop(self):
+        if self.__process is None:
+            return
+        try:
+            self.__process.stdin.close()
+        except IOError:
+            pass
+        # The helper and sudo exit when their stdin is closed
+        self.__process.wait()
+        self.__process = None
+
+    @log
+    def shutdown(self):
+        with self.__lock:
+            self.__stop()
+
+
+class RbdMapper:
+    """
+    Maps rbd images to block devices with the kernel rbd driver
+
+    The mapped devices are read from sysfs into an index on first use which
+    map and unmap keep up to date, so finding the device of an image does
+    not run anything. Mapping and unmapping are writes to sysfs which are
+    made by the MapHelper running as root.
+    """
+
+    def __init__(self, helper, sysfs_root, conf_file, rid, keyring):
+        self.helper = helper
+        self.devices_dir = os.path.join(sysfs_root, constants.RBD_SYSFS_DIR,
+                                        'devices')
+        self.conf_file = conf_file
+        self.rid = rid
+        self.keyring = keyring
+        # Device id to (pool, image, snap) of the mapped devices
+        self.__index = None
+        self.__credentials = None
+        self.__lock = threading.Lock()
+
+    @trace
+    def __scan(self):
+        index = {}
+        try:
+            dev_ids = os.listdir(self.devices_dir)
+        except OSError:
+            # The rbd module is not loaded, nothing is mapped
+            dev_ids = []
+        for dev_id in dev_ids:
+            try:
+                index[dev_id] = tuple(self.__read(dev_id, attr) for attr in
+                                      ['pool', 'name', 'current_snap'])
+            except IOError:
+                # Unmapped while it was read
+                continue
+        self.__index = index
+        return index
+
+    def __read(self, dev_id, attr):
+        with open(os.path.join(self.devices_dir, dev_id, attr)) as f:
+            return f.read().strip()
+
+    def __get_index(self):
+        if self.__index is None:
+            return self.__scan()
+        return self.__index
+
+    # The monitors and the secret given to the rbd driver, read once
+    def __get_credentials(self):
+        if self.__credentials is None:
+            try:
+                mons = read_option(self.conf_file, ['global'], ['mon_host'])
+                key = read_option(self.keyring, ['client.' + self.rid],
+                                  ['key'])
+            except IOError:
+                mons = key = None
+            if mons:
+                mons = parse_mon_host(mons)
+            if not mons:
+                raise file_system_exceptions.InvalidConfigArgumentException(
+                    constants.CEPH_CONFIG_FILE_OPT)
+            if not key:
+                raise file_system_exceptions.InvalidConfigArgumentException(
+                    constants.CEPH_KEY_RING_OPT)
+            self.__credentials = (mons, key)
+        return self.__credentials
+
+    @log
+    def map(self, pool, image):
+        """
+        Maps the head of the image
+
+        :param pool: the ceph pool of the image
+        :param image: the ceph name of the image
+        :return: the path of the device like /dev/rbd0
+        """
+        mons, key = self.__get_credentials()
+        with self.__lock:
+            before = set(self.__get_index())
+            try:
+                self.helper.call(constants.MAP_HELPER_ADD, mons, self.rid,
+                                 key, pool, image)
+            except shell_exceptions.CommandFailedException as e:
+                logger.info("Mapping %s failed with %s", image, e.error)
+                raise file_system_exceptions.MapFailedException(image)
+            # The driver has added the device when the write returns
+            for dev_id, mapping in self.__scan().items():
+                if dev_id not in before and \
+                        mapping == (pool, image, constants.RBD_NO_SNAP):
+                    return constants.RBD_DEVICE_PREFIX + dev_id
+            raise file_system_exceptions.MapFailedException(image)
+
+    @log
+    def unmap(self, device):
+        """
+        Unmaps the device
+
+        :param device: the path of the device like /dev/rbd0
+        :return: None
+        """
+        dev_id = device[len(constants.RBD_DEVICE_PREFIX):]
+        if not device.startswith(constants.RBD_DEVICE_PREFIX) or \
+                not dev_id.isdigit():
+            raise file_system_exceptions.UnmapFailedException(device)
+        with self.__lock:
+            try:
+                self.helper.call(constants.MAP_HELPER_REMOVE, dev_id)
+            except shell_exceptions.CommandFailedException as e:
+                logger.info("Unmapping %s failed with %s", device, e.error)
+                raise file_system_exceptions.UnmapFailedException(device)
+            self.__get_index().pop(dev_id, None)
+
+    @log
+    def showmapped(self, pool):
+        """
+        Returns the devices of the images of the pool that are mapped
+
+        :param pool: the ceph pool
+        :return: dict of the image name to the path of its device
+        """
+        with self.__lock:
+            return dict((image, constants.RBD_DEVICE_PREFIX + dev_id)
+                        for dev_id, (p, image, snap) in
+                        self.__get_index().items()
+                        if p == pool and snap == constants.RBD_NO_SNAP)
+
+    @log
+    def refresh(self):
+        """
+        Reads the mapped devices from sysfs again, for when devices were
+        mapped or unmapped outside of einstein
+
+        :return: None
+        """
+        with self.__lock:
+            self.__scan()
+
+    @log
+    def shutdown(self):
+        self.helper.shutdown()
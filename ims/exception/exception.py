@@ -42,6 +42,11 @@ class DHCPException(BMIException):
     __metaclass__ = ABCMeta
 
 
+class JobException(BMIException):
+    """ The Base Class for all exceptions related to Jobs """
+    __metaclass__ = ABCMeta
+
+
 class ShellException(BMIException):
     """ The Base Class for all exceptions related to Shell """
     __metaclass__ = ABCMeta
@@ -69,3 +74,16 @@ class RegistrationFailedException(BMIException):
 
     def __str__(self):
         return "Failed to register " + self.node + " due to " + self.error
+
+
+class InvalidArgumentException(BMIException):
+    """ Should be raised when the arguments given to a call are malformed """
+    @property
+    def status_code(self):
+        return 400
+
+    def __init__(self, message):
+        self.message = message
+
+    def __str__(self):
+        return "Invalid Arguments: " + self.message
@@ -168,6 +168,19 @@ class UnmapFailedException(FileSystemException):
         return "Unmap Failed for " + self.name
 
 
+class FlattenFailedException(FileSystemException):
+    @property
+    def status_code(self):
+        return 500
+
+    def __init__(self, name, reason):
+        self.name = name
+        self.reason = reason
+
+    def __str__(self):
+        return "Flatten Failed for {0} ({1})".format(self.name, self.reason)
+
+
 # this exception class is the abstract class for any ceph specific exceptions
 class CephFileSystemException(FileSystemException):
     __metaclass__ = ABCMeta
@@ -0,0 +1,29 @@
+from ims.exception.exception import JobException
+
+
+class JobNotFoundException(JobException):
+    """ Should be raised when a job with the given id is not known """
+    @property
+    def status_code(self):
+        return 404
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+
+    def __str__(self):
+        return "Job " + self.job_id + " not found"
+
+
+class JobNotCancellableException(JobException):
+    """ Should be raised when cancelling a job that has already started """
+    @property
+    def status_code(self):
+        return 409
+
+    def __init__(self, job_id, state):
+        self.job_id = job_id
+        self.state = state
+
+    def __str__(self):
+        return "Job {0} cannot be cancelled as it is {1}".format(self.job_id,
+                                                                 self.state)
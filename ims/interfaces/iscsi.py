@@ -1,10 +1,26 @@
+import collections
+import threading
 from abc import ABCMeta
 from abc import abstractmethod
 
+import ims.common.metrics as metrics
+from ims.exception.exception import ISCSIException
+
+# An exported target as known by the registry. tid is None if the driver
+# does not know it yet (like tgt-admin before the next reconcile)
+Target = collections.namedtuple('Target', ['tid', 'lun', 'backing_store'])
+
 
 class ISCSI(object):
     __metaclass__ = ABCMeta
 
+    def __init__(self):
+        # The registry of exported targets (target name -> Target). It is
+        # loaded from the daemon on first use and kept up to date by the
+        # drivers on every add and remove, so lookups need no daemon call
+        self.__registry = None
+        self.__registry_lock = threading.RLock()
+
     @abstractmethod
     def add_target(self, target_name):
         '''
@@ -13,6 +29,21 @@ class ISCSI(object):
         '''
         pass
 
+    def add_targets(self, target_names):
+        '''
+        Adding several targets for iscsi server. Drivers that can apply
+        several targets at once should override this.
+        :return: dict of target name to the ISCSIException raised while
+        adding it, targets that were added are not present
+        '''
+        failed = {}
+        for target_name in target_names:
+            try:
+                self.add_target(target_name)
+            except ISCSIException as e:
+                failed[target_name] = e
+        return failed
+
     @abstractmethod
     def remove_target(self, target_name):
         '''
@@ -22,12 +53,92 @@ class ISCSI(object):
         pass
 
     @abstractmethod
+    def scan_targets(self):
+        '''
+        Queries the iscsi server for the targets it exports. This is
+        expensive and is only used to load and reconcile the registry.
+        :return: dict of target name to Target
+        '''
+        pass
+
     def list_targets(self):
         '''
         Lists all the targets exposed by iscsi server
-        :return:
+        :return: list of target names
         '''
-        pass
+        return self.get_targets().keys()
+
+    def get_targets(self):
+        '''
+        Returns the registry of exported targets
+        :return: dict of target name to Target
+        '''
+        with self.__registry_lock:
+            return dict(self._load_registry())
+
+    def get_target(self, target_name):
+        '''
+        Returns the registered target with the given name
+        :return: Target or None if it is not exported
+        '''
+        with self.__registry_lock:
+            return self._load_registry().get(target_name)
+
+    def has_target(self, target_name):
+        '''
+        Checks whether the target is exported without asking the server
+        :return: True or False
+        '''
+        return self.get_target(target_name) is not None
+
+    def reconcile_targets(self):
+        '''
+        Replaces the registry with what the iscsi server exports, fixing
+        any drift caused by changes made outside of BMI
+        :return: tuple of (names that were missing, names that were stale)
+        '''
+        # The scan is done with the lock held so that no add or remove made
+        # during the scan is lost
+        with self.__registry_lock:
+            targets = self.scan_targets()
+            # The first scan only loads the registry
+            registry = self.__registry if self.__registry is not None \
+                else targets
+            missing = [name for name in targets if name not in registry]
+            stale = [name for name in registry if name not in targets]
+            self.__registry = targets
+        metrics.increment('iscsi.reconciles')
+        if missing or stale:
+            metrics.increment('iscsi.reconcile_drift',
+                              len(missing) + len(stale))
+        return missing, stale
+
+    def _load_registry(self):
+        '''
+        Returns the registry, scanning the server if it was never loaded.
+        Drivers must hold _registry_lock() while using the result.
+        :return: dict of target name to Target
+        '''
+        with self.__registry_lock:
+            if self.__registry is None:
+                self.__registry = self.scan_targets()
+            return self.__registry
+
+    def _registry_lock(self):
+        '''
+        The lock drivers hold to check the registry and mutate the server
+        as one step
+        :return: threading.RLock
+        '''
+        return self.__registry_lock
+
+    def _register(self, target_name, target):
+        with self.__registry_lock:
+            self._load_registry()[target_name] = target
+
+    def _unregister(self, target_name):
+        with self.__registry_lock:
+            self._load_registry().pop(target_name, None)
 
     @abstractmethod
     def start_server(self):
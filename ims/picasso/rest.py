@@ -28,10 +28,11 @@ def start():
 
 
 @log
-def rest_call(path, method, command, parameters):
+def rest_call(path, method, command, parameters, optional_parameters=()):
     def decorator(func):
         app.add_url_rule(path, func.__name__,
-                         _rest_wrapper(method, command, parameters),
+                         _rest_wrapper(method, command, parameters,
+                                       optional_parameters),
                          methods=[method])
         return func
 
@@ -50,15 +51,24 @@ def _extract_credentials(request):
 
 
 @trace
-def _rest_wrapper(method, command, parameters):
-    def wrapper():
+def _rest_wrapper(method, command, parameters, optional_parameters):
+    # Parameters that are part of the path (like <job_id>) are given by flask
+    # as keyword arguments, the rest are read from the form. Optional
+    # parameters follow the others and are sent as empty strings if missing
+    # so that the command always gets the same number of arguments
+    def wrapper(**path_parameters):
         extracted_parameters = []
         if request.method == method:
             credentials = _extract_credentials(request)
             if credentials is None:
                 return "No Authentication Details Given", 400
             for parameter in parameters:
-                extracted_parameters.append(request.form[parameter])
+                if parameter in path_parameters:
+                    extracted_parameters.append(path_parameters[parameter])
+                else:
+                    extracted_parameters.append(request.form[parameter])
+            for parameter in optional_parameters:
+                extracted_parameters.append(request.form.get(parameter, ''))
             ret = rpc_client.execute_command(command, credentials,
                                              extracted_parameters)
             if ret[constants.STATUS_CODE_KEY] == 200:
@@ -76,11 +86,22 @@ def _rest_wrapper(method, command, parameters):
     return wrapper
 
 
-@rest_call("/list_images/", 'POST', constants.LIST_IMAGES_COMMAND, [])
+@rest_call("/list_images/", 'POST', constants.LIST_IMAGES_COMMAND, [],
+           [constants.LIMIT_PARAMETER, constants.AFTER_PARAMETER])
 def list_images():
     pass
 
 
+@rest_call("/list_all_images/", 'POST', constants.LIST_ALL_IMAGES_COMMAND, [],
+           [constants.FILTER_PROJECT_PARAMETER,
+            constants.FILTER_NAME_PARAMETER,
+            constants.FILTER_CEPH_PARAMETER, constants.SNAPSHOTS_PARAMETER,
+            constants.CLONES_PARAMETER, constants.PUBLIC_PARAMETER,
+            constants.LIMIT_PARAMETER, constants.AFTER_PARAMETER])
+def list_all_images():
+    pass
+
+
 @rest_call("/provision/", 'PUT', constants.PROVISION_COMMAND,
            [constants.NODE_NAME_PARAMETER, constants.DISK_NAME_PARAMETER,
             constants.NIC_PARAMETER])
@@ -94,13 +115,26 @@ def deprovision():
     pass
 
 
+@rest_call("/provision_batch/", 'PUT', constants.PROVISION_MANY_COMMAND,
+           [constants.NODES_PARAMETER])
+def provision_batch():
+    pass
+
+
+@rest_call("/deprovision_batch/", 'DELETE',
+           constants.DEPROVISION_MANY_COMMAND, [constants.NODES_PARAMETER])
+def deprovision_batch():
+    pass
+
+
 @rest_call("/create_snapshot/", "PUT", constants.CREATE_SNAPSHOT_COMMAND,
            [constants.DISK_NAME_PARAMETER, constants.SNAP_NAME_PARAMETER])
 def create_snapshot():
     pass
 
 
-@rest_call("/list_snapshots/", "POST", constants.LIST_SNAPSHOTS_COMMAND, [])
+@rest_call("/list_snapshots/", "POST", constants.LIST_SNAPSHOTS_COMMAND, [],
+           [constants.LIMIT_PARAMETER, constants.AFTER_PARAMETER])
 def list_snapshots():
     pass
 
@@ -117,7 +151,72 @@ def create_disk():
     pass
 
 
+@rest_call("/create_disks/", "PUT", constants.CREATE_DISKS_COMMAND,
+           [constants.IMAGE_NAME_PARAMETER, constants.DISK_NAMES_PARAMETER])
+def create_disks():
+    pass
+
+
 @rest_call("/delete_disk", "DELETE", constants.DELETE_DISK_COMMAND,
            [constants.DISK_NAME_PARAMETER])
 def delete_disk():
     pass
+
+
+# Exported through einstein so that the targets and tids it keeps track of
+# include the ones added from the CLI
+@rest_call("/mount_image/", "PUT", constants.MOUNT_IMAGE_COMMAND,
+           [constants.IMAGE_NAME_PARAMETER])
+def mount_image():
+    pass
+
+
+@rest_call("/umount_image/", "DELETE", constants.UMOUNT_IMAGE_COMMAND,
+           [constants.IMAGE_NAME_PARAMETER])
+def umount_image():
+    pass
+
+
+@rest_call("/metrics/", "POST", constants.SHOW_METRICS_COMMAND, [])
+def show_metrics():
+    pass
+
+
+@rest_call("/warm_pool/", "PUT", constants.SET_WARM_POOL_COMMAND,
+           [constants.IMAGE_NAME_PARAMETER, constants.LOW_PARAMETER,
+            constants.HIGH_PARAMETER])
+def set_warm_pool():
+    pass
+
+
+@rest_call("/warm_pool/", "POST", constants.SHOW_WARM_POOL_COMMAND, [])
+def show_warm_pool():
+    pass
+
+
+@rest_call("/flattens/", "POST", constants.SHOW_FLATTENS_COMMAND, [])
+def show_flattens():
+    pass
+
+
+@rest_call("/jobs/", "PUT", constants.SUBMIT_JOB_COMMAND,
+           [constants.COMMAND_PARAMETER, constants.ARGS_PARAMETER])
+def submit_job():
+    pass
+
+
+@rest_call("/jobs/", "POST", constants.LIST_JOBS_COMMAND, [])
+def list_jobs():
+    pass
+
+
+@rest_call("/jobs/<job_id>", "POST", constants.SHOW_JOB_COMMAND,
+           [constants.JOB_ID_PARAMETER])
+def show_job():
+    pass
+
+
+@rest_call("/jobs/<job_id>", "DELETE", constants.CANCEL_JOB_COMMAND,
+           [constants.JOB_ID_PARAMETER])
+def cancel_job():
+    pass
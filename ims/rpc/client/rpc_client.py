@@ -15,13 +15,27 @@ class RPCClient:
         self.dict = {
             "function-list": {
                 "create_disk": "2",
+                "create_disks": "2",
                 "delete_disk": "1",
+                "mount_image": "1",
+                "umount_image": "1",
                 "provision": "3",
                 "deprovision": "2",
                 "create_snapshot": "2",
-                "list_images": "0",
-                "list_snapshots": "0",
-                "remove_image": "1"
+                "list_images": "2",
+                "list_all_images": "8",
+                "list_snapshots": "2",
+                "remove_image": "1",
+                "show_metrics": "0",
+                "provision_many": "1",
+                "deprovision_many": "1",
+                "set_warm_pool": "3",
+                "show_warm_pool": "0",
+                "show_flattens": "0",
+                "submit_job": "2",
+                "list_jobs": "0",
+                "show_job": "1",
+                "cancel_job": "1"
             }
         }
         # The script name and no. of arguments.
@@ -2,6 +2,7 @@ import Pyro4
 
 import ims.common.config as config
 import ims.common.constants as constants
+import ims.einstein.context as context
 from ims.common.log import create_logger, log
 from ims.einstein.operations import BMI
 from ims.exception.exception import BMIException
@@ -51,6 +52,9 @@ class MainServer:
 @log
 def start_rpc_server():
     cfg = config.get()
+    # Connect to ceph, create the drivers and start the background threads
+    # once, before serving requests, so that no request pays for it
+    context.start()
     if cfg.bmi.service:
         server = MainServer()
         server.remake_mappings()
@@ -66,4 +70,7 @@ def start_rpc_server():
     # register the object with a name in the name server
     ns.register(constants.RPC_SERVER_NAME, uri)
     # start the event loop of the server to wait for calls
-    daemon.requestLoop()
+    try:
+        daemon.requestLoop()
+    finally:
+        context.close()
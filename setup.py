@@ -3,14 +3,16 @@ from setuptools import setup, find_packages
 setup(
     name='ims',
     version='0.3',
-    install_requires=["pyro4==4.41", "requests", "flask", "sqlalchemy>=1.0.13",
+    install_requires=["pyro4==4.41", "requests", "flask", "sqlalchemy>=1.2",
                       "click", "prettytable", "sh"],
+    extras_require={'postgres': ["psycopg2"]},
     packages=find_packages(),
     scripts=['scripts/einstein_server', 'scripts/picasso_server'],
     include_package_data=True,
     package_data={'ims': ['*.temp']},
     entry_points={
         'console_scripts': [
-            'bmi = ims.cli.cli:cli'
+            'bmi = ims.cli.cli:cli',
+            'bmi-rbd-helper = ims.einstein.rbd_helper:main'
         ]
     })
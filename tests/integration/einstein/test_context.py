@@ -0,0 +1,65 @@
+# Tests the process wide service context in einstein/context.py
+
+import threading
+import unittest
+
+import ims.common.config as config
+config.load()
+
+import ims.common.metrics as metrics
+import ims.einstein.context as context
+from ims.common.log import trace
+
+
+class TestIoctxReuse(unittest.TestCase):
+    """
+    Acquires and releases RBD instances several times and checks that the
+    cluster is connected once and the ioctx is reused
+    """
+
+    @trace
+    def setUp(self):
+        context.close()
+        metrics.reset()
+        self.ctx = context.start()
+
+    def runTest(self):
+        for i in range(5):
+            fs = self.ctx.acquire_fs()
+            fs.list_images()
+            self.ctx.release_fs(fs)
+
+        self.assertIs(context.get(), self.ctx)
+        self.assertEqual(metrics.get('ceph.cluster_connects'), 1)
+        self.assertEqual(metrics.get('ceph.ioctx_opened'), 1)
+        self.assertEqual(metrics.get('ceph.ioctx_reused'), 4)
+
+    def tearDown(self):
+        context.close()
+
+
+class TestCliContext(unittest.TestCase):
+    """
+    Tests that the context made by BMI outside of einstein (like in the CLI)
+    does not start the background threads of einstein
+    """
+
+    @trace
+    def setUp(self):
+        context.close()
+
+    def runTest(self):
+        threads = threading.active_count()
+        ctx = context.ServiceContext()
+        try:
+            self.assertIsNone(context.get())
+            self.assertIsNone(ctx.reconciler)
+            self.assertIsNone(ctx.jobs)
+            self.assertIsNone(ctx.flattener)
+            self.assertIsNone(ctx.mapper)
+            fs = ctx.acquire_fs()
+            fs.list_images()
+            ctx.release_fs(fs)
+            self.assertEqual(threading.active_count(), threads)
+        finally:
+            ctx.shutdown()
@@ -9,6 +9,7 @@ config.load()
 
 import ims.common.constants as constants
 import ims.einstein.ceph as ceph
+import ims.einstein.context as context
 from ims.common.log import trace
 from ims.database.database import Database
 from ims.einstein.operations import BMI
@@ -73,6 +74,120 @@ class TestProvisionDeprovision(TestCase):
         time.sleep(constants.HIL_CALL_TIMEOUT)
 
 
+class TestProvisionManyDeprovisionMany(TestCase):
+    """
+    Creates a disk, provisions a node from it using the batch call and then
+    deprovisions it using the batch call. A missing node must only fail its
+    own entry.
+    """
+    @trace
+    def setUp(self):
+        self.db = Database()
+        self.db.project.insert(PROJECT)
+
+        self.good_bmi = BMI(CORRECT_HIL_USERNAME, CORRECT_HIL_PASSWORD,
+                            PROJECT)
+        self.good_bmi.import_ceph_image(EXIST_IMG_NAME)
+        self.good_bmi.create_disk(NEW_DISK, EXIST_IMG_NAME)
+
+    def runTest(self):
+        response = self.good_bmi.provision_many(
+            [[NODE_NAME, NEW_DISK, NIC],
+             [NOT_EXIST_IMG_NAME, NEW_DISK, NIC]])
+        self.assertEqual(response[constants.STATUS_CODE_KEY], 200)
+        results = response[constants.RETURN_VALUE_KEY]
+        self.assertEqual(results[NODE_NAME][constants.STATUS_CODE_KEY], 200)
+        self.assertNotEqual(
+            results[NOT_EXIST_IMG_NAME][constants.STATUS_CODE_KEY], 200)
+
+        response = self.good_bmi.deprovision_many('[["{0}", "{1}"]]'.format(
+            NODE_NAME, NIC))
+        self.assertEqual(response[constants.STATUS_CODE_KEY], 200)
+        results = response[constants.RETURN_VALUE_KEY]
+        self.assertEqual(results[NODE_NAME][constants.STATUS_CODE_KEY], 200)
+
+        response = self.good_bmi.provision_many([[NODE_NAME, NEW_DISK]])
+        self.assertEqual(response[constants.STATUS_CODE_KEY], 400)
+
+    def tearDown(self):
+        self.good_bmi.delete_disk(NEW_DISK)
+        self.good_bmi.remove_image(EXIST_IMG_NAME)
+        self.db.project.delete_with_name(PROJECT)
+        self.db.close()
+        self.good_bmi.shutdown()
+        time.sleep(constants.HIL_CALL_TIMEOUT)
+
+
+class TestCreateDisks(TestCase):
+    """
+    Imports an image and creates several disks from it in one call
+    """
+    @trace
+    def setUp(self):
+        self.db = Database()
+        self.db.project.insert(PROJECT)
+
+        self.good_bmi = BMI(CORRECT_HIL_USERNAME, CORRECT_HIL_PASSWORD,
+                            PROJECT)
+        self.good_bmi.import_ceph_image(EXIST_IMG_NAME)
+        self.disks = [NEW_DISK + str(i) for i in range(3)]
+
+    def runTest(self):
+        response = self.good_bmi.create_disks(EXIST_IMG_NAME, self.disks)
+        self.assertEqual(response[constants.STATUS_CODE_KEY], 200)
+        results = response[constants.RETURN_VALUE_KEY]
+        for disk in self.disks:
+            self.assertEqual(results[disk][constants.STATUS_CODE_KEY], 200)
+
+        # Creating them again must fail for every disk
+        response = self.good_bmi.create_disks(EXIST_IMG_NAME, self.disks)
+        results = response[constants.RETURN_VALUE_KEY]
+        for disk in self.disks:
+            self.assertEqual(results[disk][constants.STATUS_CODE_KEY], 409)
+
+    def tearDown(self):
+        for disk in self.disks:
+            self.good_bmi.delete_disk(disk)
+        self.good_bmi.remove_image(EXIST_IMG_NAME)
+        self.db.project.delete_with_name(PROJECT)
+        self.db.close()
+        self.good_bmi.shutdown()
+
+
+class TestShowMounted(TestCase):
+    """
+    Creates disks and checks that their targets are shown
+    """
+    @trace
+    def setUp(self):
+        self.db = Database()
+        self.db.project.insert(PROJECT)
+
+        self.good_bmi = BMI(CORRECT_HIL_USERNAME, CORRECT_HIL_PASSWORD,
+                            PROJECT)
+        self.good_bmi.import_ceph_image(EXIST_IMG_NAME)
+        self.disks = [NEW_DISK + str(i) for i in range(3)]
+        self.good_bmi.create_disks(EXIST_IMG_NAME, self.disks)
+
+    def runTest(self):
+        response = self.good_bmi.show_mounted()
+        self.assertEqual(response[constants.STATUS_CODE_KEY], 200)
+        mappings = response[constants.RETURN_VALUE_KEY]
+        for disk in self.disks:
+            img_id = self.db.image.fetch_id_with_name_from_project(disk,
+                                                                   PROJECT)
+            self.assertEqual(mappings[disk], "{0}/{1}img{2}".format(
+                _cfg.fs.pool, _cfg.bmi.uid, img_id))
+
+    def tearDown(self):
+        for disk in self.disks:
+            self.good_bmi.delete_disk(disk)
+        self.good_bmi.remove_image(EXIST_IMG_NAME)
+        self.db.project.delete_with_name(PROJECT)
+        self.db.close()
+        self.good_bmi.shutdown()
+
+
 class TestCreateSnapshot(TestCase):
     """
     Provisions an imported image and creates snapshot
@@ -189,6 +304,35 @@ class TestListImages(TestCase):
         self.good_bmi.shutdown()
 
 
+class TestListAllImages(TestCase):
+    """
+    Imports an image and checks its ceph name in the admin listing
+    """
+    @trace
+    def setUp(self):
+        self.db = Database()
+        self.db.project.insert(PROJECT)
+
+        self.good_bmi = BMI(CORRECT_HIL_USERNAME, CORRECT_HIL_PASSWORD,
+                            PROJECT)
+        self.good_bmi.import_ceph_image(EXIST_IMG_NAME)
+
+    def runTest(self):
+        response = self.good_bmi.list_all_images()
+        self.assertEqual(response[constants.STATUS_CODE_KEY], 200)
+        img_id = self.db.image.fetch_id_with_name_from_project(EXIST_IMG_NAME,
+                                                               PROJECT)
+        self.assertIn([img_id, EXIST_IMG_NAME, PROJECT,
+                       str(_cfg.bmi.uid) + "img" + str(img_id), False, False,
+                       ''], response[constants.RETURN_VALUE_KEY])
+
+    def tearDown(self):
+        self.good_bmi.remove_image(EXIST_IMG_NAME)
+        self.db.project.delete_with_name(PROJECT)
+        self.db.close()
+        self.good_bmi.shutdown()
+
+
 class TestRemoveImage(TestCase):
     """
     Imports an image and calls remove image
@@ -247,3 +391,211 @@ class TestCopyImage(TestCase):
         self.db.project.delete_with_name(PROJECT)
         self.db.close()
         self.good_bmi.shutdown()
+
+
+class TestImportCephImages(TestCase):
+    """
+    Imports an image in bulk, then resumes an import that was interrupted
+    after its db row was inserted
+    """
+    @trace
+    def setUp(self):
+        self.db = Database()
+        self.db.project.insert(PROJECT)
+        self.good_bmi = BMI(CORRECT_HIL_USERNAME, CORRECT_HIL_PASSWORD,
+                            PROJECT)
+
+    def runTest(self):
+        response = self.good_bmi.import_ceph_images(
+            [EXIST_IMG_NAME, NOT_EXIST_IMG_NAME])
+        self.assertEqual(response[constants.STATUS_CODE_KEY], 200)
+        results = response[constants.RETURN_VALUE_KEY]
+        self.assertEqual(results[EXIST_IMG_NAME][constants.RETURN_VALUE_KEY],
+                         constants.IMPORT_DONE)
+        failed = results[NOT_EXIST_IMG_NAME]
+        self.assertEqual(failed[constants.STATUS_CODE_KEY], 404)
+
+        # The image that failed is left in the db and is redone, the one
+        # that was imported is skipped
+        response = self.good_bmi.import_ceph_images([EXIST_IMG_NAME])
+        results = response[constants.RETURN_VALUE_KEY]
+        self.assertEqual(results[EXIST_IMG_NAME][constants.RETURN_VALUE_KEY],
+                         constants.IMPORT_SKIPPED)
+
+        with ceph.RBD(_cfg.fs, _cfg.iscsi.password) as fs:
+            ceph_name = self.good_bmi.get_ceph_image_name_from_project(
+                EXIST_IMG_NAME, PROJECT)
+            self.assertTrue(fs.is_snap_protected(ceph_name,
+                                                 _cfg.bmi.snapshot))
+            # The snapshot of the source was released
+            self.assertNotIn(_cfg.bmi.snapshot,
+                             fs.list_snapshots(EXIST_IMG_NAME))
+
+        response = self.good_bmi.import_ceph_images(
+            [EXIST_IMG_NAME, EXIST_IMG_NAME])
+        self.assertEqual(response[constants.STATUS_CODE_KEY], 400)
+
+    def tearDown(self):
+        self.good_bmi.remove_image(EXIST_IMG_NAME)
+        self.db.project.delete_with_name(PROJECT)
+        self.db.close()
+        self.good_bmi.shutdown()
+
+
+class TestJobs(TestCase):
+    """
+    Imports an image in the background and follows the job till it is done
+    """
+    @trace
+    def setUp(self):
+        # Jobs only run in the context of einstein
+        context.start()
+        self.db = Database()
+        self.db.project.insert(PROJECT)
+        self.good_bmi = BMI(CORRECT_HIL_USERNAME, CORRECT_HIL_PASSWORD,
+                            PROJECT)
+
+    def runTest(self):
+        response = self.good_bmi.submit_job(
+            constants.IMPORT_CEPH_IMAGE_COMMAND, [EXIST_IMG_NAME])
+        self.assertEqual(response[constants.STATUS_CODE_KEY], 200)
+        job_id = response[constants.RETURN_VALUE_KEY]
+
+        job = None
+        for _ in range(300):
+            job = self.good_bmi.show_job(job_id)[constants.RETURN_VALUE_KEY]
+            if job[constants.JOB_STATE_KEY] not in [constants.JOB_QUEUED,
+                                                    constants.JOB_RUNNING]:
+                break
+            time.sleep(1)
+        self.assertEqual(job[constants.JOB_STATE_KEY],
+                         constants.JOB_SUCCEEDED)
+        images = self.good_bmi.list_images()[constants.RETURN_VALUE_KEY]
+        self.assertEqual(images, [EXIST_IMG_NAME])
+
+        response = self.good_bmi.cancel_job(job_id)
+        self.assertEqual(response[constants.STATUS_CODE_KEY], 409)
+        response = self.good_bmi.submit_job(
+            constants.IMPORT_CEPH_IMAGE_COMMAND, [])
+        self.assertEqual(response[constants.STATUS_CODE_KEY], 400)
+
+    def tearDown(self):
+        self.good_bmi.remove_image(EXIST_IMG_NAME)
+        self.db.project.delete_with_name(PROJECT)
+        self.db.close()
+        self.good_bmi.shutdown()
+        context.close()
+
+
+class TestWarmPool(TestCase):
+    """
+    Keeps standby disks of an image and creates a disk from one of them
+    """
+    @trace
+    def setUp(self):
+        # Standby disks are only cloned in the context of einstein
+        context.start()
+        self.db = Database()
+        self.db.project.insert(PROJECT)
+        self.good_bmi = BMI(CORRECT_HIL_USERNAME, CORRECT_HIL_PASSWORD,
+                            PROJECT)
+        self.good_bmi.import_ceph_image(EXIST_IMG_NAME)
+
+    def runTest(self):
+        response = self.good_bmi.set_warm_pool(EXIST_IMG_NAME, 1, 2)
+        self.assertEqual(response[constants.STATUS_CODE_KEY], 200)
+
+        rows = []
+        for _ in range(60):
+            rows = self.good_bmi.show_warm_pool()[constants.RETURN_VALUE_KEY]
+            if rows and rows[0][3] == 2:
+                break
+            time.sleep(1)
+        self.assertEqual(rows, [[EXIST_IMG_NAME, 1, 2, 2]])
+
+        response = self.good_bmi.create_disk(NEW_DISK, EXIST_IMG_NAME)
+        self.assertEqual(response[constants.STATUS_CODE_KEY], 200)
+        self.assertEqual(response[constants.RETURN_VALUE_KEY],
+                         self.good_bmi.get_ceph_image_name_from_project(
+                             NEW_DISK, PROJECT))
+        self.assertEqual(self.db.image.fetch_clones_from_project(PROJECT),
+                         [[NEW_DISK, EXIST_IMG_NAME]])
+
+    def tearDown(self):
+        self.good_bmi.delete_disk(NEW_DISK)
+        self.good_bmi.remove_image(EXIST_IMG_NAME)
+        self.db.project.delete_with_name(PROJECT)
+        self.db.close()
+        self.good_bmi.shutdown()
+        context.close()
+
+
+class TestRemoveWarmImage(TestCase):
+    """
+    Tests that an image with a disk keeps its warm pool when removing it fails
+    """
+    @trace
+    def setUp(self):
+        context.start()
+        self.db = Database()
+        self.db.project.insert(PROJECT)
+        self.good_bmi = BMI(CORRECT_HIL_USERNAME, CORRECT_HIL_PASSWORD,
+                            PROJECT)
+        self.good_bmi.import_ceph_image(EXIST_IMG_NAME)
+        self.good_bmi.create_disk(NEW_DISK, EXIST_IMG_NAME)
+        self.good_bmi.set_warm_pool(EXIST_IMG_NAME, 1, 1)
+
+    def runTest(self):
+        response = self.good_bmi.remove_image(EXIST_IMG_NAME)
+        self.assertNotEqual(response[constants.STATUS_CODE_KEY], 200)
+        rows = self.good_bmi.show_warm_pool()[constants.RETURN_VALUE_KEY]
+        self.assertEqual([row[:3] for row in rows],
+                         [[EXIST_IMG_NAME, 1, 1]])
+        self.assertEqual(len(self.db.warm_pool.fetch_all()), 1)
+
+    def tearDown(self):
+        self.good_bmi.delete_disk(NEW_DISK)
+        self.good_bmi.remove_image(EXIST_IMG_NAME)
+        self.db.project.delete_with_name(PROJECT)
+        self.db.close()
+        self.good_bmi.shutdown()
+        context.close()
+
+
+class TestStandbyNames(TestCase):
+    """
+    Tests that no call creates an image with the name of a standby disk
+    """
+    @trace
+    def setUp(self):
+        self.db = Database()
+        self.db.project.insert(PROJECT)
+        self.good_bmi = BMI(CORRECT_HIL_USERNAME, CORRECT_HIL_PASSWORD,
+                            PROJECT)
+        self.good_bmi.import_ceph_image(EXIST_IMG_NAME)
+        self.good_bmi.create_disk(NEW_DISK, EXIST_IMG_NAME)
+
+    def runTest(self):
+        name = constants.STANDBY_DISK_PREFIX + 'x'
+        calls = [
+            lambda: self.good_bmi.create_disk(name, EXIST_IMG_NAME),
+            lambda: self.good_bmi.create_disks(EXIST_IMG_NAME, [name]),
+            lambda: self.good_bmi.create_snapshot(NEW_DISK, name),
+            lambda: self.good_bmi.import_ceph_image(name),
+            lambda: self.good_bmi.import_ceph_snapshot(name, 'snap', False),
+            lambda: self.good_bmi.import_ceph_images([name], False),
+            lambda: self.good_bmi.add_image(PROJECT, name, None, False, None,
+                                            False),
+            lambda: self.good_bmi.copy_image(EXIST_IMG_NAME, PROJECT, name),
+            lambda: self.good_bmi.move_image(EXIST_IMG_NAME, PROJECT, name)]
+        for call in calls:
+            self.assertEqual(call()[constants.STATUS_CODE_KEY], 400)
+        self.assertEqual(sorted(self.db.image.fetch_names_from_project(
+            PROJECT)), sorted([EXIST_IMG_NAME, NEW_DISK]))
+
+    def tearDown(self):
+        self.good_bmi.delete_disk(NEW_DISK)
+        self.good_bmi.remove_image(EXIST_IMG_NAME)
+        self.db.project.delete_with_name(PROJECT)
+        self.db.close()
+        self.good_bmi.shutdown()
@@ -1,3 +1,4 @@
+import threading
 import time
 import unittest
 import subprocess
@@ -9,6 +10,7 @@ import rados
 import rbd
 from ims.common import shell
 from ims.common import constants
+from ims.common import metrics
 from ims.einstein import ceph
 from ims.einstein.operations import BMI
 from ims.exception import file_system_exceptions
@@ -184,3 +186,85 @@ class TestClone(unittest.TestCase):
         self.fs.snap_unprotect(CEPH_IMG, CEPH_SNAP_IMG)
         self.fs.remove_snapshot(CEPH_IMG, CEPH_SNAP_IMG)
         self.fs.remove(CEPH_IMG)
+
+
+class TestImageCache(unittest.TestCase):
+    """ Test that the steps of an operation open the image once """
+    @trace
+    def setUp(self):
+        self.fs = ceph.RBD(_cfg.fs, _cfg.iscsi.password)
+        self.fs.create_image(CEPH_IMG, CEPH_IMG_SIZE)
+        metrics.reset()
+
+    def runTest(self):
+        self.fs.snap_image(CEPH_IMG, CEPH_SNAP_IMG)
+        self.fs.snap_protect(CEPH_IMG, CEPH_SNAP_IMG)
+        self.assertTrue(self.fs.is_snap_protected(CEPH_IMG, CEPH_SNAP_IMG))
+        self.fs.snap_unprotect(CEPH_IMG, CEPH_SNAP_IMG)
+        self.fs.remove_snapshot(CEPH_IMG, CEPH_SNAP_IMG)
+        self.assertEqual(metrics.get('ceph.image_opened'), 1)
+        self.assertTrue(metrics.get('ceph.image_reused') > 0)
+        # The cached handle must not keep the image busy
+        self.fs.remove(CEPH_IMG)
+        self.assertNotIn(CEPH_IMG, self.fs.list_images())
+
+    def tearDown(self):
+        if CEPH_IMG in self.fs.list_images():
+            self.fs.remove(CEPH_IMG)
+        self.fs.tear_down()
+
+
+class TestSharedImageHandle(unittest.TestCase):
+    """ Test that a cached handle in use does not block other calls """
+    @trace
+    def setUp(self):
+        self.fs = ceph.RBD(_cfg.fs, _cfg.iscsi.password)
+        self.fs.create_image(CEPH_IMG, CEPH_IMG_SIZE)
+
+    def runTest(self):
+        results = []
+        # Holds the cached handle like a long call on another thread would
+        with self.fs._RBD__open_image(CEPH_IMG):
+            thread = threading.Thread(target=lambda: results.append(
+                self.fs.list_snapshots(CEPH_IMG)))
+            thread.start()
+            thread.join(30)
+            self.assertFalse(thread.is_alive())
+        self.assertEqual(results, [[]])
+
+    def tearDown(self):
+        self.fs.remove(CEPH_IMG)
+        self.fs.tear_down()
+
+
+class TestCompoundSnapshot(unittest.TestCase):
+    """ Test the compound snapshot operations used by the pipelines """
+    @trace
+    def setUp(self):
+        self.fs = ceph.RBD(_cfg.fs, _cfg.iscsi.password)
+        self.fs.create_image(CEPH_IMG, CEPH_IMG_SIZE)
+        metrics.reset()
+
+    def runTest(self):
+        self.fs.snap_and_protect(CEPH_IMG, CEPH_SNAP_IMG)
+        self.assertRaises(file_system_exceptions.ImageExistsException,
+                          self.fs.snap_and_protect, CEPH_IMG, CEPH_SNAP_IMG)
+        self.fs.clone_flatten_and_seal(CEPH_IMG, CEPH_SNAP_IMG,
+                                       CEPH_CHILD_IMG, CEPH_SNAP_IMG)
+        # The flattened clone no longer depends on the parent
+        self.assertEqual(self.fs.list_children(CEPH_IMG, CEPH_SNAP_IMG), [])
+        self.assertTrue(self.fs.is_snap_protected(CEPH_CHILD_IMG,
+                                                  CEPH_SNAP_IMG))
+        self.fs.release_snapshot(CEPH_IMG, CEPH_SNAP_IMG)
+        self.assertEqual(self.fs.list_snapshots(CEPH_IMG), [])
+        self.assertRaises(file_system_exceptions.ImageNotFoundException,
+                          self.fs.release_snapshot, CEPH_IMG, CEPH_SNAP_IMG)
+        # The parent is opened once and the clone once to flatten it and
+        # once to seal it
+        self.assertEqual(metrics.get('ceph.image_opened'), 3)
+
+    def tearDown(self):
+        self.fs.release_snapshot(CEPH_CHILD_IMG, CEPH_SNAP_IMG)
+        self.fs.remove(CEPH_CHILD_IMG)
+        self.fs.remove(CEPH_IMG)
+        self.fs.tear_down()
@@ -0,0 +1,75 @@
+# Measures the latency of the snapshot pipeline run by import_ceph_image and
+# create_snapshot, made of separate RBD calls and made of the compound
+# snapshot operations. Needs the ceph cluster of the config.
+# Run with pytest -s to see the numbers
+
+import time
+import unittest
+
+from ims.common import config
+
+config.load()
+import ims.common.metrics as metrics
+from ims.einstein import ceph
+
+_cfg = config.get()
+
+IMG = "BMI_STRESS_PIPELINE"
+CLONE = "BMI_STRESS_PIPELINE_CLONE"
+SNAP = "BMI_STRESS_PIPELINE_SNAP"
+SIZE = 1024 * 1024
+RUNS = 10
+
+
+def separate_calls(fs):
+    fs.snap_image(IMG, SNAP)
+    fs.snap_protect(IMG, SNAP)
+    fs.clone(IMG, SNAP, CLONE)
+    fs.flatten(CLONE)
+    fs.snap_image(CLONE, SNAP)
+    fs.snap_protect(CLONE, SNAP)
+    fs.snap_unprotect(IMG, SNAP)
+    fs.remove_snapshot(IMG, SNAP)
+
+
+def compound_calls(fs):
+    fs.snap_and_protect(IMG, SNAP)
+    fs.clone_flatten_and_seal(IMG, SNAP, CLONE, SNAP)
+    fs.release_snapshot(IMG, SNAP)
+
+
+def measure(fs, pipeline):
+    latencies = []
+    opened = 0
+    for _ in range(RUNS):
+        metrics.reset()
+        start = time.time()
+        pipeline(fs)
+        latencies.append(time.time() - start)
+        opened += metrics.get('ceph.image_opened') or 0
+        fs.release_snapshot(CLONE, SNAP)
+        fs.remove(CLONE)
+    return sorted(latencies)[RUNS // 2] * 1e3, float(opened) / RUNS
+
+
+class TestPipelineLatency(unittest.TestCase):
+    """ Compares the pipeline made of separate and compound calls """
+
+    def setUp(self):
+        self.fs = ceph.RBD(_cfg.fs, _cfg.iscsi.password)
+        self.fs.create_image(IMG, SIZE)
+
+    def runTest(self):
+        separate = measure(self.fs, separate_calls)
+        compound = measure(self.fs, compound_calls)
+        for name, (msec, opened) in [('separate', separate),
+                                     ('compound', compound)]:
+            print("{0:>8}: {1:.1f} msec {2:.1f} opens/pipeline".format(
+                name, msec, opened))
+        # The handle cache already saves most opens of the separate calls,
+        # the compound calls save the snapshot listings
+        self.assertTrue(compound[1] <= separate[1])
+
+    def tearDown(self):
+        self.fs.remove(IMG)
+        self.fs.tear_down()
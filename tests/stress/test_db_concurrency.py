@@ -0,0 +1,124 @@
+# Measures the latency of image listings while other threads provision
+# images, with the rollback journal that SQLite uses by default and with the
+# WAL journal and read-only connections that BMI configures. Readers wait for
+# every commit with the rollback journal but not with WAL.
+# Run with pytest -s to see the numbers
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from ims.common import config
+
+config.load()
+from sqlalchemy.orm import sessionmaker
+
+import ims.common.constants as constants
+from ims.common.config import ConfigSection
+from ims.database.db_connection import DatabaseConnection, create_db_engine
+from ims.database.image import ImageRepository
+from ims.database.project import Project
+
+IMAGES = 1000
+WRITERS = 4
+READS = 300
+
+
+class _Connection:
+    """ Gives the repositories a session on the benchmark db """
+
+    def __init__(self, engine):
+        self.session = sessionmaker(bind=engine)()
+        self.name_cache = DatabaseConnection.name_cache
+
+    def write(self, mutation):
+        try:
+            mutation(self.session)
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+
+
+def db_cfg(path, journal_mode, synchronous):
+    cfg = ConfigSection()
+    cfg.url = constants.SQLITE_URL_PREFIX + path
+    cfg.journal_mode = journal_mode
+    cfg.synchronous = synchronous
+    cfg.busy_timeout = 30
+    return cfg
+
+
+def populate(engine):
+    DatabaseConnection.Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(Project.__table__.insert(), [{'id': 1, 'name': 'p'}])
+        conn.execute(Project.__table__.insert(), [{'id': 2, 'name': 'w'}])
+    ImageRepository(_Connection(engine)).insert_many(
+        ['image %d' % i for i in range(IMAGES)], 1)
+
+
+def write(engine, index, stop):
+    connection = _Connection(engine)
+    repository = ImageRepository(connection)
+    count = 0
+    while not stop.is_set():
+        repository.insert('writer %d image %d' % (index, count), 2)
+        count += 1
+    connection.session.close()
+
+
+def read_latencies(read_engine):
+    connection = _Connection(read_engine)
+    repository = ImageRepository(connection)
+    latencies = []
+    for _ in range(READS):
+        start = time.time()
+        repository.fetch_images_from_project('p', 100)
+        connection.session.rollback()
+        latencies.append(time.time() - start)
+    connection.session.close()
+    return sorted(latencies)
+
+
+def measure(cfg, read_only):
+    engine = create_db_engine(cfg)
+    populate(engine)
+    read_engine = create_db_engine(cfg, read_only=read_only)
+    stop = threading.Event()
+    writers = [threading.Thread(target=write, args=(engine, index, stop))
+               for index in range(WRITERS)]
+    for writer in writers:
+        writer.start()
+    try:
+        latencies = read_latencies(read_engine)
+    finally:
+        stop.set()
+        for writer in writers:
+            writer.join()
+        read_engine.dispose()
+        engine.dispose()
+    return [latencies[len(latencies) * p // 100] * 1e3 for p in (50, 99)]
+
+
+class TestReaderLatency(unittest.TestCase):
+    """ Compares listing latency under writes for both journals """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def runTest(self):
+        rollback = measure(db_cfg(os.path.join(self.dir, 'rollback.db'),
+                                  'DELETE', 'FULL'), False)
+        wal = measure(db_cfg(os.path.join(self.dir, 'wal.db'),
+                             'WAL', 'NORMAL'), True)
+        for name, (p50, p99) in [('rollback', rollback), ('wal', wal)]:
+            print("{0:>8}: p50 {1:.2f} msec p99 {2:.2f} msec".format(
+                name, p50, p99))
+        self.assertTrue(wal[1] < rollback[1])
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
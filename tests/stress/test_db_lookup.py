@@ -0,0 +1,83 @@
+# Measures the latency of image lookups by project and name as the image
+# table grows. The lookups go through indexes so it should stay flat.
+# Run with pytest -s to see the numbers
+
+import os
+import shutil
+import tempfile
+import timeit
+import unittest
+
+from ims.common import config
+
+config.load()
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from ims.database.db_connection import DatabaseConnection
+from ims.database.image import Image, ImageRepository
+from ims.database.project import Project
+
+SIZES = [1000, 10000, 100000, 1000000]
+PROJECTS = 100
+LOOKUPS = 1000
+BATCH = 10000
+
+
+class _Connection:
+    """ Gives the repository a session on the benchmark db """
+
+    def __init__(self, engine):
+        self.session = sessionmaker(bind=engine)()
+
+
+def populate(engine, size):
+    DatabaseConnection.Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(Project.__table__.insert(),
+                     [{'id': i + 1, 'name': 'project %d' % i} for i in
+                      range(PROJECTS)])
+    for start in range(0, size, BATCH):
+        rows = []
+        for i in range(start, min(size, start + BATCH)):
+            # Every tenth image is a snapshot of the one before it
+            snapshot = i % 10 == 9
+            rows.append({'id': i + 1, 'name': 'image %d' % i,
+                         'project_id': i % PROJECTS + 1,
+                         'is_public': False, 'is_snapshot': snapshot,
+                         'parent_id': i if snapshot else None})
+        with engine.begin() as conn:
+            conn.execute(Image.__table__.insert(), rows)
+
+
+def per_lookup(repository, size):
+    names = [(i * 7919) % size for i in range(LOOKUPS)]
+    timer = timeit.Timer(lambda: [repository.fetch_id_with_name_from_project(
+        'image %d' % i, 'project %d' % (i % PROJECTS)) for i in names])
+    return min(timer.repeat(3, 1)) / LOOKUPS * 1e6
+
+
+class TestLookupLatency(unittest.TestCase):
+    """ Compares lookups on image tables of increasing size """
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def runTest(self):
+        results = []
+        for size in SIZES:
+            engine = create_engine('sqlite:///' + os.path.join(
+                self.dir, '%d.db' % size))
+            populate(engine, size)
+            connection = _Connection(engine)
+            results.append((size, per_lookup(ImageRepository(connection),
+                                             size)))
+            connection.session.close()
+            engine.dispose()
+        for size, usec in results:
+            print("{0:>8} images: {1:.1f} usec/lookup".format(size, usec))
+        # A scan would be about a thousand times slower on the largest table
+        self.assertTrue(results[-1][1] < results[0][1] * 5)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
@@ -0,0 +1,56 @@
+# Measures the overhead the logging decorators add to every call
+# Run with pytest -s to see the numbers
+
+import logging
+import timeit
+import unittest
+
+from ims.common import config
+
+config.load()
+from ims.common.log import create_logger, log, trace
+
+logger = create_logger(__name__)
+
+CALLS = 100000
+
+
+def plain(a, b):
+    return a
+
+
+@log
+def logged(a, b):
+    return a
+
+
+@trace
+def traced(a, b):
+    return a
+
+
+def per_call(func):
+    timer = timeit.Timer(lambda: func(1, 'two'))
+    return min(timer.repeat(3, CALLS)) / CALLS * 1e6
+
+
+class TestDecoratorOverhead(unittest.TestCase):
+    """ Compares decorated calls with a plain call when logs are off """
+
+    def setUp(self):
+        self.level = logger.level
+
+    def runTest(self):
+        logger.setLevel(logging.WARNING)
+        base = per_call(plain)
+        results = [('plain', base), ('log', per_call(logged)),
+                   ('trace', per_call(traced))]
+        for name, usec in results:
+            print("{0:>6}: {1:.3f} usec/call, overhead {2:.3f} usec".format(
+                name, usec, usec - base))
+        # A disabled decorator is a level check and one extra call
+        for name, usec in results:
+            self.assertTrue(usec - base < 5, name)
+
+    def tearDown(self):
+        logger.setLevel(self.level)
@@ -0,0 +1,60 @@
+import time
+import unittest
+
+from ims.common import config
+
+config.load()
+import ims.common.metrics as metrics
+from ims.common.cache import TTLCache
+from ims.common.log import trace
+
+
+class TestTTLCache(unittest.TestCase):
+    """ Tests the size bounded cache with expiring entries """
+
+    @trace
+    def setUp(self):
+        metrics.reset()
+        self.cache = TTLCache('test.cache', 2, 60)
+
+    def test_get(self):
+        """ Tests hits and misses """
+        self.assertIsNone(self.cache.get('a'))
+        self.cache.put('a', 1)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertEqual(metrics.get('test.cache.hit'), 1)
+        self.assertEqual(metrics.get('test.cache.miss'), 1)
+
+    def test_lru(self):
+        """ Tests that the least recently used entry is evicted """
+        self.cache.put('a', 1)
+        self.cache.put('b', 2)
+        self.cache.get('a')
+        self.cache.put('c', 3)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('c'), 3)
+
+    def test_ttl(self):
+        """ Tests that entries expire and that a ttl of 0 disables caching """
+        cache = TTLCache('test.cache', 2, 0.05)
+        cache.put('a', 1)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('a'))
+
+        cache = TTLCache('test.cache', 2, 0)
+        cache.put('a', 1)
+        self.assertIsNone(cache.get('a'))
+
+    def test_invalidate(self):
+        """ Tests removing the entries that match """
+        self.cache.put(('u', 'node/1'), 1)
+        self.cache.put(('u', 'node/2'), 2)
+        self.cache.invalidate(lambda key: key[1] == 'node/1')
+        self.assertIsNone(self.cache.get(('u', 'node/1')))
+        self.assertEqual(self.cache.get(('u', 'node/2')), 2)
+        self.cache.clear()
+        self.assertIsNone(self.cache.get(('u', 'node/2')))
+
+    def tearDown(self):
+        pass
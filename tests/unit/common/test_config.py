@@ -103,3 +103,10 @@ class TestBadConfigs(unittest.TestCase):
         self.cfg.option('test', 'var1')
         self.cfg.option('test', 'var2', required=False)
         self.assertIsNone(getattr(self.cfg.test, 'var2', None))
+
+    def test_optional_option_default(self):
+        """ Tests that the default is used for a missing optional option """
+        self.cfg.option('test', 'var2', type=int, required=False, default=5)
+        self.cfg.option('test', 'var3', required=False, default='x')
+        self.assertEqual(self.cfg.test.var2, 5)
+        self.assertEqual(self.cfg.test.var3, 'x')
@@ -0,0 +1,83 @@
+import logging
+import unittest
+
+from ims.common import config
+
+config.load()
+from ims.common.log import create_logger, log, trace
+
+logger = create_logger(__name__)
+
+
+class Loud:
+    """ An argument that counts how often it was converted to a string """
+
+    def __init__(self):
+        self.formatted = 0
+
+    def __str__(self):
+        self.formatted += 1
+        return "loud"
+
+
+@log
+def logged(arg):
+    return arg
+
+
+@trace
+def traced(arg):
+    return arg
+
+
+class Capture(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class TestDecorators(unittest.TestCase):
+    """ Tests that the decorators only format what is emitted """
+
+    @trace
+    def setUp(self):
+        self.level = logger.level
+        self.handler = Capture()
+        logger.addHandler(self.handler)
+
+    def test_disabled(self):
+        """ Tests that arguments are not formatted when debug is off """
+        logger.setLevel(logging.INFO)
+        del self.handler.messages[:]
+        arg = Loud()
+        self.assertEqual(logged(arg), arg)
+        self.assertEqual(traced(arg), arg)
+        self.assertEqual(arg.formatted, 0)
+        self.assertEqual(len(self.handler.messages), 1)
+        self.assertTrue("Successfully Executed logged" in
+                        self.handler.messages[0])
+
+    def test_enabled(self):
+        """ Tests that the caller location and arguments are logged """
+        logger.setLevel(logging.DEBUG)
+        del self.handler.messages[:]
+        arg = Loud()
+        traced(arg)
+        self.assertTrue(arg.formatted > 0)
+        entering = self.handler.messages[0]
+        self.assertTrue(__file__.rstrip('c') in entering)
+        self.assertTrue("in test_enabled" in entering)
+        self.assertTrue("Entering traced" in entering)
+        self.assertTrue("loud" in entering)
+
+    def test_wraps(self):
+        """ Tests that the decorated function keeps its name """
+        self.assertEqual(logged.__name__, 'logged')
+        self.assertEqual(traced.__name__, 'traced')
+
+    def tearDown(self):
+        logger.removeHandler(self.handler)
+        logger.setLevel(self.level)
@@ -0,0 +1,45 @@
+import threading
+import unittest
+
+from ims.common import config
+
+config.load()
+from ims.common import metrics
+from ims.common.log import trace
+
+
+class TestCounters(unittest.TestCase):
+    """ Tests incrementing and reading counters """
+
+    @trace
+    def setUp(self):
+        metrics.reset()
+
+    def test_increment(self):
+        """ Tests that increments are added up per counter """
+        metrics.increment('test.a')
+        metrics.increment('test.a', 2)
+        metrics.increment('test.b')
+        self.assertEqual(metrics.get('test.a'), 3)
+        self.assertEqual(metrics.snapshot(), {'test.a': 3, 'test.b': 1})
+
+    def test_missing_counter(self):
+        """ Tests that a counter which was never incremented is 0 """
+        self.assertEqual(metrics.get('test.missing'), 0)
+
+    def test_concurrent_increment(self):
+        """ Tests that no increments are lost when done from many threads """
+
+        def work():
+            for i in range(1000):
+                metrics.increment('test.concurrent')
+
+        threads = [threading.Thread(target=work) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(metrics.get('test.concurrent'), 8000)
+
+    def tearDown(self):
+        metrics.reset()
@@ -0,0 +1,54 @@
+import threading
+import time
+import unittest
+
+from ims.common import config
+
+config.load()
+from ims.common import parallel
+from ims.common.log import trace
+
+
+class TestMap(unittest.TestCase):
+    """ Tests calling a function concurrently over a list of items """
+
+    @trace
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def work(self, item):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.01)
+        with self.lock:
+            self.running -= 1
+        return item * 2
+
+    def test_order(self):
+        """ Tests that results are returned in the order of the items """
+        self.assertEqual(parallel.map(self.work, range(20), 4),
+                         [i * 2 for i in range(20)])
+
+    def test_bounded(self):
+        """ Tests that no more than the given number of calls run at once """
+        parallel.map(self.work, range(20), 4)
+        self.assertTrue(1 < self.max_running <= 4)
+
+    def test_empty(self):
+        """ Tests that an empty list gives an empty list """
+        self.assertEqual(parallel.map(self.work, [], 4), [])
+
+    def test_exception(self):
+        """ Tests that an exception raised by the function is re-raised """
+
+        def fail(item):
+            raise ValueError(item)
+
+        with self.assertRaises(ValueError):
+            parallel.map(fail, range(4), 2)
+
+    def tearDown(self):
+        pass
@@ -0,0 +1,8 @@
+from ims.common import config
+config.load()
+
+from ims.database import migrations
+
+# The tables are created when einstein starts, these tests use the db
+# without it
+migrations.upgrade()
@@ -0,0 +1,20 @@
+# sqlite gives a row inserted without an id the highest id plus one, so the
+# tests expect ids to start over when their rows are deleted. The sequences
+# of PostgreSQL are reset to match before every test.
+import pytest
+
+from ims.database.db_connection import DatabaseConnection
+from ims.database.image import Image
+from ims.database.project import Project
+
+
+@pytest.fixture(autouse=True)
+def sync_id_sequences():
+    connection = DatabaseConnection()
+    try:
+        connection.write(lambda session: [
+            DatabaseConnection.sync_id_sequence(session, table.__tablename__)
+            for table in [Project, Image]])
+    finally:
+        connection.close()
+    yield
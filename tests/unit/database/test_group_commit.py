@@ -0,0 +1,117 @@
+import threading
+from unittest import TestCase
+
+from ims.common import config
+config.load()
+
+import ims.common.constants as constants
+import ims.common.metrics as metrics
+from ims.common.log import trace
+from ims.database.database import Database
+from ims.database.db_connection import DatabaseConnection
+from ims.database.group_commit import GroupCommitter
+from ims.exception import db_exceptions
+
+
+class TestGroupCommit(TestCase):
+    """
+    Writes images from concurrent requests with group commit enabled and
+    tests that they share commits and get their own results
+    """
+
+    WRITERS = 8
+
+    @trace
+    def setUp(self):
+        self.db = Database()
+        self.db.project.insert('project 1', 1)
+        self.db.image.insert('image 1', 1, id=1)
+        metrics.reset()
+        self.committer = DatabaseConnection.committer
+        # The window is long enough for every writer to join the first commit
+        DatabaseConnection.committer = GroupCommitter(
+            DatabaseConnection.session_maker, 0.5, 64)
+
+    def __write(self, write, errors, index):
+        db = Database()
+        try:
+            write(db, index)
+        except Exception as e:
+            errors[index] = e
+        finally:
+            db.close()
+
+    def __run(self, write):
+        errors = {}
+        threads = [threading.Thread(target=self.__write,
+                                    args=(write, errors, index)) for index in
+                   range(self.WRITERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
+
+    def test_inserts_are_grouped(self):
+        """ Tests that concurrent inserts are committed together """
+        errors = self.__run(lambda db, index: db.image.insert(
+            'image {0}'.format(index + 2), 1))
+        self.assertEqual(errors, {})
+        images = self.db.image.fetch_images_from_project('project 1')
+        self.assertEqual(len(images), self.WRITERS + 1)
+        self.assertEqual(metrics.get('db.group_commit.writes'), self.WRITERS)
+        self.assertLess(metrics.get('db.group_commit.commits'), self.WRITERS)
+
+    def test_errors_are_not_shared(self):
+        """
+        Tests that a duplicate insert and a missing image only fail their own
+        callers
+        """
+
+        def write(db, index):
+            if index == 0:
+                db.image.insert('image 1', 1)
+            elif index == 1:
+                db.image.delete_with_name_from_project('image 0', 'project 1')
+            else:
+                db.image.copy_image('project 1', 'image 1', 1,
+                                    'image {0}'.format(index))
+
+        errors = self.__run(write)
+        self.assertIsInstance(errors.pop(0), db_exceptions.ORMException)
+        self.assertIsInstance(errors.pop(1),
+                              db_exceptions.ImageNotFoundException)
+        self.assertEqual(errors, {})
+        images = self.db.image.fetch_images_from_project('project 1')
+        self.assertEqual(len(images), self.WRITERS - 1)
+        self.assertEqual(metrics.get('db.group_commit.writes'),
+                         self.WRITERS - 2)
+
+    def test_every_write_is_grouped(self):
+        """ Tests that the writes of the disk pool go through the committer """
+        # The writes are sequential, they need no window to share commits
+        DatabaseConnection.committer.shutdown()
+        DatabaseConnection.committer = GroupCommitter(
+            DatabaseConnection.session_maker, 0, 64)
+        standby = [constants.STANDBY_DISK_PREFIX + '2',
+                   constants.STANDBY_DISK_PREFIX + '3']
+        ids = self.db.image.insert_many(standby, 1, 1)
+        self.assertTrue(self.db.image.claim_standby_with_id(ids[standby[0]],
+                                                            'image 4'))
+        self.db.image.delete_with_id(ids[standby[1]])
+        self.db.warm_pool.upsert(1, 1, 2)
+        self.db.warm_pool.delete_with_image_id(1)
+        self.db.project.insert('project 2')
+        self.db.project.delete_with_name('project 2')
+        self.assertFalse(self.db.image.claim_standby_with_id(
+            ids[standby[1]], 'image 5'))
+        self.assertEqual(sorted(self.db.image.fetch_names_from_project(
+            'project 1')), ['image 1', 'image 4'])
+        self.assertIsNone(self.db.project.fetch_id_with_name('project 2'))
+        self.assertEqual(metrics.get('db.group_commit.writes'), 8)
+
+    def tearDown(self):
+        DatabaseConnection.committer.shutdown()
+        DatabaseConnection.committer = self.committer
+        self.db.project.delete_with_name('project 1')
+        self.db.close()
@@ -3,8 +3,13 @@ from unittest import TestCase
 from ims.common import config
 config.load()
 
+from sqlalchemy import event
+
+import ims.common.constants as constants
+import ims.common.metrics as metrics
 from ims.common.log import trace
 from ims.database.database import Database
+from ims.database.db_connection import DatabaseConnection
 from ims.exception import db_exceptions
 
 
@@ -14,10 +19,10 @@ class TestInsert(TestCase):
     @trace
     def setUp(self):
         self.db = Database()
-        self.db.project.insert('project 1')
+        self.db.project.insert('project 1', 1)
 
     def runTest(self):
-        self.db.image.insert('image 1', 1)
+        self.db.image.insert('image 1', 1, id=1)
         self.db.image.insert('image 2', 1, is_public=True)
         self.db.image.insert('image 3', 1, parent_id=1)
         self.db.image.insert('image 4', 1, is_snapshot=True, parent_id=1)
@@ -39,14 +44,111 @@ class TestInsert(TestCase):
         self.db.close()
 
 
+class TestInsertMany(TestCase):
+    """ Creates a project and inserts several images in one transaction """
+
+    @trace
+    def setUp(self):
+        self.db = Database()
+        self.db.project.insert('project 1', 1)
+        self.db.image.insert('image 1', 1, id=1)
+
+    def test_insert_many(self):
+        """ Tests that all images are inserted and their ids returned """
+        ids = self.db.image.insert_many(['disk 1', 'disk 2'], 1, 1)
+        for name in ['disk 1', 'disk 2']:
+            self.assertEqual(ids[name],
+                             self.db.image.fetch_id_with_name_from_project(
+                                 name, 'project 1'))
+        clones = self.db.image.fetch_clones_from_project('project 1')
+        self.assertEqual(sorted(clone[0] for clone in clones),
+                         ['disk 1', 'disk 2'])
+
+    def test_insert_many_duplicate(self):
+        """ Tests that no image is inserted if one of them exists """
+        with self.assertRaises(db_exceptions.ORMException):
+            self.db.image.insert_many(['disk 1', 'image 1'], 1, 1)
+        images = self.db.image.fetch_names_from_project('project 1')
+        self.assertEqual(images, ['image 1'])
+
+    def tearDown(self):
+        self.db.project.delete_with_name('project 1')
+        self.db.close()
+
+
+class TestStandby(TestCase):
+    """ Inserts standby disks of an image and hands one out """
+
+    @trace
+    def setUp(self):
+        self.db = Database()
+        self.db.project.insert('project 1', 1)
+        self.db.image.insert('image 1', 1, id=1)
+        self.parent_id = self.db.image.fetch_id_with_name_from_project(
+            'image 1', 'project 1')
+        self.ids = self.db.image.insert_many(
+            [constants.STANDBY_DISK_PREFIX + '1',
+             constants.STANDBY_DISK_PREFIX + '2'], 1, self.parent_id)
+
+    def test_hidden(self):
+        """ Tests that standby disks are not listed """
+        self.assertEqual(sorted(self.db.image.fetch_standby_ids(
+            self.parent_id)), sorted(self.ids.values()))
+        self.assertEqual(self.db.image.fetch_names_from_project('project 1'),
+                         ['image 1'])
+        self.assertEqual(self.db.image.fetch_clones_from_project('project 1'),
+                         [])
+        self.assertEqual(self.db.image.fetch_all_images(),
+                         [[1, 'image 1', 'project 1', False, False, '']])
+
+    def test_rename_and_delete(self):
+        """ Tests that a renamed standby disk becomes a regular clone """
+        disk_id = self.ids[constants.STANDBY_DISK_PREFIX + '1']
+        self.assertTrue(self.db.image.claim_standby_with_id(disk_id,
+                                                            'disk 1'))
+        self.assertEqual(self.db.image.fetch_clones_from_project('project 1'),
+                         [['disk 1', 'image 1']])
+        self.assertEqual(self.db.image.fetch_project_id_with_id(disk_id), 1)
+
+        with self.assertRaises(db_exceptions.ORMException):
+            self.db.image.claim_standby_with_id(
+                self.ids[constants.STANDBY_DISK_PREFIX + '2'], 'disk 1')
+
+        self.db.image.delete_with_id(disk_id)
+        self.assertEqual(self.db.image.fetch_standby_ids(self.parent_id),
+                         [self.ids[constants.STANDBY_DISK_PREFIX + '2']])
+
+    def test_has_clones(self):
+        """ Tests that only the clones given to users are counted """
+        self.assertFalse(self.db.image.has_clones_with_id(self.parent_id))
+        self.db.image.claim_standby_with_id(
+            self.ids[constants.STANDBY_DISK_PREFIX + '1'], 'disk 1')
+        self.assertTrue(self.db.image.has_clones_with_id(self.parent_id))
+
+    def test_claim_twice(self):
+        """ Tests that a standby disk is only handed out once """
+        disk_id = self.ids[constants.STANDBY_DISK_PREFIX + '1']
+        self.assertTrue(self.db.image.claim_standby_with_id(disk_id,
+                                                            'disk 1'))
+        self.assertFalse(self.db.image.claim_standby_with_id(disk_id,
+                                                             'disk 2'))
+        self.assertEqual(self.db.image.fetch_clones_from_project('project 1'),
+                         [['disk 1', 'image 1']])
+        self.assertFalse(self.db.image.claim_standby_with_id(100, 'disk 3'))
+
+    def tearDown(self):
+        self.db.project.delete_with_name('project 1')
+        self.db.close()
+
+
 class TestDelete(TestCase):
     """ Inserts image and deletes it """
 
     @trace
     def setUp(self):
         self.db = Database()
-        self.db.project.insert('project 1')
-        self.db.image.insert('image 1', 1)
+        self.db.project.insert('project 1', 1)
+        self.db.image.insert('image 1', 1, id=1)
 
     def runTest(self):
         self.db.image.delete_with_name_from_project('image 1', 'project 1')
@@ -64,9 +166,9 @@ class TestFetch(TestCase):
     @trace
     def setUp(self):
         self.db = Database()
-        self.db.project.insert('project 1')
-        self.db.image.insert('image 1', 1)
-        self.db.image.insert('image 2', 1, is_public=True)
+        self.db.project.insert('project 1', 1)
+        self.db.image.insert('image 1', 1, id=1)
+        self.db.image.insert('image 2', 1, is_public=True, id=2)
         self.db.image.insert('image 3', 1, parent_id=1)
         self.db.image.insert('image 4', 1, is_snapshot=True, parent_id=1)
 
@@ -110,15 +212,191 @@ class TestFetch(TestCase):
         self.db.close()
 
 
+class TestFetchWithIds(TestCase):
+    """ Resolves several image ids at once """
+
+    @trace
+    def setUp(self):
+        self.db = Database()
+        self.db.project.insert('project 1', 1)
+        self.db.project.insert('project 2', 2)
+        self.db.image.insert('image 1', 1, id=1)
+        self.db.image.insert('image 2', 2, id=2)
+
+    def runTest(self):
+        names = self.db.image.fetch_names_and_projects_with_ids([1, 2, 1, 3])
+        self.assertEqual(names, {1: ['image 1', 'project 1'],
+                                 2: ['image 2', 'project 2']})
+        self.assertEqual(self.db.image.fetch_names_and_projects_with_ids([]),
+                         {})
+
+    def tearDown(self):
+        self.db.project.delete_with_name('project 1')
+        self.db.project.delete_with_name('project 2')
+        self.db.close()
+
+
+class TestNameCache(TestCase):
+    """ Resolves names from the cache and checks that writes invalidate it """
+
+    @trace
+    def setUp(self):
+        self.db = Database()
+        self.db.project.insert('project 1', 1)
+        self.db.project.insert('project 2', 2)
+        self.db.image.insert('image 1', 1, id=1)
+        self.db.image.insert('image 2', 1, id=2)
+        metrics.reset()
+
+    def fetch(self, name, project='project 1'):
+        return self.db.image.fetch_id_with_name_from_project(name, project)
+
+    def test_hit(self):
+        """ Tests that the second lookup of a name is a hit """
+        self.assertEqual(self.fetch('image 1'), 1)
+        self.assertEqual(self.fetch('image 1'), 1)
+        self.assertEqual(self.db.project.fetch_id_with_name('project 1'), 1)
+        self.assertEqual(self.db.project.fetch_id_with_name('project 1'), 1)
+        self.assertEqual(metrics.get('db.name_cache.miss'), 2)
+        self.assertEqual(metrics.get('db.name_cache.hit'), 2)
+
+    def test_invalidate(self):
+        """ Tests that renamed, moved and deleted images are not found """
+        self.fetch('image 1')
+        self.fetch('image 2')
+        self.db.image.move_image('project 1', 'image 1', 1, 'image 3')
+        with self.assertRaises(db_exceptions.ImageNotFoundException):
+            self.fetch('image 1')
+        self.assertEqual(self.fetch('image 3'), 1)
+
+        self.db.image.move_image('project 1', 'image 3', 2, None)
+        self.assertEqual(self.fetch('image 3', 'project 2'), 1)
+        with self.assertRaises(db_exceptions.ImageNotFoundException):
+            self.fetch('image 3')
+
+        self.db.image.delete_with_name_from_project('image 2', 'project 1')
+        self.db.image.insert(constants.STANDBY_DISK_PREFIX + '2', 1, id=5)
+        self.assertEqual(self.fetch(constants.STANDBY_DISK_PREFIX + '2'), 5)
+
+        self.db.image.claim_standby_with_id(5, 'image 4')
+        with self.assertRaises(db_exceptions.ImageNotFoundException):
+            self.fetch(constants.STANDBY_DISK_PREFIX + '2')
+
+        self.db.project.delete_with_name('project 2')
+        self.assertIsNone(self.db.project.fetch_id_with_name('project 2'))
+        with self.assertRaises(db_exceptions.ImageNotFoundException):
+            self.fetch('image 3', 'project 2')
+
+    def tearDown(self):
+        self.db.project.delete_with_name('project 1')
+        self.db.project.delete_with_name('project 2')
+        self.db.close()
+
+
+class TestFilterAndPage(TestCase):
+    """ Filters and pages the listings in the db """
+
+    @trace
+    def setUp(self):
+        self.db = Database()
+        self.db.project.insert('project 1', 1)
+        self.db.project.insert('project 2', 2)
+        self.db.image.insert('image 1', 1, id=1)
+        self.db.image.insert('image 2', 1, is_public=True, id=2)
+        self.db.image.insert('image 3', 1, parent_id=1, id=3)
+        self.db.image.insert('image 4', 1, is_snapshot=True, parent_id=1,
+                             id=4)
+        self.db.image.insert('image 5', 2, id=5)
+
+    def test_filter(self):
+        """ Tests that the filters of the admin listing are combined """
+        def ids(**kwargs):
+            return [image[0] for image in
+                    self.db.image.fetch_all_images(**kwargs)]
+
+        self.assertEqual(ids(), [1, 2, 3, 4, 5])
+        self.assertEqual(ids(project_name='project 2'), [5])
+        self.assertEqual(ids(name='image 3'), [3])
+        self.assertEqual(ids(id=4), [4])
+        self.assertEqual(ids(snapshots=True), [4])
+        self.assertEqual(ids(clones=True), [3])
+        self.assertEqual(ids(snapshots=True, public=True), [2, 4])
+        self.assertEqual(ids(project_name='project 2', public=True), [])
+
+    def test_page(self):
+        """ Tests that pages start after the cursor """
+        images = self.db.image.fetch_all_images(limit=2)
+        self.assertEqual([image[0] for image in images], [1, 2])
+        images = self.db.image.fetch_all_images(limit=2, after=images[-1][0])
+        self.assertEqual([image[0] for image in images], [3, 4])
+
+        self.assertEqual(self.db.image.fetch_images_from_project(
+            'project 1', 1), ['image 1'])
+        self.assertEqual(self.db.image.fetch_images_from_project(
+            'project 1', 1, 'image 1'), ['image 2'])
+        self.assertEqual(self.db.image.fetch_images_from_project(
+            'project 1', None, 'image 2'), [])
+        self.assertEqual(self.db.image.fetch_snapshots_from_project(
+            'project 1', 5, 'image 3'), [['image 4', 'image 1']])
+
+    def tearDown(self):
+        self.db.project.delete_with_name('project 1')
+        self.db.project.delete_with_name('project 2')
+        self.db.close()
+
+
+class TestListingQueries(TestCase):
+    """ Counts the queries made by the listings """
+
+    @trace
+    def setUp(self):
+        self.db = Database()
+        self.db.project.insert('project 1', 1)
+        self.db.image.insert('image 1', 1, id=1)
+        self.db.image.insert_many(['snap %d' % i for i in range(5)], 1, 1,
+                                  is_snapshot=True)
+        self.db.image.insert_many(['clone %d' % i for i in range(5)], 1, 1)
+        self.queries = []
+        event.listen(DatabaseConnection.engine, 'before_cursor_execute',
+                     self.count)
+
+    def count(self, conn, cursor, statement, parameters, context,
+              executemany):
+        self.queries.append(statement)
+
+    def runTest(self):
+        listings = [
+            (self.db.image.fetch_all_images, (), 11),
+            (self.db.image.fetch_images_from_project, ('project 1',), 1),
+            (self.db.image.fetch_snapshots_from_project, ('project 1',), 5),
+            (self.db.image.fetch_clones_from_project, ('project 1',), 5),
+            (self.db.image.fetch_names_from_project, ('project 1',), 11)]
+        for func, args, rows in listings:
+            del self.queries[:]
+            self.assertEqual(len(func(*args)), rows, func.__name__)
+            self.assertEqual(len(self.queries), 1, func.__name__)
+
+        self.assertEqual(self.db.image.fetch_snapshots_from_project(
+            'project 1')[0], ['snap 0', 'image 1'])
+        self.assertEqual(self.db.image.fetch_all_images()[0],
+                         [1, 'image 1', 'project 1', False, False, ''])
+
+    def tearDown(self):
+        event.remove(DatabaseConnection.engine, 'before_cursor_execute',
+                     self.count)
+        self.db.project.delete_with_name('project 1')
+        self.db.close()
+
+
 class TestCopy(TestCase):
     """ Inserts images and tries copying them """
 
     @trace
     def setUp(self):
         self.db = Database()
-        self.db.project.insert('project 1')
-        self.db.project.insert('project 2')
-        self.db.image.insert('image 1', 1)
+        self.db.project.insert('project 1', 1)
+        self.db.project.insert('project 2', 2)
+        self.db.image.insert('image 1', 1, id=1)
         self.db.image.insert('image 2', 1, is_snapshot=True, parent_id=1)
 
     def runTest(self):
@@ -150,9 +428,9 @@ class TestMove(TestCase):
     @trace
     def setUp(self):
         self.db = Database()
-        self.db.project.insert('project 1')
-        self.db.project.insert('project 2')
-        self.db.image.insert('image 1', 1)
+        self.db.project.insert('project 1', 1)
+        self.db.project.insert('project 2', 2)
+        self.db.image.insert('image 1', 1, id=1)
         self.db.image.insert('image 2', 1, is_snapshot=True, parent_id=1)
 
     def runTest(self):
@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+import threading
+from unittest import TestCase
+
+from ims.common import config
+config.load()
+
+from sqlalchemy import create_engine, inspect
+
+from ims.common.log import trace
+from ims.database import migrations
+
+
+class TestUpgrade(TestCase):
+    """ Upgrades new dbs and dbs created before the schema was versioned """
+
+    @trace
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.engine = create_engine(
+            'sqlite:///' + os.path.join(self.dir, 'bmi.db'))
+
+    def version(self):
+        return self.engine.execute(
+            migrations.schema_version.select()).fetchall()
+
+    def test_new(self):
+        """ Tests that a new db is created at the latest version """
+        self.assertEqual(migrations.upgrade(self.engine),
+                         migrations.LATEST_VERSION)
+        self.assertEqual(self.version(), [(migrations.LATEST_VERSION,)])
+        self.assertTrue(set(['project', 'image', 'warm_pool']) <= set(
+            inspect(self.engine).get_table_names()))
+
+        # Upgrading again changes nothing
+        self.assertEqual(migrations.upgrade(self.engine),
+                         migrations.LATEST_VERSION)
+        self.assertEqual(self.version(), [(migrations.LATEST_VERSION,)])
+
+    def test_unversioned(self):
+        """ Tests that missing tables and indexes are added to an old db """
+        self.engine.execute("CREATE TABLE project (id INTEGER NOT NULL, "
+                            "name VARCHAR NOT NULL, PRIMARY KEY (id), "
+                            "UNIQUE (name))")
+        self.engine.execute("CREATE TABLE image (id INTEGER NOT NULL, "
+                            "name VARCHAR NOT NULL, is_public BOOLEAN NOT "
+                            "NULL, is_snapshot BOOLEAN NOT NULL, project_id "
+                            "INTEGER NOT NULL, parent_id INTEGER, PRIMARY "
+                            "KEY (id), UNIQUE (project_id, name), FOREIGN "
+                            "KEY(project_id) REFERENCES project (id), "
+                            "FOREIGN KEY(parent_id) REFERENCES image (id))")
+        self.engine.execute("INSERT INTO project VALUES (1, 'project 1')")
+
+        self.assertEqual(migrations.upgrade(self.engine),
+                         migrations.LATEST_VERSION)
+        self.assertEqual(self.version(), [(migrations.LATEST_VERSION,)])
+        indexes = [index['name'] for index in
+                   inspect(self.engine).get_indexes('image')]
+        self.assertIn('ix_image_parent_id', indexes)
+        self.assertIn('ix_image_project_id_is_snapshot', indexes)
+        self.assertIn('warm_pool', inspect(self.engine).get_table_names())
+        # The rows are kept
+        self.assertEqual(self.engine.execute(
+            "SELECT name FROM project").fetchall(), [('project 1',)])
+
+    def test_concurrent(self):
+        """ Tests that einsteins started together upgrade the db once """
+        results = []
+
+        def upgrade():
+            engine = create_engine(self.engine.url)
+            try:
+                results.append(migrations.upgrade(engine))
+            except Exception as e:
+                results.append(e)
+            finally:
+                engine.dispose()
+
+        threads = [threading.Thread(target=upgrade) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [migrations.LATEST_VERSION] * 4)
+        self.assertEqual(self.version(), [(migrations.LATEST_VERSION,)])
+
+    def test_frozen_indexes(self):
+        """ Tests that version 2 only adds the indexes it was written for """
+        self.engine.execute("CREATE TABLE image (id INTEGER NOT NULL, "
+                            "name VARCHAR NOT NULL, is_snapshot BOOLEAN NOT "
+                            "NULL, project_id INTEGER NOT NULL, parent_id "
+                            "INTEGER, is_public BOOLEAN NOT NULL, PRIMARY "
+                            "KEY (id))")
+        with self.engine.begin() as conn:
+            migrations.MIGRATIONS[0][1](conn)
+        self.assertEqual(sorted(index['name'] for index in inspect(
+            self.engine).get_indexes('image')),
+            ['ix_image_parent_id', 'ix_image_project_id_is_snapshot'])
+
+    def tearDown(self):
+        self.engine.dispose()
+        shutil.rmtree(self.dir)
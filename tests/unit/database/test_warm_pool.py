@@ -0,0 +1,54 @@
+from unittest import TestCase
+
+from ims.common import config
+config.load()
+
+from ims.common.log import trace
+from ims.database.database import Database
+
+
+class TestUpsert(TestCase):
+    """ Sets the watermarks of an image and changes them """
+
+    @trace
+    def setUp(self):
+        self.db = Database()
+        self.db.project.insert('project 1', 1)
+        self.db.image.insert('image 1', 1, id=1)
+        self.img_id = self.db.image.fetch_id_with_name_from_project(
+            'image 1', 'project 1')
+
+    def runTest(self):
+        self.db.warm_pool.upsert(self.img_id, 2, 5)
+        self.assertEqual(self.db.warm_pool.fetch_all(), [[self.img_id, 2, 5]])
+
+        self.db.warm_pool.upsert(self.img_id, 1, 3)
+        self.assertEqual(self.db.warm_pool.fetch_all(), [[self.img_id, 1, 3]])
+
+    def tearDown(self):
+        self.db.warm_pool.delete_with_image_id(self.img_id)
+        self.db.project.delete_with_name('project 1')
+        self.db.close()
+
+
+class TestDelete(TestCase):
+    """ Sets the watermarks of an image and deletes them """
+
+    @trace
+    def setUp(self):
+        self.db = Database()
+        self.db.project.insert('project 1', 1)
+        self.db.image.insert('image 1', 1, id=1)
+        self.img_id = self.db.image.fetch_id_with_name_from_project(
+            'image 1', 'project 1')
+        self.db.warm_pool.upsert(self.img_id, 2, 5)
+
+    def runTest(self):
+        self.db.warm_pool.delete_with_image_id(self.img_id)
+        self.assertEqual(self.db.warm_pool.fetch_all(), [])
+        # Deleting again is not an error
+        self.db.warm_pool.delete_with_image_id(self.img_id)
+
+    def tearDown(self):
+        self.db.project.delete_with_name('project 1')
+        self.db.close()
@@ -0,0 +1,22 @@
+# A stand-in for sudo running bmi-rbd-helper used by the map helper tests
+# It serves the requests with the helper but writes to the rbd driver files
+# in the directory given as its first argument instead of /sys/bus/rbd. When
+# a password is given as its second argument it is first read from stdin
+# like sudo -S does, trying three times.
+import sys
+
+from ims.einstein import rbd_helper
+
+
+def main(argv):
+    if len(argv) > 1:
+        for _ in range(3):
+            if sys.stdin.readline().strip() == argv[1]:
+                break
+        else:
+            return 1
+    return rbd_helper.serve(argv[0], sys.stdin, sys.stdout)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,64 @@
+# A stand-in for tgtadm used by the tgt driver tests
+# The targets are kept in the JSON file named by STUB_TGTADM_STATE along with
+# every command that was run. STUB_TGTADM_FAIL=<mode>:<op> makes that
+# operation fail.
+import json
+import os
+import sys
+
+
+def main(argv):
+    args = {}
+    it = iter(argv)
+    for arg in it:
+        if arg.startswith('--'):
+            args[arg[2:]] = next(it, None) if arg != '--force' else True
+
+    path = os.environ['STUB_TGTADM_STATE']
+    state = {'targets': {}, 'calls': []}
+    if os.path.exists(path):
+        with open(path) as f:
+            state = json.load(f)
+    state['calls'].append(argv)
+
+    mode, op = args.get('mode'), args.get('op')
+    targets = state['targets']
+    tid = args.get('tid')
+
+    def save():
+        with open(path, 'w') as f:
+            json.dump(state, f)
+
+    if os.environ.get('STUB_TGTADM_FAIL') == '{0}:{1}'.format(mode, op):
+        save()
+        sys.stderr.write('tgtadm: injected failure\n')
+        return 22
+
+    if mode == 'target' and op == 'show':
+        for t in sorted(targets, key=int):
+            sys.stdout.write('Target {0}: {1}\n'.format(
+                t, targets[t]['name']))
+            if targets[t].get('store'):
+                sys.stdout.write('        LUN: 1\n')
+                sys.stdout.write('            Backing store path: {0}\n'.
+                                 format(targets[t]['store']))
+    elif mode == 'target' and op == 'new':
+        if tid in targets:
+            save()
+            sys.stderr.write('tgtadm: this target already exists\n')
+            return 22
+        targets[tid] = {'name': args['targetname']}
+    elif tid not in targets:
+        save()
+        sys.stderr.write("tgtadm: can't find the target\n")
+        return 22
+    elif mode == 'target' and op == 'delete':
+        del targets[tid]
+    elif mode == 'logicalunit' and op == 'new':
+        targets[tid]['store'] = args['backing-store']
+    save()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,103 @@
+import threading
+import time
+import unittest
+
+from ims.common import config
+
+config.load()
+import ims.common.constants as constants
+from ims.common.log import trace
+from ims.einstein.flatten import FlattenExecutor
+from ims.exception.file_system_exceptions import ImageNotFoundException
+
+
+class TestFlattenExecutor(unittest.TestCase):
+    """ Tests running flattens on the executor with a limit per pool """
+
+    @trace
+    def setUp(self):
+        self.executor = FlattenExecutor(4, 1, 2)
+        self.release = threading.Event()
+
+    def test_progress(self):
+        """ Tests that the progress reported by librbd is kept """
+        reported = threading.Event()
+
+        def flatten(on_progress):
+            on_progress(25, 100)
+            reported.set()
+            self.release.wait(5)
+
+        future = self.executor.submit('pool', 'img', flatten)
+        self.assertTrue(reported.wait(5))
+        self.assertFalse(future.wait(0))
+        self.assertEqual(future.state, constants.JOB_RUNNING)
+        self.assertEqual(future.progress, 25)
+        self.release.set()
+        future.result()
+        self.assertEqual(future.state, constants.JOB_SUCCEEDED)
+        self.assertEqual(future.to_dict()[constants.JOB_PROGRESS_KEY], 100)
+
+    def test_failure(self):
+        """ Tests that the error of a flatten is raised by its result """
+
+        def flatten(on_progress):
+            raise ImageNotFoundException('img')
+
+        future = self.executor.submit('pool', 'img', flatten)
+        self.assertRaises(ImageNotFoundException, future.result)
+        self.assertEqual(future.state, constants.JOB_FAILED)
+        self.assertEqual(future.to_dict()[constants.JOB_RESULT_KEY],
+                         'img Not Found')
+
+    def test_pool_limit(self):
+        """ Tests that one flatten runs at once on a pool but not across """
+        running = []
+        lock = threading.Lock()
+        peak = {}
+
+        def flatten(pool):
+            def run(on_progress):
+                with lock:
+                    running.append(pool)
+                    peak[pool] = max(peak.get(pool, 0), running.count(pool))
+                time.sleep(0.05)
+                with lock:
+                    running.remove(pool)
+            return run
+
+        futures = [self.executor.submit(pool, 'img', flatten(pool)) for
+                   pool in ['a', 'a', 'a', 'b']]
+        for future in futures:
+            future.result()
+        self.assertEqual(peak, {'a': 1, 'b': 1})
+
+    def test_saturated_pool(self):
+        """ Tests that a saturated pool does not hold up other pools """
+        started = threading.Event()
+
+        def block(on_progress):
+            started.set()
+            self.release.wait(5)
+
+        blocked = [self.executor.submit('a', 'img', block) for _ in range(4)]
+        self.assertTrue(started.wait(5))
+        other = self.executor.submit('b', 'img', lambda on_progress: None)
+        self.assertTrue(other.wait(5))
+        self.assertEqual([flatten.state for flatten in blocked],
+                         [constants.JOB_RUNNING] + [constants.JOB_QUEUED] * 3)
+        self.release.set()
+        for flatten in blocked:
+            flatten.result()
+
+    def test_history(self):
+        """ Tests that only the latest finished flattens are remembered """
+        for _ in range(4):
+            self.executor.submit('pool', 'img', lambda on_progress: None) \
+                .result()
+        self.executor.submit('pool', 'img', lambda on_progress: None).result()
+        self.assertEqual(len(self.executor.list()), 3)
+
+    def tearDown(self):
+        self.release.set()
+        self.executor.shutdown()
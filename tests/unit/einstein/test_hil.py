@@ -0,0 +1,96 @@
+import BaseHTTPServer
+import SocketServer
+import json
+import threading
+import time
+import unittest
+
+from ims.common import config
+
+config.load()
+import ims.common.constants as constants
+import ims.common.metrics as metrics
+import ims.exception.hil_exceptions as hil_exceptions
+from ims.common.log import trace
+from ims.einstein.hil import HIL
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps the connection open between requests
+    protocol_version = 'HTTP/1.1'
+    delay = 0
+
+    def do_GET(self):
+        time.sleep(Handler.delay)
+        body = json.dumps(['node-1'])
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class TestSession(unittest.TestCase):
+    """ Tests that HIL calls share keep-alive connections and time out """
+
+    @trace
+    def setUp(self):
+        self.server = Server(('127.0.0.1', 0), Handler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        self.cfg = config.get()
+        self.read_timeout = self.cfg.net_isolator.read_timeout
+        metrics.reset()
+
+    def test_reuse(self):
+        """ Tests that calls from several clients reuse one connection """
+        for i in range(5):
+            hil = HIL(base_url=self.url, usr='user', passwd='pass')
+            ret = hil.validate_project('project-%d' % i)
+            self.assertEqual(ret[constants.RETURN_VALUE_KEY], ['node-1'])
+        self.assertEqual(metrics.get('hil.requests'), 5)
+        self.assertEqual(metrics.get('hil.connections_opened'), 1)
+
+    def test_timeout(self):
+        """ Tests that a slow HIL raises a ConnectionException """
+        self.cfg.net_isolator.read_timeout = 0.1
+        Handler.delay = 0.5
+        hil = HIL(base_url=self.url, usr='user', passwd='pass')
+        with self.assertRaises(hil_exceptions.ConnectionException):
+            hil.validate_project('project')
+
+    def test_cache(self):
+        """ Tests that lookups are cached per user till a node is attached """
+        hil = HIL(base_url=self.url, usr='user', passwd='pass')
+        other = HIL(base_url=self.url, usr='other', passwd='pass')
+        hil.validate_project('project')
+        hil.validate_project('project')
+        self.assertEqual(metrics.get('hil.requests'), 1)
+        other.validate_project('project')
+        self.assertEqual(metrics.get('hil.requests'), 2)
+
+        hil.attach_node_hil_project('project', 'node-2')
+        hil.validate_project('project')
+        other.validate_project('project')
+        self.assertEqual(metrics.get('hil.requests'), 5)
+
+    def tearDown(self):
+        Handler.delay = 0
+        self.cfg.net_isolator.read_timeout = self.read_timeout
+        self.server.shutdown()
+        self.server.server_close()
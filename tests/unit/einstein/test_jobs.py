@@ -0,0 +1,135 @@
+import threading
+import time
+import unittest
+
+from ims.common import config
+
+config.load()
+import ims.common.constants as constants
+from ims.common.log import trace
+from ims.einstein import jobs
+from ims.exception.job_exceptions import JobNotFoundException, \
+    JobNotCancellableException
+
+
+def _success(value=True):
+    return {constants.STATUS_CODE_KEY: 200,
+            constants.RETURN_VALUE_KEY: value}
+
+
+class TestJobManager(unittest.TestCase):
+    """ Tests running jobs on a bounded pool of workers """
+
+    @trace
+    def setUp(self):
+        self.manager = jobs.JobManager(2, 10)
+        self.release = threading.Event()
+
+    def wait(self, job):
+        for _ in range(500):
+            if job.is_finished():
+                return
+            time.sleep(0.01)
+        self.fail("Job did not finish")
+
+    def block(self):
+        self.release.wait(5)
+        return _success()
+
+    def test_success(self):
+        """ Tests that a job succeeds with the response of the operation """
+        job = self.manager.submit('proj', 'cmd', [], lambda: _success(1))
+        self.wait(job)
+        self.assertEqual(job.state, constants.JOB_SUCCEEDED)
+        self.assertEqual(job.progress, 100)
+        self.assertEqual(job.result[constants.RETURN_VALUE_KEY], 1)
+
+    def test_failure(self):
+        """ Tests that error responses and exceptions fail the job """
+
+        def error():
+            return {constants.STATUS_CODE_KEY: 404,
+                    constants.MESSAGE_KEY: 'missing'}
+
+        def crash():
+            raise ValueError('boom')
+
+        failed = self.manager.submit('proj', 'cmd', [], error)
+        crashed = self.manager.submit('proj', 'cmd', [], crash)
+        invalid = self.manager.submit('proj', 'cmd', [], lambda: True)
+        self.wait(failed)
+        self.wait(crashed)
+        self.wait(invalid)
+        self.assertEqual(failed.state, constants.JOB_FAILED)
+        self.assertEqual(crashed.state, constants.JOB_FAILED)
+        self.assertEqual(crashed.result[constants.STATUS_CODE_KEY], 500)
+        self.assertEqual(invalid.state, constants.JOB_FAILED)
+        self.assertEqual(invalid.result[constants.STATUS_CODE_KEY], 500)
+
+    def test_bounded_and_cancel(self):
+        """ Tests that only queued jobs wait for a worker and can be
+        cancelled """
+        running = [self.manager.submit('proj', 'cmd', [], self.block)
+                   for _ in range(2)]
+        queued = self.manager.submit('proj', 'cmd', [], _success)
+        time.sleep(0.1)
+        self.assertEqual([job.state for job in running],
+                         [constants.JOB_RUNNING] * 2)
+        self.assertEqual(queued.state, constants.JOB_QUEUED)
+
+        self.manager.cancel(queued.id, 'proj')
+        with self.assertRaises(JobNotCancellableException):
+            self.manager.cancel(running[0].id, 'proj')
+
+        self.release.set()
+        for job in running:
+            self.wait(job)
+        time.sleep(0.05)
+        self.assertEqual(queued.state, constants.JOB_CANCELLED)
+
+    def test_progress(self):
+        """ Tests that the operation can report its progress """
+
+        def work():
+            jobs.report_progress(40)
+            self.release.wait(5)
+            return _success()
+
+        job = self.manager.submit('proj', 'cmd', [], work)
+        for _ in range(500):
+            if job.progress == 40:
+                break
+            time.sleep(0.01)
+        self.assertEqual(job.progress, 40)
+        self.release.set()
+        self.wait(job)
+        # Does nothing outside a job
+        jobs.report_progress(10)
+
+    def test_project_scope(self):
+        """ Tests that jobs are only visible to the project that owns them """
+        job = self.manager.submit('proj', 'cmd', ['img'], _success)
+        self.assertEqual(self.manager.get(job.id, 'proj'), job)
+        self.assertEqual(self.manager.list('other'), [])
+        with self.assertRaises(JobNotFoundException):
+            self.manager.get(job.id, 'other')
+        with self.assertRaises(JobNotFoundException):
+            self.manager.cancel(job.id, 'other')
+        self.assertEqual(job.to_dict()[constants.JOB_ARGS_KEY], ['img'])
+
+    def test_history(self):
+        """ Tests that only the latest finished jobs are remembered """
+        submitted = [self.manager.submit('proj', 'cmd', [], _success)
+                     for _ in range(15)]
+        for job in submitted:
+            self.wait(job)
+        latest = self.manager.submit('proj', 'cmd', [], _success)
+        remembered = self.manager.list('proj')
+        self.assertTrue(len(remembered) <= 11)
+        self.assertEqual(remembered[-1], latest)
+        with self.assertRaises(JobNotFoundException):
+            self.manager.get(submitted[0].id)
+
+    def tearDown(self):
+        self.release.set()
+        self.manager.shutdown()
@@ -0,0 +1,225 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from ims.common import config
+
+config.load()
+import ims.common.constants as constants
+import ims.common.metrics as metrics
+from ims.common.log import trace
+from ims.einstein.rbd_mapper import MapHelper, RbdMapper, parse_mon_host
+from ims.exception import file_system_exceptions, shell_exceptions
+
+CEPH_CONF = """[global]
+    fsid = 8d1c6f32-2d3a-4d25-9d3f-bd5cbd3e2b84
+    mon host = [v2:10.0.0.1:3300/0,v1:10.0.0.1:6789/0],10.0.0.2:6789
+"""
+
+STUB_RBD_HELPER = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               'stub_rbd_helper.py')
+
+KEYRING = """[client.admin]
+\tkey = AQBfakekey==
+"""
+
+
+def write_file(path, content):
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+class FakeDriver:
+    """
+    Stands in for the map helper and the kernel rbd driver, requests add
+    and remove devices in the fake sysfs tree
+    """
+
+    def __init__(self, devices_dir):
+        self.devices_dir = devices_dir
+        self.calls = []
+        self.fail = False
+
+    def add_device(self, dev_id, pool, image, snap=constants.RBD_NO_SNAP):
+        path = os.path.join(self.devices_dir, str(dev_id))
+        os.makedirs(path)
+        for attr, value in [('pool', pool), ('name', image),
+                            ('current_snap', snap)]:
+            write_file(os.path.join(path, attr), value + '\n')
+
+    def call(self, op, *args):
+        self.calls.append((op,) + args)
+        if self.fail:
+            raise shell_exceptions.CommandFailedException('Invalid argument')
+        if op == constants.MAP_HELPER_ADD:
+            pool, image = args[3:]
+            dev_id = 0
+            while os.path.exists(os.path.join(self.devices_dir, str(dev_id))):
+                dev_id += 1
+            self.add_device(dev_id, pool, image)
+        else:
+            shutil.rmtree(os.path.join(self.devices_dir, args[0]))
+
+    def shutdown(self):
+        pass
+
+
+class TestRbdMapper(unittest.TestCase):
+    """ Tests mapping and unmapping images against a fake sysfs tree """
+
+    @trace
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        devices_dir = os.path.join(self.dir, constants.RBD_SYSFS_DIR,
+                                   'devices')
+        os.makedirs(devices_dir)
+        write_file(os.path.join(self.dir, 'ceph.conf'), CEPH_CONF)
+        write_file(os.path.join(self.dir, 'keyring'), KEYRING)
+        self.driver = FakeDriver(devices_dir)
+        self.driver.add_device(0, 'rbd', 'img1')
+        self.driver.add_device(1, 'other', 'img2')
+        self.driver.add_device(2, 'rbd', 'img3', 'snap')
+        self.mapper = RbdMapper(self.driver, self.dir,
+                                os.path.join(self.dir, 'ceph.conf'), 'admin',
+                                os.path.join(self.dir, 'keyring'))
+
+    def test_showmapped(self):
+        """ Tests that only the heads mapped from the pool are shown """
+        self.assertEqual(self.mapper.showmapped('rbd'),
+                         {'img1': '/dev/rbd0'})
+        self.assertEqual(self.driver.calls, [])
+
+    def test_map_unmap(self):
+        """ Tests that the index follows map and unmap """
+        self.assertEqual(self.mapper.map('rbd', 'img4'), '/dev/rbd3')
+        self.assertEqual(self.driver.calls, [
+            (constants.MAP_HELPER_ADD, '10.0.0.1:6789,10.0.0.2:6789', 'admin',
+             'AQBfakekey==', 'rbd', 'img4')])
+        self.assertEqual(self.mapper.showmapped('rbd'),
+                         {'img1': '/dev/rbd0', 'img4': '/dev/rbd3'})
+
+        self.mapper.unmap('/dev/rbd0')
+        self.assertEqual(self.driver.calls[-1],
+                         (constants.MAP_HELPER_REMOVE, '0'))
+        self.assertEqual(self.mapper.showmapped('rbd'),
+                         {'img4': '/dev/rbd3'})
+
+    def test_refresh(self):
+        """ Tests that devices mapped outside are seen after a refresh """
+        self.mapper.showmapped('rbd')
+        self.driver.add_device(5, 'rbd', 'img5')
+        self.assertNotIn('img5', self.mapper.showmapped('rbd'))
+        self.mapper.refresh()
+        self.assertEqual(self.mapper.showmapped('rbd')['img5'], '/dev/rbd5')
+
+    def test_failures(self):
+        """ Tests that errors of the driver fail the map and unmap """
+        self.driver.fail = True
+        with self.assertRaises(file_system_exceptions.MapFailedException):
+            self.mapper.map('rbd', 'img4')
+        with self.assertRaises(file_system_exceptions.UnmapFailedException):
+            self.mapper.unmap('/dev/rbd0')
+        with self.assertRaises(file_system_exceptions.UnmapFailedException):
+            self.mapper.unmap('/dev/sda')
+        self.assertEqual(len(self.driver.calls), 2)
+
+    def test_parse_mon_host(self):
+        """ Tests that the v1 addresses of the monitors are given """
+        self.assertEqual(parse_mon_host('10.0.0.1, 10.0.0.2:6789;10.0.0.3'),
+                         '10.0.0.1,10.0.0.2:6789,10.0.0.3')
+        self.assertEqual(parse_mon_host(
+            '[v2:10.0.0.1:3300/0,v1:10.0.0.1:6789/0] '
+            '[v2:10.0.0.2:3300,v1:10.0.0.2:6789]'),
+            '10.0.0.1:6789,10.0.0.2:6789')
+        self.assertEqual(parse_mon_host(
+            'v1:10.0.0.1:6789/0,v2:10.0.0.2:3300/0,[v2:10.0.0.3:3300]'),
+            '10.0.0.1:6789')
+        self.assertEqual(parse_mon_host(
+            '[v2:[fd00::1]:3300,v1:[fd00::1]:6789],[fd00::2]:6789'),
+            '[fd00::1]:6789,[fd00::2]:6789')
+        self.assertIsNone(parse_mon_host('v2:10.0.0.1:3300'))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+
+class TestMapHelper(unittest.TestCase):
+    """ Tests the map helper writing to a fake sysfs tree """
+
+    @trace
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.rbd_dir = os.path.join(self.dir, constants.RBD_SYSFS_DIR)
+        os.makedirs(self.rbd_dir)
+        for name in ['add', 'add_single_major', 'remove']:
+            write_file(os.path.join(self.rbd_dir, name), '')
+        metrics.reset()
+        self.helper = MapHelper([sys.executable, STUB_RBD_HELPER,
+                                 self.rbd_dir])
+
+    def read(self, name):
+        with open(os.path.join(self.rbd_dir, name)) as f:
+            return f.read()
+
+    def test_requests(self):
+        """ Tests that requests are written by a single helper process """
+        self.helper.call(constants.MAP_HELPER_ADD, '10.0.0.1:6789,[fd00::1]',
+                         'admin', 'AQBfakekey==', 'rbd', 'img')
+        self.helper.call(constants.MAP_HELPER_REMOVE, '3')
+        self.assertEqual(self.read('add'), '')
+        self.assertEqual(self.read('add_single_major'),
+                         '10.0.0.1:6789,[fd00::1] name=admin,'
+                         'secret=AQBfakekey== rbd img')
+        self.assertEqual(self.read('remove'), '3')
+        self.assertEqual(metrics.get('ceph.map_helper_started'), 1)
+
+    def test_invalid_request(self):
+        """ Tests that the helper rejects requests and keeps running """
+        for args in [('10.0.0.1', 'admin', 'key', 'rbd', '../img'),
+                     ('10.0.0.1', 'admin', 'key', 'rbd', 'img@snap'),
+                     ('10.0.0.1', 'admin,secret=x', 'key', 'rbd', 'img'),
+                     ('10.0.0.1', 'admin', 'key,ro', 'rbd', 'img'),
+                     ('mon.example.com', 'admin', 'key', 'rbd', 'img'),
+                     ('10.0.0.1', 'admin', 'key', 'rbd', 'img', 'more'),
+                     ('10.0.0.1', 'admin', 'key', 'rbd')]:
+            with self.assertRaises(shell_exceptions.CommandFailedException):
+                self.helper.call(constants.MAP_HELPER_ADD, *args)
+        with self.assertRaises(shell_exceptions.CommandFailedException):
+            self.helper.call(constants.MAP_HELPER_REMOVE, '../add')
+        self.assertEqual(self.read('add_single_major'), '')
+        self.assertEqual(self.read('remove'), '')
+
+        os.remove(os.path.join(self.rbd_dir, 'remove'))
+        with self.assertRaises(shell_exceptions.CommandFailedException):
+            self.helper.call(constants.MAP_HELPER_REMOVE, '3')
+        self.helper.call(constants.MAP_HELPER_PING)
+        self.assertEqual(metrics.get('ceph.map_helper_started'), 1)
+
+    def test_password(self):
+        """ Tests starting the helper with sudo reading a password """
+        self.helper = MapHelper([sys.executable, STUB_RBD_HELPER,
+                                 self.rbd_dir, 'secret'], 'secret')
+        self.helper.call(constants.MAP_HELPER_REMOVE, '3')
+        self.assertEqual(self.read('remove'), '3')
+
+        # The password line reaches the helper when sudo did not need it
+        self.helper.shutdown()
+        self.helper = MapHelper([sys.executable, STUB_RBD_HELPER,
+                                 self.rbd_dir], 'secret')
+        self.helper.call(constants.MAP_HELPER_REMOVE, '4')
+        self.assertEqual(self.read('remove'), '4')
+        self.assertEqual(metrics.get('ceph.map_helper_started'), 2)
+
+    def test_wrong_password(self):
+        """ Tests that a wrong password fails instead of hanging """
+        self.helper = MapHelper([sys.executable, STUB_RBD_HELPER,
+                                 self.rbd_dir, 'secret'], 'wrong', timeout=1)
+        with self.assertRaises(shell_exceptions.CommandFailedException):
+            self.helper.call(constants.MAP_HELPER_REMOVE, '3')
+        self.assertEqual(self.read('remove'), '')
+
+    def tearDown(self):
+        self.helper.shutdown()
+        shutil.rmtree(self.dir)
@@ -0,0 +1,160 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from ims.common import config
+
+config.load()
+import ims.common.constants as constants
+from ims.common.log import trace
+from ims.einstein.iscsi.tgt import TGT
+from ims.exception import iscsi_exceptions
+from ims.interfaces.iscsi import Target
+
+STUB_TGTADM = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'stub_tgtadm.py')
+
+
+class TestDirectMode(unittest.TestCase):
+    """ Tests the tgt driver creating targets directly with tgtadm """
+
+    @trace
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.state = os.path.join(self.dir, 'state.json')
+        os.environ['STUB_TGTADM_STATE'] = self.state
+        os.environ.pop('STUB_TGTADM_FAIL', None)
+        self.tgt = self.create_tgt()
+
+    def create_tgt(self):
+        return TGT('/etc/ceph/ceph.conf', 'admin', 'rbd',
+                   mode=constants.TGT_DIRECT_MODE,
+                   tgtadm=sys.executable + ' ' + STUB_TGTADM, sudo=False,
+                   config_dir=self.dir + '/')
+
+    def read_state(self):
+        with open(self.state) as f:
+            return json.load(f)
+
+    def test_add_remove(self):
+        """ Tests that a target and its config file are added and removed """
+        self.tgt.add_target('img1')
+        self.tgt.add_target('img2')
+        self.assertEqual(sorted(self.tgt.list_targets()), ['img1', 'img2'])
+        self.assertTrue(os.path.exists(os.path.join(self.dir, 'img1.conf')))
+        targets = self.read_state()['targets']
+        self.assertEqual(targets['1'], {'name': 'img1',
+                                        'store': 'rbd/img1'})
+
+        with self.assertRaises(iscsi_exceptions.TargetExistsException):
+            self.tgt.add_target('img1')
+
+        self.tgt.remove_target('img1')
+        self.assertEqual(self.tgt.list_targets(), ['img2'])
+        self.assertFalse(os.path.exists(os.path.join(self.dir, 'img1.conf')))
+        with self.assertRaises(iscsi_exceptions.TargetDoesntExistException):
+            self.tgt.remove_target('img1')
+
+        # The freed tid is reused
+        self.tgt.add_target('img3')
+        self.assertEqual(self.read_state()['targets']['1']['name'], 'img3')
+
+    def test_constant_cost(self):
+        """ Tests that the number of tgtadm calls does not grow with the
+        number of targets """
+        self.tgt.add_target('img0')
+        calls = len(self.read_state()['calls'])
+        for i in range(1, 6):
+            self.tgt.add_target('img%d' % i)
+            self.assertEqual(len(self.read_state()['calls']) - calls, 4)
+            calls = len(self.read_state()['calls'])
+        self.tgt.remove_target('img3')
+        self.assertEqual(len(self.read_state()['calls']) - calls, 1)
+
+    def test_existing_targets(self):
+        """ Tests that targets created earlier are loaded once """
+        self.tgt.add_target('img1')
+        self.tgt.add_target('img2')
+        tgt = self.create_tgt()
+        self.assertEqual(sorted(tgt.list_targets()), ['img1', 'img2'])
+        tgt.add_target('img3')
+        self.assertEqual(self.read_state()['targets']['3']['name'], 'img3')
+
+    def test_rollback(self):
+        """ Tests that a target whose LUN fails is removed """
+        os.environ['STUB_TGTADM_FAIL'] = 'logicalunit:new'
+        with self.assertRaises(iscsi_exceptions.TargetCreationFailed):
+            self.tgt.add_target('img1')
+        self.assertEqual(self.read_state()['targets'], {})
+        self.assertEqual(self.tgt.list_targets(), [])
+        self.assertFalse(os.path.exists(os.path.join(self.dir, 'img1.conf')))
+
+        os.environ.pop('STUB_TGTADM_FAIL')
+        failed = self.tgt.add_targets(['img1', 'img2'])
+        self.assertEqual(failed, {})
+        self.assertEqual(sorted(self.tgt.list_targets()), ['img1', 'img2'])
+
+    def test_registry(self):
+        """ Tests that lookups are answered by the registry """
+        self.tgt.add_target('img1')
+        calls = len(self.read_state()['calls'])
+        self.assertEqual(self.tgt.get_target('img1'), Target(1, 1, 'rbd/img1'))
+        self.assertTrue(self.tgt.has_target('img1'))
+        self.assertEqual(self.tgt.list_targets(), ['img1'])
+        self.assertEqual(len(self.read_state()['calls']), calls)
+
+        # The registry of a new driver is loaded from the server
+        tgt = self.create_tgt()
+        self.assertEqual(tgt.get_targets(), {'img1': Target(1, 1, 'rbd/img1')})
+
+    def test_reconcile(self):
+        """ Tests that changes made outside the driver are reconciled """
+        self.tgt.add_target('img1')
+        self.tgt.add_target('img2')
+        state = self.read_state()
+        del state['targets']['1']
+        state['targets']['7'] = {'name': 'img7', 'store': 'rbd/img7'}
+        with open(self.state, 'w') as f:
+            json.dump(state, f)
+
+        missing, stale = self.tgt.reconcile_targets()
+        self.assertEqual((missing, stale), (['img7'], ['img1']))
+        self.assertEqual(sorted(self.tgt.list_targets()), ['img2', 'img7'])
+        # tids are allocated after the ones found by the reconcile
+        self.tgt.add_target('img8')
+        self.assertEqual(self.tgt.get_target('img8').tid, 8)
+
+    def test_tid_in_use(self):
+        """ Tests that a tid taken outside the driver is not reused """
+        self.tgt.add_target('img1')
+        self.tgt.add_target('img2')
+        self.tgt.remove_target('img2')
+        state = self.read_state()
+        state['targets']['2'] = {'name': 'other2', 'store': 'rbd/other2'}
+        state['targets']['3'] = {'name': 'other3', 'store': 'rbd/other3'}
+        with open(self.state, 'w') as f:
+            json.dump(state, f)
+
+        with self.assertRaises(iscsi_exceptions.TargetCreationFailed):
+            self.tgt.add_target('img4')
+        self.tgt.add_target('img4')
+        self.assertEqual(self.tgt.get_target('img4').tid, 4)
+        self.tgt.add_target('img5')
+        self.assertEqual(self.tgt.get_target('img5').tid, 5)
+
+    def test_missing_tgtadm(self):
+        """ Tests that a missing tgtadm fails like a failed command """
+        tgt = TGT('/etc/ceph/ceph.conf', 'admin', 'rbd',
+                  mode=constants.TGT_DIRECT_MODE,
+                  tgtadm=os.path.join(self.dir, 'tgtadm'), sudo=False,
+                  config_dir=self.dir + '/')
+        with self.assertRaises(iscsi_exceptions.ListTargetFailedException):
+            tgt.reconcile_targets()
+
+    def tearDown(self):
+        os.environ.pop('STUB_TGTADM_STATE', None)
+        os.environ.pop('STUB_TGTADM_FAIL', None)
+        shutil.rmtree(self.dir)
@@ -301,3 +301,34 @@ class TestRemoveImage(TestCase):
         self.db.project.delete_with_name(PROJECT)
         self.db.close()
         self.good_bmi.shutdown()
+
+
+class TestMountImage(TestCase):
+    """
+    Imports an Image and calls the mount and umount image rest calls
+    """
+
+    @trace
+    def setUp(self):
+        self.db = Database()
+        self.db.project.insert(PROJECT)
+        self.good_bmi = BMI(CORRECT_HIL_USERNAME, CORRECT_HIL_PASSWORD,
+                            PROJECT)
+        self.good_bmi.import_ceph_image(EXIST_IMG_NAME)
+
+    def runTest(self):
+        data = {constants.PROJECT_PARAMETER: PROJECT,
+                constants.IMAGE_NAME_PARAMETER: EXIST_IMG_NAME}
+        res = requests.put(PICASSO_URL + "mount_image/", data=data, auth=(
+            CORRECT_HIL_USERNAME, CORRECT_HIL_PASSWORD))
+        self.assertEqual(res.status_code, 200)
+        res = requests.delete(PICASSO_URL + "umount_image/", data=data,
+                              auth=(CORRECT_HIL_USERNAME,
+                                    CORRECT_HIL_PASSWORD))
+        self.assertEqual(res.status_code, 200)
+
+    def tearDown(self):
+        self.good_bmi.remove_image(EXIST_IMG_NAME)
+        self.db.project.delete_with_name(PROJECT)
+        self.db.close()
+        self.good_bmi.shutdown()